@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the cleaning rules Collocater applies to the scraped content,
+comparing them with the nested substitutions they replaced.
+
+The paragraphs are read from an archive of pages when one is provided. Otherwise, they
+are rebuilt from every entry of the collocations dictionary shipped with the package,
+turning its tags back into the abbreviations the dictionary's pages feature.
+
+Usage:
+    python benchmarks/cleaning.py [--archive DIR] [--repeat N]
+
+"""
+
+import argparse
+import time
+
+import joblib
+import pkg_resources as pkr
+import regex
+
+from collocater.archive import PageArchive
+from collocater.cleaning import cleaning_rules
+from collocater.collocater import Collocater
+from collocater.pages import lxml_sections
+
+
+RAW_TAGS = {'__PERSON_S__': "sb's", '__PERSON__': 'sb', '__OTHER__': 'sb/sth',
+            '__THING__': 'sth', '__WORD__': '…', '__THIS_WORD__': '~'}
+
+
+
+def reference_cleaner(x, tags_dict):
+    """
+    The nested substitutions Collocater._cleaner used to apply.
+    """
+
+    return regex.sub(r'Special\spage\sat', '',
+                     regex.sub(r'(\(.?\=[^\)]+\))|(,\setc)', '',
+                               regex.sub(r'(?<=\w+)(,\s)(?=\w+,\setc\s'+f"{tags_dict.get('this_word')})", '/',
+                                         regex.sub(regex.compile(tags_dict.get('this_word') + '|' + '~', regex.I), tags_dict.get('this_word'),
+                                                   regex.sub(r'…', tags_dict.get('one_word'),
+                                                             regex.sub(r"(?<=\W)(your|his|her|their|my|our|("+f"{tags_dict.get('someone')}"+"|"+f"{tags_dict.get('sb_sth')}"+"|"+f"{tags_dict.get('something')}"+ "|a\sperson|one)'s)(?=\W)", tags_dict.get('possessive_det'),
+                                                                       regex.sub(r"(?<=\W)(some(one|body)|sb|you|him|her|them|us|we|they|he|she)(?=\W)", tags_dict.get('someone'),
+                                                                                 regex.sub(r"(?<=\W)((some|a)?things?|sth)(?=\W)", tags_dict.get('something'),
+                                                                                           regex.sub(r"(?<=\W)(some(one|body)\/something|sb\/sth)(?=\W)", tags_dict.get('sb_sth'),
+                                                                                                     regex.sub(r'[A-Z]{2,}', '',
+                                                                                                               regex.sub(r'([\<\>\.\+]|\&\w+)', '',
+                                                                                                                         regex.sub(r'\([^\)]{23,}\)', '',
+                                                                                                                                   regex.sub(r'<.?\w>', '', ' '+ x + ' ')))))))))))))
+
+
+
+def reference_alternatives(x):
+    """
+    The loop Collocater._alts_diss used to run.
+    """
+
+    if not isinstance(x, list):
+        x = [x]
+
+    while regex.search(r'\/', '; '.join(x)):
+        b = []
+        for a in x:
+            if regex.search(r'\/', a):
+                a = regex.sub(r'(?<=\ban?)\s(?=\w+)', '_', a)
+                for match in regex.findall(r'([\w\-\_]+\/[\w\-\_]+)', a):
+                    for c in match.split("/"):
+                        b.append(regex.sub(r'(?<=\ban?)_(?=\w+)', ' ', regex.sub(r"(?<=[\W_,])"+f"({match})"+"(?=[\W_,])", c, a)))
+            else:
+                b.append(a)
+        x = list(set(b))
+
+    return x
+
+
+
+def reference_processor(without_examples, tags_dict):
+    """
+    The processing Collocater._colls_processor used to carry out.
+    """
+
+    cleaned_colls = reference_cleaner(without_examples, tags_dict)
+    dissambled_colls0 = '; '.join(reference_alternatives(cleaned_colls))
+
+    if regex.search(r'[\(\)]+', dissambled_colls0):
+        dissambled_colls = regex.sub(r'[\(\)]+', '', regex.sub(r'\([\w\s\-]+\)', '', dissambled_colls0))
+        dissambled_colls += '; '+regex.sub(r'[\(\)]+', '', dissambled_colls0)
+    else:
+        dissambled_colls = dissambled_colls0
+
+    singles = [e for e in list(map(lambda x: x.strip(), regex.split(r'[,;\:\.\|]', regex.sub(r'(\S+\s)(?=\1)', '', regex.sub(r'\s+', ' ', dissambled_colls)))))
+               if not (regex.search(r'[\/\(]', e) or regex.match(r"({0})$".format(tags_dict.get('this_word')), e))]
+
+    return list(set([e for e in singles if e]))
+
+
+
+def _raw(text):
+    for tag, raw in RAW_TAGS.items():
+        text = text.replace(tag, raw)
+    return text
+
+
+
+def dictionary_paragraphs():
+    """
+    Rebuilds the markup of the paragraphs of every entry of the collocations dictionary.
+    """
+
+    dictionary = joblib.load(pkr.resource_stream('collocater', 'data/collocations_dict.joblib'))
+    for word, entry in dictionary.items():
+        for colls in (entry or {}).values():
+            for key, lists in colls.items():
+                parts = ', '.join('<b>' + _raw(c) + '</b>' for c in sum(lists, []))
+                yield word, f'<p><u>{_raw(key).replace("~", word.upper())}</u> {parts}</p>'
+
+
+
+def archive_paragraphs(directory):
+    """
+    Reads the paragraphs, bereft of the examples, of every page in the archive.
+    """
+
+    archive = PageArchive(directory)
+    for word in archive:
+        try:
+            _, items = lxml_sections(archive.get(word))
+        except Exception:
+            continue
+        for paragraphs in items:
+            for _, without_examples in paragraphs:
+                yield word, without_examples
+
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--archive', default=None, help="Directory of an archive of pages")
+    parser.add_argument('--repeat', type=int, default=1, help="Number of times each engine is timed")
+    args = parser.parse_args(argv)
+
+    inputs = list(archive_paragraphs(args.archive) if args.archive else dictionary_paragraphs())
+    tags_dict = dict(Collocater({}, []).tags_dict)
+    print(f"{len(inputs)} paragraphs of {len(set(word for word, _ in inputs))} words")
+
+    def reference(word, markup):
+        tags_dict['this_word'] = word
+        return reference_processor(markup, tags_dict)
+
+    def compiled(word, markup):
+        return cleaning_rules(tags_dict).collocations(markup, word)
+
+    outputs = {}
+    for name, engine in [('reference', reference), ('compiled', compiled)]:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outputs[name] = [engine(word, markup) for word, markup in inputs]
+            timings.append(time.perf_counter() - start)
+        print(f"{name:>10}: {min(timings):.2f}s")
+
+    mismatches = sum(1 for a, b in zip(outputs.get('reference'), outputs.get('compiled')) if a != b)
+    print(f"mismatches: {mismatches}")
+
+    return 1 if mismatches else 0
+
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the engines Collocater matches the collocations with, comparing the
+regular expressions over the text with the token patterns of spaCy's Matcher.
+
+The texts are the examples of the tests, parsed once with the object's Spacy pipeline.
+Each engine is timed once with its patterns still to be built, and then as many times
+as requested with them already built. The agreement is the share of the collocations
+found, along with their types, that both engines found.
+
+Usage:
+    python benchmarks/matcher.py [--obj PATH] [--model NAME] [--repeat N] [--verbose]
+
+"""
+
+import argparse
+import ast
+import os
+import time
+
+from collocater.collocater import Collocater
+
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'test', 'test.py')
+
+
+
+def test_examples(path=TESTS):
+    """
+    Reads the examples of the tests, without importing them.
+    """
+
+    with open(path, encoding='utf-8') as fh:
+        tree = ast.parse(fh.read())
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == 'examples' for t in node.targets):
+            return ast.literal_eval(node.value)
+
+    raise ValueError(f"No examples found in {path}")
+
+
+
+def found(collie, docs):
+    return [{(k, v.get('coll_type')) for k, v in collie._annotate(doc).items()} for doc in docs]
+
+
+
+def compare(collie, docs, repeat=1):
+    """
+    Times each engine over the parsed texts and compares the collocations they find.
+
+    Returns:
+        timings (dict): Seconds taken by each engine with its patterns still to be built,
+            and the best of the runs with them already built.
+        outputs (dict): Collocations found in each text by each engine.
+    """
+
+    timings = {}
+    outputs = {}
+    for engine in ['regex', 'matcher']:
+        collie.engine = engine
+        collie.clear_pattern_cache()
+        start = time.perf_counter()
+        outputs[engine] = found(collie, docs)
+        cold = time.perf_counter() - start
+
+        warm = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found(collie, docs)
+            warm.append(time.perf_counter() - start)
+        timings[engine] = (cold, min(warm))
+
+    return timings, outputs
+
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--obj', default=None, help="Path to the pickled Collocater object")
+    parser.add_argument('--model', default=None, help="Spacy model the texts are parsed with")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of times each engine is timed")
+    parser.add_argument('--verbose', action='store_true', help="Print the collocations only one engine found")
+    args = parser.parse_args(argv)
+
+    collie = Collocater.loader(args.obj)
+    if args.model:
+        collie.spacy_model = args.model
+    examples = test_examples()
+    docs = list(collie.get_nlp().pipe(examples.values()))
+    print(f"{len(docs)} texts of {sum(len(doc) for doc in docs)} tokens")
+
+    timings, outputs = compare(collie, docs, args.repeat)
+    for engine, (cold, warm) in timings.items():
+        print(f"{engine:>8}: {cold:.3f}s building the patterns, {warm:.3f}s with them built")
+
+    shared = union = 0
+    for name, a, b in zip(examples, outputs.get('regex'), outputs.get('matcher')):
+        shared += len(a & b)
+        union += len(a | b)
+        if args.verbose and a != b:
+            print(f"{name}:")
+            for label, only in [('regex', a - b), ('matcher', b - a)]:
+                for string, coll_type in sorted(only):
+                    print(f"  only {label}: {string!r} ({coll_type})")
+    print(f"agreement: {shared}/{union} ({shared / max(union, 1):.0%})")
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Command line tools of the collocater package.
+
+Usage:
+    python -m collocater build-patterns [--obj PATH] [--out PATH]
+    python -m collocater build-index [--obj PATH] [--out PATH]
+    python -m collocater convert-dictionary SOURCE OUT [--overwrite]
+    python -m collocater batch SOURCE [--output PATH] [--processes N] [--unordered] [--resume]
+    python -m collocater rebuild ARCHIVE OUT [--words PATH] [--fetch] [--processes N]
+    python -m collocater stats SOURCE OUT [--processes N] [--matching MODE] [--max-keys N] [--sketch-width N]
+
+"""
+
+import argparse
+import os
+
+from collocater.collocater import Collocater
+from collocater.batch import corpus_stats, run_batch
+from collocater.rebuild import rebuild_dictionary
+from collocater.store import convert_dictionary
+
+
+
+def build_patterns(args):
+    """
+    Builds the pattern bank of the Collocater object and saves it.
+    """
+
+    collie = Collocater.loader(args.obj)
+    out = args.out or os.path.join(os.path.dirname(__file__), 'data', 'pattern_bank.sqlite')
+    bank = collie.build_pattern_bank(out)
+    print(f"Saved the patterns of {len(bank)} words and morphologies to {out}")
+
+
+
+def build_index(args):
+    """
+    Builds the collocate index of the Collocater object and saves it.
+    """
+
+    collie = Collocater.loader(args.obj)
+    out = args.out or os.path.join(os.path.dirname(__file__), 'data', 'collocate_index.pkl.gz')
+    index = collie.build_collocate_index(out)
+    print(f"Saved the index of {len(index)} fragments of words to {out}")
+
+
+
+def convert(args):
+    """
+    Converts the collocations dictionary of a joblib file into an SQLite store.
+    """
+    
+    store = convert_dictionary(args.source, args.out, overwrite=args.overwrite)
+    print(f"Saved the entries of {len(store)} words to {args.out}")
+
+
+
+def batch(args):
+    """
+    Retrieves the collocations of a corpus with a pool of processes.
+    """
+
+    run_batch(args.source, output=args.output, obj_path=args.obj, processes=args.processes,
+              ordered=not args.unordered, resume=args.resume, chunksize=args.chunksize,
+              id_field=args.id_field, text_field=args.text_field,
+              pattern_bank=args.pattern_bank, matching=args.matching,
+              collocate_index=args.collocate_index)
+
+
+
+def stats(args):
+    """
+    Counts the collocations of a corpus with a pool of processes and writes the table of counts.
+    """
+
+    counts = corpus_stats(args.source, obj_path=args.obj, processes=args.processes,
+                          chunksize=args.chunksize, id_field=args.id_field, text_field=args.text_field,
+                          pattern_bank=args.pattern_bank, matching=args.matching, max_keys=args.max_keys,
+                          sketch_width=args.sketch_width, collocate_index=args.collocate_index)
+    table = counts.to_pandas(min_count=args.min_count)
+    if args.out.endswith('.parquet'):
+        table.to_parquet(args.out, index=False)
+    else:
+        table.to_csv(args.out, sep='\t', index=False)
+    print(f"Counted {counts.n_collocations} collocations in {counts.n_docs} documents, "
+          f"and wrote {len(table)} rows to {args.out}")
+
+
+
+def rebuild(args):
+    """
+    Rebuilds the collocations dictionary and the Collocater object from an archive of pages.
+    """
+
+    words = None
+    if args.words:
+        with open(args.words, encoding='utf-8') as fh:
+            words = [line.strip() for line in fh if line.strip()]
+
+    summary = rebuild_dictionary(args.archive, args.out, words=words, base=args.obj,
+                                 processes=args.processes, chunksize=args.chunksize,
+                                 parse_engine=args.engine, fetch=args.fetch,
+                                 concurrency=args.concurrency, rate=args.rate)
+    print(f"Processed {summary.get('processed')} words, skipped {summary.get('skipped')} unchanged "
+          f"and failed {summary.get('failed')}")
+    for word, error in summary.get('errors').items():
+        print(f"  {word}: {error}")
+
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='collocater')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    patterns_parser = subparsers.add_parser('build-patterns',
+                                            help="Prebuild the patterns of every word in the collocations dictionary")
+    patterns_parser.add_argument('--obj', default=None,
+                                 help="Path to the pickled Collocater object (defaults to the one shipped with the package)")
+    patterns_parser.add_argument('--out', default=None,
+                                 help="Path of the pattern bank to be written (defaults to collocater/data/pattern_bank.sqlite)")
+    patterns_parser.set_defaults(func=build_patterns)
+
+    index_parser = subparsers.add_parser('build-index',
+                                         help="Prebuild the index of the words the patterns of every word require")
+    index_parser.add_argument('--obj', default=None,
+                              help="Path to the pickled Collocater object (defaults to the one shipped with the package)")
+    index_parser.add_argument('--out', default=None,
+                              help="Path of the collocate index to be written (defaults to collocater/data/collocate_index.pkl.gz)")
+    index_parser.set_defaults(func=build_index)
+
+    convert_parser = subparsers.add_parser('convert-dictionary',
+                                           help="Convert a joblib collocations dictionary into an SQLite store")
+    convert_parser.add_argument('source',
+                                help="collocations_dict.joblib or a pickled Collocater object")
+    convert_parser.add_argument('out',
+                                help="Path of the SQLite database to be written")
+    convert_parser.add_argument('--overwrite', action='store_true',
+                                help="Replace the database if it already exists")
+    convert_parser.set_defaults(func=convert)
+
+    batch_parser = subparsers.add_parser('batch',
+                                         help="Retrieve the collocations of a corpus and write them as JSONL")
+    batch_parser.add_argument('source',
+                              help="Directory of text files or JSONL file with one document per line")
+    batch_parser.add_argument('--output', '-o', default=None,
+                              help="JSONL file to write the results to (defaults to the standard output)")
+    batch_parser.add_argument('--obj', default=None,
+                              help="Path to the pickled Collocater object (defaults to the one shipped with the package)")
+    batch_parser.add_argument('--processes', '-p', type=int, default=None,
+                              help="Number of worker processes (defaults to the number of CPUs)")
+    batch_parser.add_argument('--chunksize', type=int, default=16,
+                              help="Number of documents sent to the workers at a time")
+    batch_parser.add_argument('--unordered', action='store_true',
+                              help="Write the results as soon as they are ready instead of in the corpus' order")
+    batch_parser.add_argument('--resume', action='store_true',
+                              help="Skip the documents already written to the output file")
+    batch_parser.add_argument('--id-field', default='id',
+                              help="Field of the JSONL records with the documents' ids")
+    batch_parser.add_argument('--text-field', default='text',
+                              help="Field of the JSONL records with the documents' texts")
+    batch_parser.add_argument('--pattern-bank', action='store_true',
+                              help="Load the prebuilt pattern bank in the workers")
+    batch_parser.add_argument('--matching', choices=['full', 'window'], default=None,
+                              help="Matching mode of the workers' Collocater objects")
+    batch_parser.add_argument('--collocate-index', action='store_true',
+                              help="Load the prebuilt collocate index in the workers")
+    batch_parser.set_defaults(func=batch)
+
+    rebuild_parser = subparsers.add_parser('rebuild',
+                                           help="Rebuild the collocations dictionary from an archive of pages")
+    rebuild_parser.add_argument('archive',
+                                help="Directory of the archive of pages")
+    rebuild_parser.add_argument('out',
+                                help="Directory where collocations_dict.joblib, collocater_obj.joblib and manifest.json are written")
+    rebuild_parser.add_argument('--words', default=None,
+                                help="File with the words to be rebuilt, one per line (defaults to all the archived ones)")
+    rebuild_parser.add_argument('--obj', default=None,
+                                help="Pickled Collocater object the settings and first entries are taken from "
+                                     "(defaults to the one shipped with the package)")
+    rebuild_parser.add_argument('--processes', '-p', type=int, default=None,
+                                help="Number of worker processes (defaults to the number of CPUs)")
+    rebuild_parser.add_argument('--chunksize', type=int, default=16,
+                                help="Number of words sent to the workers at a time")
+    rebuild_parser.add_argument('--engine', choices=['bs4', 'lxml'], default='lxml',
+                                help="Engine the pages are parsed with")
+    rebuild_parser.add_argument('--fetch', action='store_true',
+                                help="Fetch the pages of the words missing from the archive first")
+    rebuild_parser.add_argument('--concurrency', type=int, default=8,
+                                help="Number of pages fetched at the same time")
+    rebuild_parser.add_argument('--rate', type=float, default=None,
+                                help="Maximum number of requests per second")
+    rebuild_parser.set_defaults(func=rebuild)
+
+    stats_parser = subparsers.add_parser('stats',
+                                         help="Count the collocations of a corpus by headword, type and collocate")
+    stats_parser.add_argument('source',
+                              help="Directory of text files or JSONL file with one document per line")
+    stats_parser.add_argument('out',
+                              help="TSV file the table of counts is written to, or Parquet file when it ends with .parquet")
+    stats_parser.add_argument('--obj', default=None,
+                              help="Path to the pickled Collocater object (defaults to the one shipped with the package)")
+    stats_parser.add_argument('--processes', '-p', type=int, default=None,
+                              help="Number of worker processes (defaults to the number of CPUs)")
+    stats_parser.add_argument('--chunksize', type=int, default=256,
+                              help="Number of documents counted by the workers at a time")
+    stats_parser.add_argument('--id-field', default='id',
+                              help="Field of the JSONL records with the documents' ids")
+    stats_parser.add_argument('--text-field', default='text',
+                              help="Field of the JSONL records with the documents' texts")
+    stats_parser.add_argument('--pattern-bank', action='store_true',
+                              help="Load the prebuilt pattern bank in the workers")
+    stats_parser.add_argument('--collocate-index', action='store_true',
+                              help="Load the prebuilt collocate index in the workers")
+    stats_parser.add_argument('--matching', choices=['full', 'window'], default=None,
+                              help="Matching mode of the workers' Collocater objects")
+    stats_parser.add_argument('--max-keys', type=int, default=None,
+                              help="Maximum number of collocations counted exactly (defaults to no limit)")
+    stats_parser.add_argument('--sketch-width', type=int, default=None,
+                              help="Width of the count-min sketch the counts of the rarest collocations are kept in")
+    stats_parser.add_argument('--min-count', type=int, default=1,
+                              help="Minimum count of the collocations written")
+    stats_parser.set_defaults(func=stats)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local archive of the raw pages scraped from the Online Oxford Collocation Dictionary,
+for the collocations dictionary to be rebuilt from them without fetching them again.
+
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+
+
+class PageArchive():
+    """
+    Content-addressed archive of pages, each of which is stored gzipped under
+    the SHA-256 digest of its content, along with an index of the words' pages.
+
+    The index is a JSONL file to which a line is appended whenever a word's page
+    is stored, the last line of each word being the one that counts.
+
+    Parameters:
+        directory (str): Directory of the archive, created if it doesn't exist.
+    """
+
+    def __init__(self, directory):
+
+        self.directory = directory
+        self._index_path = os.path.join(directory, 'index.jsonl')
+        self._index = None
+        # Whether a line left half written at the end of the index has been dropped.
+        self._tail_repaired = False
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest + '.html.gz')
+
+
+    def _load_index(self):
+
+        if self._index is None:
+            index = {}
+            if os.path.exists(self._index_path):
+                with open(self._index_path, encoding='utf-8') as fh:
+                    for line in fh:
+                        # A line left half written by an interrupted run is skipped.
+                        if line.endswith('\n'):
+                            record = json.loads(line)
+                            index[record.get('word')] = record.get('sha256')
+            self._index = index
+
+        return self._index
+
+
+    def _repair_tail(self):
+        """
+        Drops the line left half written at the end of the index by an interrupted run,
+        for the next record to be appended on a line of its own.
+        """
+
+        if self._tail_repaired or not os.path.exists(self._index_path):
+            self._tail_repaired = True
+            return
+
+        with open(self._index_path, 'rb+') as fh:
+            end = fh.seek(0, os.SEEK_END)
+            valid_end = end
+            while valid_end > 0:
+                fh.seek(max(valid_end - 4096, 0))
+                block = fh.read(valid_end - fh.tell())
+                if block.endswith(b'\n'):
+                    break
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    valid_end -= len(block) - newline - 1
+                    break
+                valid_end -= len(block)
+            if valid_end != end:
+                fh.truncate(valid_end)
+
+        self._tail_repaired = True
+
+
+    def put(self, word, page):
+        """
+        Stores the page of the word, unless the same content is already archived.
+
+        Returns:
+            digest (str): The SHA-256 digest of the page's content.
+        """
+
+        data = page.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                # Without a timestamp, the same page is always compressed into the same bytes.
+                with open(tmp_path, 'wb') as fh:
+                    fh.write(gzip.compress(data, mtime=0))
+                os.replace(tmp_path, path)
+
+            index = self._load_index()
+            if index.get(word) != digest:
+                self._repair_tail()
+                with open(self._index_path, 'a', encoding='utf-8') as fh:
+                    fh.write(json.dumps({'word': word, 'sha256': digest}, ensure_ascii=False) + '\n')
+                index[word] = digest
+
+        return digest
+
+
+    def get(self, word):
+        """
+        Returns the archived page of the word, or None if it's not in the archive.
+        """
+
+        with self._lock:
+            digest = self._load_index().get(word)
+
+        if digest is None:
+            return None
+
+        with open(self._object_path(digest), 'rb') as fh:
+            return gzip.decompress(fh.read()).decode('utf-8')
+
+
+    def digest(self, word):
+        """
+        Returns the SHA-256 digest of the archived page of the word.
+        """
+
+        with self._lock:
+            return self._load_index().get(word)
+
+
+    def __contains__(self, word):
+        return self.digest(word) is not None
+
+
+    def __iter__(self):
+
+        with self._lock:
+            return iter(list(self._load_index()))
+
+
+    def __len__(self):
+
+        with self._lock:
+            return len(self._load_index())
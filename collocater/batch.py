@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retrieving the collocations of whole corpora with a pool of processes,
+each of which loads the Collocater object only once.
+
+"""
+
+import json
+import os
+import sys
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+
+from collocater.collocater import Collocater
+from collocater.stats import CollocationStats
+
+
+# Collocater object of each worker process, loaded by _init_worker.
+_collie = None
+
+
+
+def iter_documents(source, id_field='id', text_field='text'):
+    """
+    Function to read the documents of a corpus, which can either be a directory
+    of text files or a JSONL file with one document per line.
+
+    Parameters:
+        source (str): Path to the directory or the JSONL file.
+        id_field (str): Field of the JSONL records with the documents' ids,
+            which default to their line numbers when missing.
+        text_field (str): Field of the JSONL records with the documents' texts.
+
+    Yields:
+        doc_id (str): The id of the document, which is its path relative
+            to the directory for text files.
+        text (str): The text of the document.
+
+    Raises:
+        ValueError: When a JSONL record has no text in its text field, naming its line.
+    """
+
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                with open(path, encoding='utf-8') as fh:
+                    yield os.path.relpath(path, source), fh.read()
+    else:
+        with open(source, encoding='utf-8') as fh:
+            for line_no, line in enumerate(fh):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                text = record.get(text_field)
+                if not isinstance(text, str):
+                    raise ValueError(f"Line {line_no + 1} of {source} has no text in its '{text_field}' field")
+                yield str(record.get(id_field, line_no)), text
+
+
+
+def doc_record(doc_id, doc):
+    """
+    Function to turn the collocations found in a document into
+    a JSON serializable record.
+    """
+
+    collocations = [{'text': span.text,
+                     'start_char': span.start_char, 'end_char': span.end_char,
+                     'start': span.start, 'end': span.end,
+                     'coll_type': span.label_.split(' / ')} for span in doc._.collocs]
+
+    return {'id': doc_id, 'collocations': collocations}
+
+
+
+def _init_worker(obj_path, pattern_bank, matching, collocate_index=False):
+    """
+    Loads the Collocater object a worker process uses for all its documents.
+    """
+
+    global _collie
+    _collie = Collocater.loader(obj_path, pattern_bank=pattern_bank, collocate_index=collocate_index)
+    if matching:
+        _collie.matching = matching
+
+
+def _process(item):
+    """
+    Finds the collocations of a document in a worker process
+    and returns its serialized record.
+    """
+
+    doc_id, text = item
+    doc = _collie.get_nlp()(text)
+    _collie._annotate(doc)
+
+    return json.dumps(doc_record(doc_id, doc), ensure_ascii=False)
+
+
+
+def _done_ids(output):
+    """
+    Reads the ids of the documents whose records have been completely written to
+    the output file, dropping the last line if it was left half written.
+    """
+
+    done = set()
+    if not os.path.exists(output):
+        return done
+
+    with open(output, 'rb+') as fh:
+        valid_end = 0
+        for line in fh:
+            if not line.endswith(b'\n'):
+                break
+            done.add(json.loads(line).get('id'))
+            valid_end += len(line)
+        fh.truncate(valid_end)
+
+    return done
+
+
+
+def run_batch(source, output=None, obj_path=None, processes=None, ordered=True,
+              resume=False, chunksize=16, id_field='id', text_field='text',
+              pattern_bank=False, matching=None, collocate_index=False):
+    """
+    Retrieves the collocations of all the documents of a corpus and streams them
+    as JSONL records with the documents' ids and the text, character and token
+    offsets and types of the collocations found in them.
+
+    The output file doubles as checkpoint: every complete line stands for
+    a finished document, so that a run can be resumed where it stopped.
+
+    Parameters:
+        source (str): Path to the corpus, either a directory of text files or a JSONL file.
+        output (str): Path to the JSONL file where the records should be written,
+            which defaults to the standard output.
+        obj_path (str): Optional path to the pickled Collocater object.
+        processes (int): Number of worker processes, which defaults to the number of CPUs.
+            With 1, the documents are processed in the current process.
+        ordered (bool): Whether the records should be written in the corpus' order,
+            or as soon as they are ready.
+        resume (bool): Whether the documents already written to the output file should be skipped.
+        chunksize (int): Number of documents sent to the workers at a time.
+        id_field (str): Field of the JSONL records with the documents' ids.
+        text_field (str): Field of the JSONL records with the documents' texts.
+        pattern_bank (bool/str): Pattern bank to be loaded by the workers' Collocater objects.
+        matching (str): Optional matching mode of the workers' Collocater objects.
+        collocate_index (bool/str): Collocate index to be loaded by the workers' Collocater objects.
+
+    Returns:
+        n_docs (int): Number of documents processed in this run.
+    """
+
+    if resume and not output:
+        raise ValueError("Resuming a batch requires an output file")
+
+    done = _done_ids(output) if resume else set()
+    items = ((doc_id, text) for doc_id, text in iter_documents(source, id_field, text_field)
+             if doc_id not in done)
+
+    fh = open(output, 'a' if resume else 'w', encoding='utf-8') if output else sys.stdout
+    n_docs = 0
+    pool = None
+    try:
+        if processes == 1:
+            _init_worker(obj_path, pattern_bank, matching, collocate_index)
+            records = map(_process, items)
+        else:
+            pool = Pool(processes, initializer=_init_worker, initargs=(obj_path, pattern_bank, matching, collocate_index))
+            if ordered:
+                records = pool.imap(_process, items, chunksize)
+            else:
+                records = pool.imap_unordered(_process, items, chunksize)
+
+        for record in records:
+            fh.write(record + '\n')
+            fh.flush()
+            n_docs += 1
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if output:
+            fh.close()
+
+    return n_docs
+
+
+
+def _count(chunk, options):
+    """
+    Counts the collocations of a chunk of documents in a worker process
+    and returns the partial stats.
+    """
+
+    return _collie.collocation_stats((text for doc_id, text in chunk), **options)
+
+
+
+def _chunks(items, size):
+
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+
+def corpus_stats(source, obj_path=None, processes=None, chunksize=256, id_field='id',
+                 text_field='text', pattern_bank=False, matching=None, max_keys=None,
+                 sketch_width=None, sketch_depth=4, collocate_index=False):
+    """
+    Counts the collocations of all the documents of a corpus by headword, part of speech,
+    type of collocation and collocate, along with the number of documents each is found in.
+
+    Each worker process counts the collocations of a chunk of documents at a time and
+    returns the partial stats, which are merged as they come, so that only the counts
+    are held in memory and never the collocations of the documents.
+
+    Parameters:
+        source (str): Path to the corpus, either a directory of text files or a JSONL file.
+        obj_path (str): Optional path to the pickled Collocater object.
+        processes (int): Number of worker processes, which defaults to the number of CPUs.
+            With 1, the documents are processed in the current process.
+        chunksize (int): Number of documents counted by the workers at a time.
+        id_field (str): Field of the JSONL records with the documents' ids.
+        text_field (str): Field of the JSONL records with the documents' texts.
+        pattern_bank (bool/str): Pattern bank to be loaded by the workers' Collocater objects.
+        matching (str): Optional matching mode of the workers' Collocater objects.
+        max_keys (int): Maximum number of keys counted exactly, or None for no limit.
+        sketch_width (int): Width of the count-min sketch the counts of the rest
+            of the keys are kept in, or None for no sketch.
+        sketch_depth (int): Depth of the count-min sketch.
+        collocate_index (bool/str): Collocate index to be loaded by the workers' Collocater objects.
+
+    Returns:
+        stats (CollocationStats): The counts of the collocations of the corpus.
+    """
+
+    options = {'max_keys': max_keys, 'sketch_width': sketch_width, 'sketch_depth': sketch_depth}
+    chunks = _chunks(iter_documents(source, id_field, text_field), chunksize)
+    count = partial(_count, options=options)
+    stats = CollocationStats(**options)
+
+    pool = None
+    try:
+        if processes == 1:
+            _init_worker(obj_path, pattern_bank, matching, collocate_index)
+            partials = map(count, chunks)
+        else:
+            pool = Pool(processes, initializer=_init_worker, initargs=(obj_path, pattern_bank, matching, collocate_index))
+            partials = pool.imap_unordered(count, chunks)
+
+        for partial_stats in partials:
+            stats.merge(partial_stats)
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return stats
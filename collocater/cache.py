@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caches used by the Collocater class to avoid repeating work
+across the texts it processes.
+
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+
+class LRUCache():
+    """
+    Bounded mapping that discards its least recently used entries first
+    and keeps count of its hits, misses and evictions.
+
+    It can be shared by many threads, as its entries and counters are
+    only read and updated holding its lock.
+
+    Parameters:
+        maxsize (int): Maximum number of entries to be kept. None means unbounded
+            and 0 disables the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+
+    def __getstate__(self):
+        """
+        Leaves the lock out of the pickled cache.
+        """
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for the key, marking it as the most recently used one.
+        """
+
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+
+        return value
+
+
+    def put(self, key, value):
+        """
+        Stores the value for the key, evicting the least recently used entries
+        if the cache grows beyond its maximum size.
+        """
+
+        if self.maxsize == 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+
+
+    def pop(self, key, default=None):
+        """
+        Removes the value stored for the key and returns it.
+        """
+        with self._lock:
+            return self._data.pop(key, default)
+
+
+    def clear(self):
+        """
+        Empties the cache and resets its counters.
+        """
+
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+    def info(self):
+        """
+        Returns the cache's counters and its current and maximum sizes.
+        """
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+
+
+class SQLiteCache():
+    """
+    Bounded mapping of strings stored in an SQLite database, which outlives the processes
+    using it and can be shared by many of them, discarding its least recently used entries first.
+
+    Each entry is stamped with the number of the last time it was read or written,
+    counted across all the processes sharing the database.
+
+    Parameters:
+        path (str): Path to the SQLite database, which is created if it doesn't exist.
+        maxsize (int): Maximum number of entries to be kept. None means unbounded.
+    """
+
+    def __init__(self, path, maxsize=100000):
+
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+
+    def __getstate__(self):
+        """
+        Leaves the database connection, the lock and the counters out of the pickled cache.
+        """
+        return {'path': self.path, 'maxsize': self.maxsize}
+
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+    def _connection(self):
+        """
+        Returns the connection to the database, which is opened in each process
+        the first time it is needed.
+        """
+
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, used INTEGER)")
+                if 'used' not in [row[1] for row in conn.execute("PRAGMA table_info(entries)")]:
+                    # Entries of older caches are taken to have been used in the order they were written.
+                    conn.execute("ALTER TABLE entries ADD COLUMN used INTEGER")
+                    conn.execute("UPDATE entries SET used = rowid")
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+                # Single row with the number of the next use and the number of entries,
+                # kept up to date along with them, so that neither has to be worked out again.
+                conn.execute("CREATE TABLE IF NOT EXISTS state (next_used INTEGER, size INTEGER)")
+                conn.execute("INSERT INTO state SELECT COALESCE(MAX(used), 0) + 1, COUNT(*) FROM entries "
+                             "WHERE NOT EXISTS (SELECT 1 FROM state)")
+            self._conn = conn
+            self._pid = os.getpid()
+
+        return self._conn
+
+
+    def _stamp(self, conn):
+        """
+        Returns the number of the current use of an entry, within a write transaction.
+        """
+
+        conn.execute("UPDATE state SET next_used = next_used + 1")
+        return conn.execute("SELECT next_used - 1 FROM state").fetchone()[0]
+
+
+    def __len__(self):
+
+        with self._lock:
+            return self._connection().execute("SELECT size FROM state").fetchone()[0]
+
+
+    def __contains__(self, key):
+
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for the key, marking it as the most recently used one.
+        """
+
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            with conn:
+                conn.execute("UPDATE entries SET used = ? WHERE key = ?", (self._stamp(conn), key))
+            self.hits += 1
+
+        return row[0]
+
+
+    def put(self, key, value):
+        """
+        Stores the value for the key, evicting the least recently used entries 
+        if the cache grows beyond its maximum size.
+        """
+
+        if self.maxsize == 0:
+            return
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                used = self._stamp(conn)
+                if conn.execute("UPDATE entries SET value = ?, used = ? WHERE key = ?", (value, used, key)).rowcount:
+                    return
+                conn.execute("INSERT INTO entries VALUES (?, ?, ?)", (key, value, used))
+                conn.execute("UPDATE state SET size = size + 1")
+                if self.maxsize is None:
+                    return
+                # Only the entries beyond the maximum size are evicted, the least recently used first.
+                excess = conn.execute("SELECT size FROM state").fetchone()[0] - self.maxsize
+                if excess > 0:
+                    evicted = conn.execute("DELETE FROM entries WHERE key IN "
+                                           "(SELECT key FROM entries ORDER BY used LIMIT ?)", (excess,)).rowcount
+                    conn.execute("UPDATE state SET size = size - ?", (evicted,))
+                    self.evictions += evicted
+
+
+    def pop(self, key, default=None):
+        """
+        Removes the value stored for the key and returns it.
+        """
+
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            with conn:
+                deleted = conn.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount
+                conn.execute("UPDATE state SET size = size - ?", (deleted,))
+
+        return row[0]
+
+
+    def clear(self):
+        """
+        Empties the cache and resets its counters.
+        """
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM entries")
+                conn.execute("UPDATE state SET size = 0")
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+    def info(self):
+        """
+        Returns the cache's counters and its current and maximum sizes.
+        """
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self), 'maxsize': self.maxsize}
+
+
+    def close(self):
+        """
+        Closes the connection to the database of the current process.
+        """
+
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rules to clean the scraped content of the Online Oxford Collocation Dictionary's pages
+and split it up into collocations, compiled once for each configuration of tags
+instead of every time a paragraph is processed.
+
+"""
+
+import regex
+
+from collocater.cache import LRUCache
+
+
+_article_space = regex.compile(r'(?<=\ban?)\s(?=\w+)')
+_article_underscore = regex.compile(r'(?<=\ban?)_(?=\w+)')
+_alternative = regex.compile(r'([\w\-\_]+\/[\w\-\_]+)')
+_alternative_delimiter = regex.compile(r'[\W_,]')
+
+_tags = regex.compile(r'<.?\w>')
+_long_brackets = regex.compile(r'\([^\)]{23,}\)')
+_symbols = regex.compile(r'([\<\>\.\+]|\&\w+)')
+_capitals = regex.compile(r'[A-Z]{2,}')
+_sb_sth = regex.compile(r"(?<=\W)(some(one|body)\/something|sb\/sth)(?=\W)")
+_something = regex.compile(r"(?<=\W)((some|a)?things?|sth)(?=\W)")
+_someone = regex.compile(r"(?<=\W)(some(one|body)|sb|you|him|her|them|us|we|they|he|she)(?=\W)")
+# The three of them in a single pass, with a group for each.
+_pronouns = regex.compile(r"(?<=\W)(?:(some(?:one|body)\/something|sb\/sth)|((?:some|a)?things?|sth)"
+                          r"|(some(?:one|body)|sb|you|him|her|them|us|we|they|he|she))(?=\W)")
+_ellipsis = regex.compile(r'…')
+_equivalences = regex.compile(r'(\(.?\=[^\)]+\))|(,\setc)')
+_special_page = regex.compile(r'Special\spage\sat')
+
+_brackets = regex.compile(r'[\(\)]+')
+_bracketed_words = regex.compile(r'\([\w\s\-]+\)')
+_spaces = regex.compile(r'\s+')
+_repeated_words = regex.compile(r'(\S+\s)(?=\1)')
+_separators = regex.compile(r'[,;\:\.\|]')
+_excluded = regex.compile(r'[\/\(]')
+_word = regex.compile(r'\w+')
+# Words the rules can look for without compiling them, as they mean the same as regular expressions.
+_plain_word = regex.compile(r"[A-Za-z' \-]+")
+
+
+
+def _replace_delimited(text, old, new):
+    """
+    Replaces the occurrences of old preceded and followed by a non-word character
+    or an underscore, as substituting (?<=[\\W_,])old(?=[\\W_,]) would.
+    """
+
+    parts = []
+    last = pos = 0
+    size = len(old)
+    while True:
+        start = text.find(old, pos)
+        if start < 0:
+            break
+        end = start + size
+        if (start > 0 and _alternative_delimiter.match(text, start - 1)
+                and end < len(text) and _alternative_delimiter.match(text, end)):
+            parts.append(text[last:start])
+            parts.append(new)
+            last = pos = end
+        else:
+            pos = start + 1
+
+    if not parts:
+        return text
+
+    parts.append(text[last:])
+
+    return ''.join(parts)
+
+
+
+def _replace_word(text, word):
+    """
+    Replaces the occurrences of the plain word, regardless of their case, and of '~' with
+    the word, as substituting the case-insensitive regular expression word|~ would.
+    Returns None when the text has characters the lowercase text would be misaligned with
+    or the regular expression would take for a letter of the word.
+    """
+
+    lowered = text.lower()
+    if len(lowered) != len(text) or '\u017f' in text:
+        return None
+
+    key = word.lower()
+    parts = []
+    last = 0
+    while True:
+        start = lowered.find(key, last)
+        tilde = lowered.find('~', last)
+        if tilde >= 0 and (start < 0 or tilde < start):
+            parts.append(text[last:tilde])
+            last = tilde + 1
+        elif start >= 0:
+            parts.append(text[last:start])
+            last = start + len(key)
+        else:
+            break
+        parts.append(word)
+
+    parts.append(text[last:])
+
+    return ''.join(parts)
+
+
+
+def disassemble_alternatives(x):
+    """
+    Splits each of the strings with alternatives separated by a forward slash into
+    as many strings as alternatives they feature, one level of alternatives at a time.
+    """
+
+    b = []
+    for a in x:
+        if '/' in a:
+            a = _article_space.sub('_', a)
+            for match in _alternative.findall(a):
+                for c in match.split("/"):
+                    b.append(_article_underscore.sub(' ', _replace_delimited(a, match, c)))
+        else:
+            b.append(a)
+
+    return b
+
+
+
+def split_alternatives(x):
+    """
+    Splits the strings with alternatives separated by forward slashes until none is left.
+    """
+
+    if not isinstance(x, list):
+        x = [x]
+
+    while any('/' in a for a in x):
+        x = list(set(disassemble_alternatives(x)))
+
+    return x
+
+
+
+class CleaningRules():
+    """
+    Rules to clean the content of the dictionary's pages, compiled for the tags provided.
+    The ones depending on the queried word are applied with string methods when the word
+    is plain, or compiled the first time the word is cleaned.
+
+    Parameters:
+        tags_dict (dict): Python dictionary to replace the references to pronouns
+            and other non-set discoursive variables with traceable tags.
+    """
+
+    def __init__(self, tags_dict):
+
+        self.tags_dict = {k: v for k, v in tags_dict.items() if k != 'this_word'}
+        someone = tags_dict.get('someone')
+        sb_sth = tags_dict.get('sb_sth')
+        something = tags_dict.get('something')
+
+        self._possessives = regex.compile(r"(?<=\W)(your|his|her|their|my|our|(" + f"{someone}" + "|" + f"{sb_sth}"
+                                          + "|" + f"{something}" + "|a\\sperson|one)'s)(?=\\W)")
+        # The pronouns can only be replaced in a single pass when their tags are made of word 
+        # characters, as the words they replace are, and can't be taken for any of them.
+        self._merged = all(tag is not None and _word.fullmatch(tag) and not _pronouns.search(f" {tag} ") 
+                           for tag in [sb_sth, something, someone])
+        self._pronoun_tags = [sb_sth, something, someone]
+
+        self._words = LRUCache(1024)
+
+
+    def _word_rule(self, kind, this_word):
+        """
+        Returns the rule of the kind provided compiled for the word, 
+        which has to be treated as a regular expression.
+        """
+
+        rule = self._words.get((kind, this_word))
+        if rule is None:
+            if kind == 'word':
+                rule = regex.compile(this_word + '|' + '~', regex.I)
+            elif kind == 'etc':
+                rule = regex.compile(r'(?<=\w+)(,\s)(?=\w+,\setc\s' + f"{this_word})")
+            else:
+                rule = regex.compile(r"({0})$".format(this_word))
+            self._words.put((kind, this_word), rule)
+
+        return rule
+
+
+    def _pronoun(self, m):
+
+        for group, tag in zip((1, 2, 3), self._pronoun_tags):
+            if m.group(group) is not None:
+                return tag
+
+
+    def clean(self, x, this_word):
+        """
+        Cleans the scraped non-cursive content of a paragraph, as Collocater._cleaner does.
+        """
+
+        tags_dict = self.tags_dict
+
+        x = _tags.sub('', ' ' + x + ' ')
+        x = _long_brackets.sub('', x)
+        x = _symbols.sub('', x)
+        x = _capitals.sub('', x)
+        if self._merged:
+            x = _pronouns.sub(self._pronoun, x)
+        else:
+            x = _sb_sth.sub(tags_dict.get('sb_sth'), x)
+            x = _something.sub(tags_dict.get('something'), x)
+            x = _someone.sub(tags_dict.get('someone'), x)
+        x = self._possessives.sub(tags_dict.get('possessive_det'), x)
+        x = _ellipsis.sub(tags_dict.get('one_word'), x)
+        replaced = _replace_word(x, this_word) if _plain_word.fullmatch(this_word) else None
+        x = self._word_rule('word', this_word).sub(this_word, x) if replaced is None else replaced
+        if 'etc' in x:
+            x = self._word_rule('etc', this_word).sub('/', x)
+        x = _equivalences.sub('', x)
+
+        return _special_page.sub('', x)
+
+
+    def collocations(self, without_examples, this_word):
+        """
+        Splits the content of a paragraph bereft of the examples into its collocations,
+        as Collocater._colls_processor does.
+        """
+
+        cleaned_colls = self.clean(without_examples, this_word)
+        dissambled_colls0 = '; '.join(split_alternatives(cleaned_colls))
+
+        if _brackets.search(dissambled_colls0):
+            dissambled_colls = _brackets.sub('', _bracketed_words.sub('', dissambled_colls0))
+            dissambled_colls += '; ' + _brackets.sub('', dissambled_colls0)
+        else:
+            dissambled_colls = dissambled_colls0
+
+        if _plain_word.fullmatch(this_word):
+            word_only = lambda e: e == this_word
+        else:
+            word_only = self._word_rule('only', this_word).match
+        singles = [e for e in list(map(lambda x: x.strip(), _separators.split(_repeated_words.sub('', _spaces.sub(' ', dissambled_colls)))))
+                   if not (_excluded.search(e) or word_only(e))]
+        singletons = list(set([e for e in singles if e]))
+
+        return singletons
+
+
+
+_rules = LRUCache(16)
+
+
+
+def cleaning_rules(tags_dict):
+    """
+    Returns the cleaning rules compiled for the tags provided, leaving the queried word out.
+    """
+
+    key = tuple(sorted((k, v) for k, v in tags_dict.items() if k != 'this_word'))
+    rules = _rules.get(key)
+    if rules is None:
+        rules = CleaningRules(tags_dict)
+        _rules.put(key, rules)
+
+    return rules
@@ -13,11 +13,21 @@ from the English Oxford Dictionaries
 
 import requests
 import re
+import os
+import json
+import hashlib
+import base64
+import zlib
+import gzip
+import pickle
+import threading
+from urllib.parse import quote
 from bs4 import BeautifulSoup as bs
 import regex
 import joblib
 import random
-import pandas as pd
+from bisect import bisect_right
+from itertools import tee
 
 
 from lxml.html import fromstring
@@ -25,58 +35,50 @@ from lxml.html import fromstring
 import pkg_resources as pkr
 
 import spacy
-from spacy.matcher import PhraseMatcher
-from spacy.tokens import Span
+from spacy.tokens import Doc, Token
 
+from collocater.cache import LRUCache
+from collocater.literals import LiteralMatcher
+from collocater.matcher import TokenMatcher
+from collocater.prefilter import CollocateIndex, required_words
+from collocater.scraper import BASE_URL, PageFetcher, fetch_pages
+from collocater.archive import PageArchive
+from collocater.pages import PARSE_ENGINES
+from collocater.cleaning import cleaning_rules, disassemble_alternatives, split_alternatives
+from collocater.store import DictionaryStore, write_dictionary
+from collocater.streaming import CHUNK_SIZE, stream_collocations
+from collocater.session import EditSession
+from collocater.highlight import highlight
+from collocater.results import CollocationTable
+from collocater.stats import CollocationStats
 
 
-def store_collocs_in_df(found_colls_dict):
+# Version of the format of the prebuilt pattern banks, to be increased 
+# whenever the way the collocations' patterns are built changes.
+PATTERN_BANK_VERSION = 2
+
+
+def _register_extensions():
     """
-    Function to transform the output of the Collocater class into a data frame.
+    Registers the token and Doc level attributes the collocations found are added to, 
+    unless they already are, so that it's done only once instead of on every call.
     """
     
-    df_colls = pd.DataFrame(found_colls_dict).T
-    
-    colls_type_df = df_colls.coll_type.str.split(' / ', expand=False)
-    df_colls.rename(columns={'coll_type': 'orig_coll_type'}, inplace=True)
+    if not Token.has_extension('colloc'):
+        Token.set_extension('colloc', default={})
+    if not Doc.has_extension('collocs'):
+        Doc.set_extension('collocs', default=[])
 
-    df_colls1 = pd.concat([df_colls, colls_type_df], axis='columns')
-    
-    df_colls2 = df_colls1.explode('coll_type')
-    
-    colls_type_df1 = df_colls2.coll_type.str.split('__', expand=True)
-    df_colls3 = pd.concat([df_colls2, colls_type_df1], axis='columns')
-    df_colls3.rename(columns={0: 'word_type', 1: 'Type of collocation'}, inplace=True)
-    
-    df_colls4 = df_colls3.assign(location=df_colls3["location"].map(lambda x: "start: {}; end: {}".format(x[0]+1, x[1])))
-    df_colls4 = df_colls4.assign(word_type=df_colls4["word_type"].map(lambda x: "{} ({})".format(x.split('_')[0], x.split('_')[-1])))
-    df_colls4.reset_index(inplace=True)
-    df_colls4.rename(columns={'index':'collocation', 
-                              'word_type': "Morphology of word with collocation", 
-                              'location': "Positions of first and last token of collocation"}, inplace=True)
-    
-    df_colls5 = df_colls4.set_index('Type of collocation')
-    df_colls5.rename(index={
-                    'prep':'Preposition', 
-                    'adj':'Adjective', 
-                    'adv':'Adverb', 
-                    'pre_verb': 'Object of verb', 
-                    'post_verb': 'Subject of verb',
-                    'post_noun': 'Appositive',
-                    'quant': 'Quantity noun',
-                    'phr': 'Phrase'}, inplace = True)
 
-    df_colls5.reset_index(inplace=True)
+def store_collocs_in_df(found_colls_dict):
+    """
+    Function to transform the output of the Collocater class into a data frame.
     
-    df_colls6 = df_colls5.set_index('collocation')
-    df_colls6.fillna('', inplace=True)
-    df_colls6.drop(columns=["orig_coll_type", "coll_type"], inplace=True)
-    df_colls6.index.name = None
-    coloco = df_colls6.columns.tolist()
-    columna = [coloco[-1]] + coloco[:-1]
-    found_colls_df = df_colls6[columna]
+    It's the human-readable view of the columns of a CollocationTable, 
+    which the collocations of many documents are better gathered in.
+    """
     
-    return found_colls_df     
+    return CollocationTable().add(found_colls_dict).readable()
     
             
 
@@ -84,16 +86,13 @@ def collocations_linker(text, found_collocations, color="rgb(255, 158, 0, 0.4)")
     """
     Function to transform the text where collocations are meant to be found 
     into a string with html tags to highlight the collocations found.
-    """
-
-    all_colls = found_collocations.keys()
-        
-    all_colls1 = sorted(all_colls, key=len)[::-1]
     
-    for col in all_colls1:
-        text = regex.sub(r'(?<='+f'{regex.escape(col)})'+r'(?:\b)', '</span>', regex.sub(r'(?:\b)(?='+f'{regex.escape(col)})', f'<span style="background-color: {color}">', text))
+    Only the occurrences found are highlighted, by their offsets, in a single pass 
+    over the text, which is escaped. See collocater.highlight for the other forms 
+    the collocations can be passed in and for writing large documents as they go.
+    """
 
-    return text
+    return highlight(text, found_collocations, color)
     
     
   
@@ -103,20 +102,40 @@ class Collocater():
     
     name = "colls"
     
+    # Spacy pipelines already loaded, shared by all the Collocater objects 
+    # working with the same model.
+    _pipelines = {}
+    _pipelines_lock = threading.Lock()
+    
     def __init__(self, 
                  irr_verbs, prepositions, collocations_dictionary=None,
                  chosen_collocation_types=None, chosen_word_types='both',
-                 tags_dict=None, spacy_model='en_core_web_sm'):
+                 tags_dict=None, spacy_model='en_core_web_sm', nlp=None,
+                 pattern_cache_size=1024, matching='full', parse_engine='bs4', engine='regex'):
         
         
         self.spacy_model = spacy_model
+        self._nlp = nlp
+        self.pattern_cache_size = pattern_cache_size
+        self._pattern_cache = LRUCache(pattern_cache_size)
+        self._pattern_bank = None
+        self.matching = matching
+        self.parse_engine = parse_engine
+        self.engine = engine
+        self._token_matcher = None
+        self._lock = threading.Lock()
+        self.literal_matcher = None
+        self.result_cache = None
+        # Number of times the entry of each word changed, for its patterns to be built again.
+        self._entry_versions = {}
+        self.collocate_index = None
         self.irr_verbs = irr_verbs
         self.prepositions = prepositions
         self.chosen_collocation_types = chosen_collocation_types 
         self.chosen_word_types = chosen_word_types
 
         
-        if not collocations_dictionary:
+        if collocations_dictionary is None:
             self.collocations_dictionary = {}
         else:
             self.collocations_dictionary = collocations_dictionary
@@ -133,22 +152,205 @@ class Collocater():
         else:
             self.tags_dict = tags_dict
             
+        _register_extensions()
+            
     
     
-    def loader(path=None):
+    def __getstate__(self):
+        """
+        Leaves the loaded Spacy pipeline, the caches and the lock out of the pickled object.
+        """
+        state = self.__dict__.copy()
+        state.pop('_nlp', None)
+        state.pop('_pattern_cache', None)
+        state.pop('_pattern_bank', None)
+        state.pop('_token_matcher', None)
+        state.pop('_lock', None)
+        state.pop('result_cache', None)
+        state.pop('_dictionary_version', None)
+        state.pop('_entry_versions', None)
+        return state
+    
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._nlp = None
+        self.__dict__.setdefault('pattern_cache_size', 1024)
+        self._pattern_cache = LRUCache(self.pattern_cache_size)
+        self._pattern_bank = None
+        self.__dict__.setdefault('matching', 'full')
+        self.__dict__.setdefault('parse_engine', 'bs4')
+        self.__dict__.setdefault('engine', 'regex')
+        self._token_matcher = None
+        self._lock = threading.Lock()
+        self.__dict__.setdefault('literal_matcher', None)
+        self.result_cache = None
+        self._entry_versions = {}
+        self.__dict__.setdefault('collocate_index', None)
+        self.__dict__.pop('collocations_types', None)
+        _register_extensions()
+        
+        
+    def loader(path=None, nlp=None, pattern_bank=None, lazy=False, collocate_index=None):
         """
         Determines where the file is supposed to be found and loads it.
+        
+        Parameters:
+            path (str): Optional path to the pickled Collocater object, or to an SQLite
+                store of its collocations dictionary when loading it lazily.
+            nlp (spacy.language.Language): Optional, already loaded Spacy pipeline 
+                to be used by the Collocater object instead of loading its own.
+            pattern_bank (bool/str): Optional argument to load the prebuilt pattern bank 
+                shipped with the package, when True, or the one stored in the path provided.
+            lazy (bool): Whether only the object's settings and the directory of headwords 
+                should be loaded, leaving each entry of the collocations dictionary to be 
+                read the first time it is needed.
+            collocate_index (bool/str): Optional argument to load the prebuilt collocate index 
+                shipped with the package, when True, or the one stored in the path provided.
         """
         
-        if not path:
+        if lazy:
+            obj = Collocater._lazy_loader(path)
+        elif not path:
             obj = joblib.load(pkr.resource_stream(__name__, 'data/collocater_obj.joblib'))
         else:
             with open(path, 'rb') as fh:
                 obj = joblib.load(fh)      
+        
+        if nlp is not None:
+            obj.set_nlp(nlp)
+            
+        if pattern_bank:
+            obj.load_pattern_bank(None if pattern_bank is True else pattern_bank)
+            
+        if collocate_index:
+            obj.load_collocate_index(None if collocate_index is True else collocate_index)
                 
         return obj
     
     
+    def _lazy_loader(path=None):
+        """
+        Loads a Collocater object whose collocations dictionary is read on demand from 
+        an SQLite store. Without a path, the store shipped with the package is opened 
+        in read-only mode, so that nothing is unpickled nor written. When a pickled object 
+        is provided, the store is written next to it, or in the user's cache directory 
+        when that's not possible, the first time the object is loaded this way 
+        and then reused until the object's file changes.
+        """
+        
+        if not path:
+            store_path = pkr.resource_filename(__name__, 'data/collocations_dict.sqlite')
+            if not os.path.exists(store_path):
+                raise FileNotFoundError(
+                    f"The collocations dictionary store isn't shipped with this installation. Build it with: "
+                    f"python -m collocater convert-dictionary collocater/data/collocater_obj.joblib {store_path}")
+        elif path.endswith('.sqlite'):
+            store_path = path
+        else:
+            stat = os.stat(path)
+            source = [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+            store_path = Collocater._store_path(path)
+            
+            if Collocater._store_source(store_path) != source:
+                with open(path, 'rb') as fh:
+                    obj = joblib.load(fh)
+                # Written under a temporary name, so that processes loading the object 
+                # at the same time never come across a half written store.
+                tmp_path = f"{store_path}.{os.getpid()}.tmp"
+                try:
+                    write_dictionary(obj.collocations_dictionary, tmp_path, 
+                                     meta={'settings': obj.settings(), 'source': source}).close()
+                    os.replace(tmp_path, store_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                
+        store = DictionaryStore(store_path)
+        settings = store.meta('settings')
+        if settings is None:
+            raise ValueError(f"The store at {store_path} lacks the settings of the Collocater object")
+        store.headwords()
+        
+        return Collocater(collocations_dictionary=store, **settings)
+    
+    
+    def _store_source(store_path):
+        """
+        Returns the name, size and modification time of the pickled object the store 
+        was written from, or None when there's no store this version can read.
+        """
+        
+        if not os.path.exists(store_path):
+            return None
+        
+        store = DictionaryStore(store_path)
+        try:
+            return store.meta('source')
+        except ValueError:
+            return None
+        finally:
+            store.close()
+    
+    
+    def _store_path(path):
+        """
+        Returns the path of the SQLite store of the collocations dictionary of the pickled 
+        object provided, falling back to the user's cache directory when the object's one 
+        is not writable.
+        """
+        
+        store_path = os.path.splitext(path)[0] + '.sqlite'
+        if os.access(os.path.dirname(os.path.abspath(store_path)), os.W_OK):
+            return store_path
+        
+        cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'collocater')
+        os.makedirs(cache_dir, exist_ok=True)
+        
+        return os.path.join(cache_dir, os.path.basename(store_path))
+    
+    
+    def settings(self):
+        """
+        Returns the arguments the object would be built again with, 
+        leaving the collocations dictionary and the Spacy pipeline out.
+        """
+        
+        return {'irr_verbs': self.irr_verbs, 
+                'prepositions': self.prepositions, 
+                'chosen_collocation_types': self.chosen_collocation_types, 
+                'chosen_word_types': self.chosen_word_types, 
+                'tags_dict': self.tags_dict, 
+                'spacy_model': self.spacy_model, 
+                'pattern_cache_size': self.pattern_cache_size, 
+                'matching': self.matching, 
+                'parse_engine': self.parse_engine, 
+                'engine': self.engine}
+    
+    
+    def get_nlp(self):
+        """
+        Returns the Spacy pipeline used by this object, which is loaded only once 
+        and shared by all the calls to it and the rest of Collocater objects 
+        working with the same model.
+        """
+        
+        if self._nlp is None:
+            with Collocater._pipelines_lock:
+                if self.spacy_model not in Collocater._pipelines:
+                    Collocater._pipelines[self.spacy_model] = spacy.load(self.spacy_model, disable=['ner'])
+            self._nlp = Collocater._pipelines.get(self.spacy_model)
+            
+        return self._nlp
+    
+    
+    def set_nlp(self, nlp):
+        """
+        Injects an already loaded Spacy pipeline to be used by this object.
+        """
+        self._nlp = nlp
+    
+    
             
     def saver(self, path):
         """
@@ -156,35 +358,104 @@ class Collocater():
         """
         with open(path, 'wb') as fh:
             joblib.dump(self, fh)  
+            
+            
+    def build_pattern_bank(self, path):
+        """
+        Builds the not yet compiled patterns matching the collocations of every noun and verb 
+        in the collocations dictionary and saves them in an SQLite store, so that they don't have 
+        to be built again when the object is loaded in a different process.
+        
+        The patterns of each word are stored along with a digest of the entry they were built from, 
+        and only used as long as the word's entry is the same.
+        
+        Parameters:
+            path (str): Path of the SQLite database where the pattern bank should be saved, 
+                which is replaced if it already exists.
+            
+        Returns:
+            bank (DictionaryStore): The pattern bank, opened in read-only mode, with 
+                the digest of the entry and the compressed patterns of each morphology and word.
+        """
+        
+        patterns = {}
+        for word, collocations in self.collocations_dictionary.items():
+            if not collocations:
+                continue
+            digest = Collocater._entry_digest(collocations)
+            for morpho in ['noun', 'verb']:
+                if not collocations.get(morpho):
+                    continue
+                word1, colls_types = self._pattern_sources(word, morpho, collocations)
+                sources = {k: Collocater._wrap_pattern(reg) for k, reg in colls_types.items() if reg}
+                # The patterns are compressed, as they repeat the same tags' expressions over and over.
+                sources = base64.b64encode(zlib.compress(json.dumps(sources).encode('utf-8'), 9)).decode('ascii')
+                patterns[f"{morpho}:{word}"] = [digest, word1, sources]
+        
+        if os.path.exists(path):
+            os.remove(path)
+                
+        return write_dictionary(patterns, path, meta={'bank_version': PATTERN_BANK_VERSION, 
+                                                      'tags': self._tags_key()})
+    
+    
+    def load_pattern_bank(self, path=None):
+        """
+        Opens the prebuilt pattern bank shipped with the package, or the one 
+        stored in the path provided, for the object to read the patterns of each word 
+        from it the first time they're needed, instead of building them.
+        """
+        
+        if not path:
+            path = pkr.resource_filename(__name__, 'data/pattern_bank.sqlite')
+        bank = DictionaryStore(path, cache_size=0)
+                
+        if bank.meta('bank_version') != PATTERN_BANK_VERSION:
+            raise ValueError(f"The pattern bank's version ({bank.meta('bank_version')}) doesn't match "
+                             f"the one this version of Collocater works with ({PATTERN_BANK_VERSION})")
+        
+        self._pattern_bank = (bank, tuple(tuple(tag) for tag in bank.meta('tags')))
+        
+        
+    def _entry_digest(collocations):
+        """
+        Function to work out a digest of the entry of a word of the collocations dictionary, 
+        for its patterns in the pattern bank to be used only as long as it doesn't change.
+        """
+        
+        return hashlib.sha256(json.dumps(collocations, sort_keys=True).encode('utf-8')).hexdigest()[:32]
                   
     
-    def _get_proxies(url):
+    def _get_proxies(url, max_attempts=10, timeout=10):
         """
         Function meant to provide different proxies 
         to scrape the website of the url provided as input.
+        
+        Parameters:
+            url (str): The url to be requested.
+            max_attempts (int): Maximum number of proxies tried before giving up.
+            timeout (float): Seconds waited for each request to be answered.
         """
         
         try:
-            r_obj = requests.get(url)
-        except:
-            proxy = 0
-            while not type(proxy) == str:
-                
-                try:
-                    url = 'https://free-proxy-list.net/'
-                    response = requests.get(url)
-                    parser = fromstring(response.text)
-                    ip = random.choice(parser.xpath('//tbody/tr'))
-                    if ip.xpath('.//td[7][contains(text(),"yes")]'):
-                        proxy = ":".join([ip.xpath('.//td[1]/text()')[0], ip.xpath('.//td[2]/text()')[0]])
-                        proxies = {"http": proxy, "https": proxy}
-                        
-                except:
-                   continue
-       
-            r_obj = requests.get(url, proxies)
+            return requests.get(url, timeout=timeout)
+        except requests.RequestException as error:
+            last_error = error
+            
+        for _ in range(max_attempts):
+            try:
+                response = requests.get('https://free-proxy-list.net/', timeout=timeout)
+                parser = fromstring(response.text)
+                ip = random.choice(parser.xpath('//tbody/tr'))
+                if not ip.xpath('.//td[7][contains(text(),"yes")]'):
+                    continue
+                proxy = ":".join([ip.xpath('.//td[1]/text()')[0], ip.xpath('.//td[2]/text()')[0]])
+                return requests.get(url, proxies={"http": proxy, "https": proxy}, timeout=timeout)
+                    
+            except (requests.RequestException, IndexError, ValueError) as error:
+                last_error = error
                    
-        return r_obj
+        raise last_error
     
     
     def _looper(x, function, **kwargs):
@@ -313,17 +584,7 @@ class Collocater():
                 be found separated by a forward slash in the same string.
         """
          
-        b = []
-        for a in x:
-            r = regex.search(r'\/', a)
-            if r:
-                a = regex.sub(r'(?<=\ban?)\s(?=\w+)', '_', a)
-                for match in regex.findall(r'([\w\-\_]+\/[\w\-\_]+)', a):
-                    for c in match.split("/"):
-                        b.append(regex.sub(r'(?<=\ban?)_(?=\w+)', ' ', regex.sub(r"(?<=[\W_,])"+f"({match})"+"(?=[\W_,])", c, a)))
-            else:
-                b.append(a)
-        return b
+        return disassemble_alternatives(x)
                     
               
     def _alts_diss(x):
@@ -344,13 +605,7 @@ class Collocater():
                 be found separated by a forward slash in the same string.
         """
         
-        if not isinstance(x, list):
-            x = [x]
-        
-        while regex.search(r'\/', '; '.join(x)):
-            x = list(set(Collocater._alternatives_disassembler(x)))  
-    
-        return x
+        return split_alternatives(x)
     
     
     def _cleaner(x, tags_dict):
@@ -365,19 +620,7 @@ class Collocater():
                 collocations with traceable tags.
         """
         
-        return regex.sub(r'Special\spage\sat', '', 
-                         regex.sub(r'(\(.?\=[^\)]+\))|(,\setc)', '', 
-                                  regex.sub(r'(?<=\w+)(,\s)(?=\w+,\setc\s'+f"{tags_dict.get('this_word')})", '/',
-                                            regex.sub(regex.compile(tags_dict.get('this_word') + '|' + '~', regex.I), tags_dict.get('this_word'),
-                                                      regex.sub(r'…', tags_dict.get('one_word'),
-                                                                regex.sub(r"(?<=\W)(your|his|her|their|my|our|("+f"{tags_dict.get('someone')}"+"|"+f"{tags_dict.get('sb_sth')}"+"|"+f"{tags_dict.get('something')}"+ "|a\sperson|one)'s)(?=\W)", tags_dict.get('possessive_det'),
-                                                                          regex.sub(r"(?<=\W)(some(one|body)|sb|you|him|her|them|us|we|they|he|she)(?=\W)", tags_dict.get('someone'),
-                                                                                    regex.sub(r"(?<=\W)((some|a)?things?|sth)(?=\W)", tags_dict.get('something'),
-                                                                                              regex.sub(r"(?<=\W)(some(one|body)\/something|sb\/sth)(?=\W)", tags_dict.get('sb_sth'),
-                                                                                                        regex.sub(r'[A-Z]{2,}', '', 
-                                                                                                                  regex.sub(r'([\<\>\.\+]|\&\w+)', '', 
-                                                                                                                            regex.sub(r'\([^\)]{23,}\)', '', 
-                                                                                                                                     regex.sub(r'<.?\w>', '', ' '+ x + ' ')))))))))))))
+        return cleaning_rules(tags_dict).clean(x, tags_dict.get('this_word'))
     
         
     def _colls_processor(without_examples, tags_dict):
@@ -398,23 +641,10 @@ class Collocater():
                 for each of the word's senses. 
         """
         
-        cleaned_colls = Collocater._cleaner(without_examples, tags_dict)
-        dissambled_colls0 = '; '.join(Collocater._alts_diss(cleaned_colls))
-        
-        if regex.search(r'[\(\)]+', dissambled_colls0):
-            dissambled_colls = regex.sub(r'[\(\)]+', '', regex.sub(r'\([\w\s\-]+\)', '', dissambled_colls0))
-            dissambled_colls += '; '+regex.sub(r'[\(\)]+', '', dissambled_colls0)
-        else:
-            dissambled_colls = dissambled_colls0
-                
-        singles = [e for e in list(map(lambda x: x.strip(), regex.split(r'[,;\:\.\|]', regex.sub(r'(\S+\s)(?=\1)', '', regex.sub(r'\s+', ' ', dissambled_colls))))) 
-        if not (regex.search(r'[\/\(]', e) or regex.match(r"({0})$".format(tags_dict.get('this_word')), e))]
-        singletons = list(set([e for e in singles if e]))
-        
-        return singletons
+        return cleaning_rules(tags_dict).collocations(without_examples, tags_dict.get('this_word'))
     
         
-    def collocate(self, word, verbose=False):
+    def collocate(self, word, verbose=False, base_url=None, archive=None, replay=False):
         """
         Scrapes the Online Oxford Collocation Dictionary to extract collocations.
         
@@ -422,6 +652,11 @@ class Collocater():
             word (str): The word to be queried in the Online Oxford Collocation Dictionary.
             verbose (bool): Optional argument to print message out to screen when collocations 
                 could not be found for the word provided as input.
+            base_url (str): Optional URL the word is appended to, instead of the dictionary's search page.
+            archive (PageArchive/str): Optional archive, or its directory, where the page fetched 
+                should be stored.
+            replay (bool): Whether the word's collocations should be extracted again from its page 
+                in the archive, without any request, even if the word is already in the dictionary.
             
         Returns:
             collocations (dict): All the collocations for the word provided as input, 
@@ -429,28 +664,123 @@ class Collocater():
                 the queried word has when they are found acting as the word's collocations.
         """
         
+        archive = Collocater._page_archive(archive)
+        if replay:
+            if archive is None:
+                raise ValueError("Replaying requires the archive the pages were stored in")
+            page = archive.get(word)
+            if page is None:
+                if verbose:
+                    print(f"'{word}' is not in the archive")
+                return None
+            return self._collocations_from_page(word, page, verbose)
+        
         if word in self.collocations_dictionary:
             return self.collocations_dictionary.get(word)
 
-        url0 = 'http://oxforddictionary.so8848.com/search?word='
-        ox_coll = Collocater._get_proxies(url0 + word)
-        core_soup = bs(ox_coll.text, 'lxml')  
-          
-        try:
-            soup = core_soup.find_all('div', {'class':'item'})
+        ox_coll = Collocater._get_proxies((base_url or BASE_URL) + quote(word))
+        if archive is not None and ox_coll.ok:
+            archive.put(word, ox_coll.text)
+        
+        return self._collocations_from_page(word, ox_coll.text, verbose)
+    
+    
+    def _page_archive(archive):
+        """
+        Opens the archive of pages in the directory provided, if that's what was provided.
+        """
+        
+        if isinstance(archive, str):
+            return PageArchive(archive)
+        
+        return archive
+    
+    
+    def rebuild_from_archive(self, archive, words=None, verbose=False):
+        """
+        Extracts again the collocations of the words archived, or of the ones provided, 
+        from their archived pages, replacing their entries in the collocations dictionary.
+        
+        Parameters:
+            archive (PageArchive/str): The archive, or its directory.
+            words (iterable): Optional words to be rebuilt, which default to all the archived ones.
+            verbose (bool): Optional argument to print message out to screen for the words 
+                which are not in the archive or whose collocations could not be found.
+            
+        Returns:
+            collocations (dict): The collocations of each word, as returned by collocate.
+        """
+        
+        archive = Collocater._page_archive(archive)
+        
+        return {word: self.collocate(word, verbose=verbose, archive=archive, replay=True) 
+                for word in (archive if words is None else words)}
+    
+    
+    def collocate_many(self, words, concurrency=8, rate=None, retries=3, backoff=0.5, timeout=10, 
+                       base_url=None, archive=None, verbose=False):
+        """
+        Scrapes the Online Oxford Collocation Dictionary for many words at a time, 
+        with a pool of threads sharing the same keep-alive connections. 
+        
+        Parameters:
+            words (iterable): The words to be queried.
+            concurrency (int): Number of pages requested at the same time.
+            rate (float): Optional maximum number of requests per second.
+            retries (int): Number of times a failed request is retried, waiting longer each time.
+            backoff (float): Seconds waited before retrying a request for the first time.
+            timeout (float): Seconds waited for the server to answer each request.
+            base_url (str): Optional URL the words are appended to, instead of the dictionary's search page.
+            archive (PageArchive/str): Optional archive, or its directory, where the pages fetched 
+                should be stored.
+            verbose (bool): Optional argument to print message out to screen for the words 
+                whose collocations could not be found or whose pages could not be retrieved.
+            
+        Returns:
+            collocations (dict): The collocations of each word, as returned by collocate. 
+                The words whose pages could not be retrieved are left out.
+        """
+        
+        results = {}
+        missing = []
+        for word in dict.fromkeys(words):
+            if word in self.collocations_dictionary:
+                results[word] = self.collocations_dictionary.get(word)
+            else:
+                missing.append(word)
                 
-        except:
-            soup = [core_soup.find('div', {'class':'item'})]
+        if not missing:
+            return results
+        
+        archive = Collocater._page_archive(archive)
+        fetcher = PageFetcher(base_url, rate=rate, pool_size=concurrency, retries=retries, 
+                              backoff=backoff, timeout=timeout)
+        try:
+            # The pages are parsed here, one at a time, as they arrive.
+            for word, page, error in fetch_pages(missing, fetcher, concurrency):
+                if error is not None:
+                    if verbose:
+                        print(f"Couldn't retrieve the page of '{word}': {error}")
+                    continue
+                if archive is not None and page is not None:
+                    archive.put(word, page)
+                results[word] = self._collocations_from_page(word, page or '', verbose)
+        finally:
+            fetcher.close()
             
-        if soup:
-            word_type = []
-            for s in soup:
-                try:
-                    word_type.append(s.find_all('p', {'class':'word'}))
-                except:
-                    word_type.append([s.find('p', {'class':'word'})])
-            word_type = sum(word_type, [])
-        else:
+        return results
+    
+    
+    def _collocations_from_page(self, word, page, verbose=False):
+        """
+        Extracts the collocations of the word from its page of the 
+        Online Oxford Collocation Dictionary, with the object's parse engine, 
+        and adds them to the collocations dictionary.
+        """
+        
+        word_types, items = PARSE_ENGINES[self.parse_engine](page)
+            
+        if not items:
             if verbose:
                 print(f"""
                       No collocations found for '{word}', sorry. 
@@ -458,29 +788,19 @@ class Collocater():
                       """)
             return None
         
-        tags_dict = self.tags_dict
-        tags_dict['this_word'] = word
+        # The word is only set in a copy of the tags, so that the object isn't changed 
+        # by the words being processed.
+        tags_dict = dict(self.tags_dict, this_word=word)
     
         collocations = {}
-        for idx in range(len(word_type)):
-            if not word_type[idx].i:
+        for idx in range(len(word_types)):
+            if word_types[idx] is False:
                 continue
-            wt = word_type[idx].i.string.strip()
+            wt = word_types[idx].strip()
             collocations[wt] = {}
-            for a in soup[idx].find_all('p'):
-                if a.u:
-                    word_morph = a.u.string.strip()  
-                    word_morph = regex.sub(regex.compile('(\w+\,\s)*'+ word + '(\,\s\w+)*', regex.I), tags_dict.get('this_word'), word_morph)
-                else:
-                    continue
-                    
-                try:
-                    examples = a.find_all('i')
-                    re_examples = regex.compile('|'.join(list(map(lambda x: regex.escape(str(x)), examples))))
-                    without_examples = regex.sub(re_examples, '', str(a))
-    
-                except:
-                    without_examples = str(a)
+            for u, without_examples in items[idx]:
+                word_morph = u.strip()  
+                word_morph = regex.sub(regex.compile('(\w+\,\s)*'+ word + '(\,\s\w+)*', regex.I), tags_dict.get('this_word'), word_morph)
                                     
                 if word == 'look' and word_morph == 'PREP.':
                     if regex.search(r'glazed', without_examples):
@@ -492,37 +812,32 @@ class Collocater():
                 collocations[wt].setdefault(word_morph, []).append(singletons)   
                 
         self.collocations_dictionary[word] = collocations
+        self._dictionary_version = None
+        self._forget_patterns(word)
         
         return collocations
     
     
-    def collocations_identifier(self, word, morpho, text):
+    def _pattern_sources(self, word, morpho, collocations, literals=False):
         """
-        Function to build and compile the regular expressions to match 
-        the collocations of nouns or verbs in text and return them.
+        Function to build the regular expressions to match 
+        the collocations of nouns or verbs in text.
         
         Parameters:
-            word (str): The word for which collocations should be identified.
+            word (str): The word whose collocations the patterns should match.
             morpho (string): The inputted word's morphology, which takes on the values 
                 of either 'noun' or 'verb'.
-            text (str): The text where collocations should be found.
+            collocations (dict): The word's entry in the collocations dictionary.
+            literals (bool): Whether the literal prepositional collocations and phrases of nouns 
+                should be left out of the patterns, for the literal matcher to find them.
                 
         Returns:
-            coll_matches (dict): All the matches for the inputted word's collocations 
-                in the inputted text, sorted according to their morphologies, 
-                given the word's morphology.
+            word1 (str): Not yet compiled regular expression pattern with all 
+                the variant inflected forms of the inputted word.
+            colls_types (dict): Not yet compiled regular expression patterns 
+                for each of the types of collocations, empty when the word has none.
         """
-    
-        collocations = self.collocate(word)
-        
-        if not collocations:
-            return {}
         
-        tags_dict = self.tags_dict
-        tags_dict['this_word'] = word
-    
-        text = regex.sub(r"\band\b", '&&', regex.sub(r"\bor\b", "@@", text))
-    
         if morpho == 'noun' and collocations.get('noun'):
             word1 = Collocater._noun_regulater(word)
             adv = ''
@@ -537,8 +852,8 @@ class Collocater():
             else:
                 adj = ''
                 
-            if collocations.get('noun').get('VERB + '+tags_dict.get('this_word')):
-                a = set(sum(collocations.get('noun').get('VERB + '+tags_dict.get('this_word')), []))
+            if collocations.get('noun').get('VERB + '+word):
+                a = set(sum(collocations.get('noun').get('VERB + '+word), []))
                 b = [e for e in a if not e in ['have', 'be']]
                 if b:
                     c = Collocater._looper(b, Collocater._verbal_regulater, irr_vbs=self.irr_verbs)
@@ -561,8 +876,8 @@ class Collocater():
             else:
                 pre_verb = ''
                 
-            if collocations.get('noun').get(tags_dict.get('this_word')+' + VERB'):
-                a = set(sum(collocations.get('noun').get(tags_dict.get('this_word')+' + VERB'), []))
+            if collocations.get('noun').get(word+' + VERB'):
+                a = set(sum(collocations.get('noun').get(word+' + VERB'), []))
                 b = [e for e in a if not e in ['have', 'be']]
                 if b:
                     c = Collocater._looper(b, Collocater._verbal_regulater, irr_vbs=self.irr_verbs)
@@ -577,8 +892,8 @@ class Collocater():
             else:
                 post_verb = ''
     
-            if collocations.get('noun').get(tags_dict.get('this_word')+' + NOUN'):
-                a = list(set(sum(collocations.get('noun').get(tags_dict.get('this_word')+' + NOUN'), [])))
+            if collocations.get('noun').get(word+' + NOUN'):
+                a = list(set(sum(collocations.get('noun').get(word+' + NOUN'), [])))
                 b = Collocater._looper(a, Collocater._noun_regulater)
                 post_noun = f"{word1}\s" + f"({b})"
             else:
@@ -593,12 +908,16 @@ class Collocater():
                 
             if collocations.get('noun').get('PREP.'):
                 a = list(set(sum(collocations.get('noun').get('PREP.'), [])))
+                if literals:
+                    a = [e for e in a if not Collocater._is_literal(e)]
                 prep = "{0}".format('|'.join(list(map(regex.escape, a))))
             else:
                 prep = ''
                 
             if collocations.get('noun').get('PHRASES'):
                 a = sum(collocations.get('noun').get('PHRASES'), [])
+                if literals:
+                    a = [e for e in a if not Collocater._is_literal(e)]
                 phr = "{0}".format('|'.join(list(map(regex.escape, a))))
             else:
                 phr = ''
@@ -631,8 +950,8 @@ class Collocater():
             else:
                 phr = ''
                 
-            if collocations.get('verb').get('VERB + '+tags_dict.get('this_word')):
-                a = list(set(sum(collocations.get('verb').get('VERB + '+tags_dict.get('this_word')), [])))
+            if collocations.get('verb').get('VERB + '+word):
+                a = list(set(sum(collocations.get('verb').get('VERB + '+word), [])))
                 b = Collocater._looper(a, Collocater._verbal_regulater, irr_vbs=self.irr_verbs)
                             
                 relevant_preps = set(regex.findall(r'(?<=\s)[a-z]+(?=_)', '_'.join(a)))
@@ -643,43 +962,681 @@ class Collocater():
             else:
                 pre_verb = '' 
         else:
+            word1 = None
             adj, pre_verb, post_verb, post_noun, quant, prep, adv, phr = '', '', '', '', '', '', '', ''
             
             
         colls_types = {'adj': adj, 'pre_verb': pre_verb, 
                        'post_verb': post_verb, 'post_noun': post_noun, 
                        'quant': quant, 'prep': prep, 'phr': phr, 'adv': adv}
-                
+        
+        return word1, colls_types
+    
     
-        if not self.chosen_collocation_types:
-            self.collocations_types = colls_types
+    def _wrap_pattern(reg):
+        """
+        Function to delimit the pattern of a type of collocations by non-word characters
+        and to replace the tags standing for pronouns and other discoursive variables 
+        with the patterns matching them.
+        """
+        
+        string1 = f"((?:[\W_]|^)({reg})(?:[\W_]|$))"
+        string2 = regex.sub(r'(?<!\{)\d+(?!\})', '\d+', string1)
+        string3 = regex.sub(r'((\\ )?__[A-Z]+__)(?=\\ )', "(\s[\w\-]+){1,3}", string2)
+        string4 = regex.sub(r'((\\ )?__[A-Z_]+__)(?=\\ )', "(\s((his|her|their|our|my|your)(\s[\w\-]+){0,2}|([\w\-\.]+\s)?[\w\-]+\'s?))", string3)
+        string5 = regex.sub(r'((\\ )?__[A-Z_]+__)', "(\s((the|an?|this|that|these|those|his|her|their|our|my|your|some|many|few|plenty)\s)?[\w\*\-\']+)", string4)
+        
+        return string5
+    
+    
+    def _wrapped_patterns(self, word, morpho, collocations):
+        """
+        Function to retrieve the not yet compiled patterns matching the collocations 
+        of nouns or verbs in text from the pattern bank, or to build them when 
+        they can't be found there.
+        
+        Returns:
+            word1 (str): Not yet compiled regular expression pattern with all 
+                the variant inflected forms of the inputted word.
+            sources (dict): Not yet compiled pattern of each type of collocations.
+        """
+        
+        banked = None
+        if self._pattern_bank is not None and self._pattern_bank[1] == self._tags_key():
+            banked = self._pattern_bank[0].get(f"{morpho}:{word}")
+            if banked and banked[0] != Collocater._entry_digest(collocations):
+                banked = None
+            
+        if banked:
+            _, word1, sources = banked
+            sources = json.loads(zlib.decompress(base64.b64decode(sources)))
+        else:
+            word1, colls_types = self._pattern_sources(word, morpho, collocations)
+            sources = {k: Collocater._wrap_pattern(reg) for k, reg in colls_types.items() if reg}
+            
+        if self.literal_matcher is not None and morpho == 'noun':
+            # Only the collocations with tags are left for the patterns to match.
+            sources = {k: v for k, v in sources.items() if k not in ['prep', 'phr']}
+            noun_entry = {k: v for k, v in collocations.get('noun', {}).items() if k in ['PREP.', 'PHRASES']}
+            _, literal_types = self._pattern_sources(word, morpho, {'noun': noun_entry}, literals=True)
+            for k in ['prep', 'phr']:
+                if literal_types.get(k):
+                    sources[k] = Collocater._wrap_pattern(literal_types.get(k))
+                    
+        return word1, sources
+    
+    
+    def _compiled_patterns(self, word, morpho, collocations, keys=None):
+        """
+        Function to retrieve the compiled regular expressions to match the collocations 
+        of nouns or verbs in text from the object's LRU cache, building them only when 
+        they can't be found there and compiling each of them only when it is first needed.
+        
+        Parameters:
+            keys (set): Optional types of collocations whose patterns should be returned, 
+                out of the chosen ones.
+        
+        Returns:
+            word_re (regex.Pattern): Compiled pattern matching the inputted word's inflected forms.
+            patterns (dict): Compiled pattern of each chosen type of collocations.
+            spans (dict): Maximum spans of the patterns, only worked out when needed.
+        """
+        
+        if self.chosen_collocation_types:
+            chosen = tuple(sorted(self.chosen_collocation_types))
         else:
-            self.collocations_types = {k:v for k, v in colls_types.items() if k in self.chosen_collocation_types}
+            chosen = None
+        tags = self._tags_key()
+        literals = self.literal_matcher is not None
+        key = (word, morpho, chosen, tags, literals, self._entry_versions.get(word, 0))
+        
+        entry = self._pattern_cache.get(key)
+        if entry is None:
+            word1, sources = self._wrapped_patterns(word, morpho, collocations)
+            sources = {k: source for k, source in sources.items() if not chosen or k in chosen}
+            word_re = regex.compile(r'\b'+word1+r'\b', regex.I) if word1 else None
+            entry = (word_re, {}, {}, sources)
+            self._pattern_cache.put(key, entry)
+            
+        word_re, compiled, spans, sources = entry
+        patterns = {}
+        for k, source in sources.items():
+            if keys is not None and k not in keys:
+                continue
+            if k not in compiled:
+                compiled[k] = regex.compile(source, regex.I)
+            patterns[k] = compiled.get(k)
+            
+        return word_re, patterns, spans
+    
+    
+    def _max_span(source):
+        """
+        Function to work out the maximum number of whitespace characters to be found 
+        in the strings matched by a regular expression pattern.
+        
+        Parameters:
+            source (str): Not yet compiled regular expression pattern.
+            
+        Returns:
+            span (int): Maximum number of whitespace characters of the pattern's matches, 
+                or None if their number is unbounded.
+        """
+        
+        inf = float('inf')
+        # Each frame holds the maximum of the group's finished alternatives, 
+        # the sum of the current one, the value of its last atom 
+        # and whether the group is a lookaround.
+        stack = [[0, 0, 0, False]]
+        i = 0
+        while i < len(source):
+            ch = source[i]
+            frame = stack[-1]
+            if ch == '\\':
+                atom = 1 if source[i+1:i+2] in ['s', ' '] else 0
+                i += 2
+            elif ch == '[':
+                j = i + 1
+                if source[j:j+1] == '^':
+                    j += 1
+                if source[j:j+1] == ']':
+                    j += 1
+                while j < len(source) and source[j] != ']':
+                    j += 2 if source[j] == '\\' else 1
+                char_class = source[i:j+1]
+                atom = 1 if (char_class.startswith('[^') or regex.search(r'\\[WsS]| ', char_class)) else 0
+                i = j + 1
+            elif ch == '(':
+                prefix = regex.compile(r'\((\?(:|=|!|<=|<!))?').match(source, i).group()
+                stack.append([0, 0, 0, prefix in ['(?=', '(?!', '(?<=', '(?<!']])
+                i += len(prefix)
+                continue
+            elif ch == ')':
+                best, current, _, lookaround = stack.pop()
+                atom = 0 if lookaround else max(best, current)
+                frame = stack[-1]
+                i += 1
+            elif ch == '|':
+                frame[0] = max(frame[0], frame[1])
+                frame[1], frame[2] = 0, 0
+                i += 1
+                continue
+            elif ch in '?*+{':
+                quantifier = regex.compile(r'\{(\d*)(,(\d*))?\}').match(source, i)
+                if ch == '{' and not quantifier:
+                    atom = 0
+                    i += 1
+                else:
+                    if ch == '?':
+                        upper = 1
+                        i += 1
+                    elif ch in '*+':
+                        upper = inf
+                        i += 1
+                    else:
+                        bound = quantifier.group(3) if quantifier.group(2) else quantifier.group(1)
+                        upper = int(bound) if bound else inf
+                        i += len(quantifier.group())
+                    if source[i:i+1] in ['?', '+']:
+                        i += 1
+                    last = frame[2]
+                    if last:
+                        frame[1] += last * upper - last
+                        frame[2] = last * upper
+                    continue
+            else:
+                atom = 1 if ch == ' ' else 0
+                i += 1
+                
+            frame[1] += atom
+            frame[2] = atom
+        
+        span = max(stack[0][0], stack[0][1])
+        
+        return None if span == inf else int(span)
+    
+    
+    def _max_pattern_span(self, word, morpho, collocations):
+        """
+        Function to work out the maximum number of whitespace characters to be found 
+        in the collocations of the inputted word matched by its patterns.
+        """
+        
+        _, patterns, spans = self._compiled_patterns(word, morpho, collocations)
+        if 'max' not in spans:
+            pattern_spans = [Collocater._max_span(p.pattern) for p in patterns.values()]
+            spans['max'] = None if None in pattern_spans else max(pattern_spans, default=0)
+            
+        return spans.get('max')
+    
+    
+    def _windowed_matches(self, doc, groups, candidates=None):
+        """
+        Function to match the collocations of each group of tokens sharing lemma and morphology
+        only in the windows of text surrounding them, instead of in the whole text. 
+        
+        The windows extend the patch of tokens where the matches of each token's collocations 
+        are looked for by as many words as its collocations can span, so that all the matches 
+        overlapping the patch are found, and overlapping windows are merged.
+        
+        Parameters:
+            doc (spacy.tokens.doc.Doc): The text whose collocations are meant to be found.
+            groups (dict): The positions of the tokens of each lemma and morphology.
+            candidates (dict): Optional types of collocations whose patterns should be run 
+                for each lemma and morphology.
+            
+        Returns:
+            group_colls (dict): The strings and character offsets of the matches 
+                of the collocations of each lemma and morphology, sorted according to their morphologies.
+        """
+        
+        text = str(doc)
+        word_bounds = [(m.start(), m.end()) for m in regex.finditer(r'\S+', text)]
+        word_starts = [start for start, _ in word_bounds]
+        
+        group_colls = {}
+        for (lemma, morpho), idxs in groups.items():
+            collocations = self.collocate(lemma)
+            keys = (candidates or {}).get((lemma, morpho))
+            if not collocations or keys == set():
+                group_colls[(lemma, morpho)] = {}
+                continue
+            
+            span = self._max_pattern_span(lemma, morpho, collocations)
+            windows = []
+            for idx in idxs:
+                first, last = max(idx-7, 0), min(idx+9, len(doc)-1)
+                start = doc[first].idx
+                end = doc[last-1].idx + len(doc[last-1]) if last > first else start
+                if span is None or not word_bounds:
+                    windows.append((0, len(text)))
+                    continue
+                first_word = max(bisect_right(word_starts, start) - 1, 0)
+                last_word = max(bisect_right(word_starts, max(end-1, start)) - 1, 0)
+                windows.append((word_bounds[max(first_word - span - 2, 0)][0], 
+                                word_bounds[min(last_word + span + 2, len(word_bounds)-1)][1]))
+            
+            merged = []
+            for start, end in sorted(windows):
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+                    
+            colls_in_text = {}
+            for start, end in merged:
+                for k, v in self._find_matches(lemma, morpho, text[start:end], offset=start, keys=keys).items():
+                    colls_in_text.setdefault(k, []).extend(v)
+            group_colls[(lemma, morpho)] = colls_in_text
+            
+        return group_colls
+    
+    
+    def _token_matches(self, doc, groups):
+        """
+        Function to match the collocations of each group of tokens sharing lemma and morphology
+        with spaCy's Matcher, by the lemmas, lowercase forms and parts of speech of the Doc's tokens
+        around them, instead of by regular expressions over the whole text.
+        
+        The token patterns of each word are built the first time a Doc features it, and kept 
+        for all the Docs of the same vocabulary until the pattern cache is cleared.
+        
+        Returns:
+            group_colls (dict): The strings and character offsets of the matches
+                of the collocations of each lemma and morphology, sorted according to their morphologies.
+        """
+        
+        chosen = tuple(sorted(self.chosen_collocation_types)) if self.chosen_collocation_types else None
+        signature = (chosen, self._tags_key())
+        with self._lock:
+            matcher = self._token_matcher
+            if matcher is None or matcher.vocab is not doc.vocab or matcher.signature != signature:
+                matcher = TokenMatcher(doc.vocab, self.prepositions, chosen=chosen, signature=signature, 
+                                       cache_size=self.pattern_cache_size)
+                self._token_matcher = matcher
+        
+        for lemma, morpho in groups:
+            if (lemma, morpho) in matcher:
+                continue
+            collocations = self.collocate(lemma)
+            forms = None
+            if collocations and collocations.get(morpho):
+                word_re, _, _ = self._compiled_patterns(lemma, morpho, collocations, keys=set())
+                forms = word_re.fullmatch
+            matcher.add(lemma, morpho, collocations, forms=forms)
+        
+        return matcher.matches(doc, groups)
+    
+    
+    def _tags_key(self):
+        """
+        Returns the tags the patterns are built with, other than the word itself, 
+        in a hashable form.
+        """
+        return tuple(sorted((k, v) for k, v in self.tags_dict.items() if k != 'this_word'))
+    
+    
+    def pattern_cache_info(self):
+        """
+        Returns the hits, misses and evictions of the cache of compiled patterns, 
+        as well as its current and maximum sizes.
+        """
+        return self._pattern_cache.info()
+    
+    
+    def _forget_patterns(self, word):
+        """
+        Function to have the patterns of a word whose entry changed built again, 
+        leaving the old ones to be evicted from the pattern cache.
+        """
+        
+        with self._lock:
+            self._entry_versions[word] = self._entry_versions.get(word, 0) + 1
+            matcher = self._token_matcher
+        if matcher is not None:
+            matcher.discard(word)
+        if self.collocate_index is not None:
+            self.collocate_index.discard(word)
+            
+            
+    def clear_pattern_cache(self):
+        """
+        Empties the cache of compiled patterns, along with the token patterns of the matcher engine.
+        """
+        self._pattern_cache.clear()
+        self._token_matcher = None
+        
+        
+    def _is_literal(collocation):
+        """
+        Function to tell whether a collocation is matched literally by its pattern, 
+        that is, whether it features neither tags nor digits.
+        """
+        return not regex.search(r'__[A-Z_]+__|\d', collocation)
+    
+    
+    def build_literal_matcher(self):
+        """
+        Builds an Aho-Corasick automaton with the literal prepositional collocations 
+        and phrases of all the nouns in the collocations dictionary, so that they can 
+        be found in a single pass over each text instead of by their words' patterns. 
+        
+        The automaton is kept in the object and pickled along with it.
+        
+        Returns:
+            literal_matcher (LiteralMatcher): The automaton, whose literals are 
+                stored along with the words and types of collocations they belong to.
+        """
+        
+        literal_matcher = LiteralMatcher()
+        for word, collocations in self.collocations_dictionary.items():
+            if not collocations or not collocations.get('noun'):
+                continue
+            for section, key in [('PREP.', 'prep'), ('PHRASES', 'phr')]:
+                for collocation in sum(collocations.get('noun').get(section, []), []):
+                    if Collocater._is_literal(collocation):
+                        literal_matcher.add(collocation, (word, key))
+        literal_matcher.build()
+        
+        self.literal_matcher = literal_matcher
+        self.clear_pattern_cache()
+        
+        return literal_matcher
+    
+    
+    def _index_signature(self):
+        """
+        Returns the settings the patterns are built with, for the collocate index 
+        to be used only with the ones it was built with.
+        """
+        return (self._tags_key(), self.literal_matcher is not None)
+    
+    
+    def build_collocate_index(self, path=None):
+        """
+        Builds an inverted index from the words, or fragments of words, required by 
+        the pattern of each type of collocations of all the nouns and verbs in the 
+        collocations dictionary to the words and types of collocations whose patterns 
+        require them, so that only the patterns that can possibly match a text are run.
+        
+        The index is kept in the object and pickled along with it, and has to be 
+        rebuilt after building the literal matcher or changing the tags. 
+        The words whose entries change afterwards are left out of it.
+        
+        Parameters:
+            path (str): Optional path of the gzipped pickle the index should also be saved in, 
+                for it to be loaded by other processes with load_collocate_index.
+        
+        Returns:
+            collocate_index (CollocateIndex): The inverted index.
+        """
+        
+        collocate_index = CollocateIndex(self._index_signature())
+        for word, collocations in self.collocations_dictionary.items():
+            if not collocations:
+                continue
+            collocate_index.digests[word] = Collocater._entry_digest(collocations)
+            for morpho in ['noun', 'verb']:
+                if not collocations.get(morpho):
+                    continue
+                word1, sources = self._wrapped_patterns(word, morpho, collocations)
+                word_re = regex.compile(word1, regex.I)
+                avoid = lambda w: word_re.fullmatch(w) is not None
+                for k, source in sources.items():
+                    collocate_index.add(word, morpho, k, required_words(source, avoid))
+                    
+        self.collocate_index = collocate_index
+        
+        if path:
+            # Plain pickles are read several times faster than joblib's for the index's many small sets.
+            with gzip.open(path, 'wb') as fh:
+                pickle.dump(collocate_index, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        return collocate_index
+    
+    
+    def load_collocate_index(self, path=None):
+        """
+        Loads the prebuilt collocate index shipped with the package, or the one 
+        stored in the path provided, which is only used as long as the object's tags 
+        and literal matcher are the ones it was built with.
+        """
+        
+        if not path:
+            path = pkr.resource_filename(__name__, 'data/collocate_index.pkl.gz')
+        with gzip.open(path, 'rb') as fh:
+            self.collocate_index = pickle.load(fh)
+    
+    
+    def _candidates(self, text, groups):
+        """
+        Function to find the types of collocations of each lemma and morphology 
+        whose patterns can possibly match the text with the collocate index, 
+        which are None when all of them should be run.
+        """
+        
+        index = self.collocate_index
+        if index is None or index.signature != self._index_signature():
+            return {}
+        
+        # The entry of each word is checked the first time it's looked up.
+        for lemma, _ in groups:
+            if index.unchecked(lemma):
+                collocations = self.collocations_dictionary.get(lemma)
+                index.check(lemma, Collocater._entry_digest(collocations) if collocations else None)
+        
+        return index.candidates(Collocater._mask_conjunctions(text), groups)
+    
+    
+    def _literal_matches(self, text, words):
+        """
+        Function to find the literal prepositional collocations and phrases 
+        of the inputted nouns in text with the literal matcher.
+        
+        Parameters:
+            text (str): The text where collocations should be found.
+            words (set): The nouns whose collocations should be returned.
+            
+        Returns:
+            literal_matches (dict): Lists with the string, start and end characters of 
+                the matches, for each of the nouns and types of collocations.
+        """
+        
+        chosen = self.chosen_collocation_types
+        hits = {}
+        for start, end, values in self.literal_matcher.iter_matches(Collocater._mask_conjunctions(text)):
+            for word, key in values:
+                if word in words and (not chosen or key in chosen):
+                    hits.setdefault((word, key), []).append((start, end))
+        
+        literal_matches = {}
+        for (word, key), spans in hits.items():
+            word_re, _, _ = self._compiled_patterns(word, 'noun', self.collocate(word), keys=set())
+            last_end = None
+            # The leftmost and longest of the overlapping matches is kept, 
+            # just like the delimiters consumed by the patterns would.
+            for start, end in sorted(spans, key=lambda x: (x[0], -x[1])):
+                if last_end is not None and start < last_end + 2:
+                    continue
+                if not word_re.search(text[start:end]):
+                    continue
+                literal_matches.setdefault((word, key), []).append((text[start:end], start, end))
+                last_end = end
+                
+        return literal_matches
+    
+    
+    def collocations_identifier(self, word, morpho, text):
+        """
+        Function to retrieve the compiled regular expressions to match 
+        the collocations of nouns or verbs in text and return them.
+        
+        Parameters:
+            word (str): The word for which collocations should be identified.
+            morpho (string): The inputted word's morphology, which takes on the values 
+                of either 'noun' or 'verb'.
+            text (str): The text where collocations should be found.
+                
+        Returns:
+            coll_matches (dict): All the matches for the inputted word's collocations 
+                in the inputted text, sorted according to their morphologies, 
+                given the word's morphology.
+        """
         
+        coll_matches = self._find_matches(word, morpho, text)
+        if self.literal_matcher is not None and morpho == 'noun':
+            for (_, key), matches in self._literal_matches(text, {word}).items():
+                coll_matches[key] = sorted(coll_matches.get(key, []) + matches, key=lambda x: x[1])
+        
+        return {key: [string for string, _, _ in matches] for key, matches in coll_matches.items()}
+    
+    
+    def _mask_conjunctions(text):
+        """
+        Function to replace the conjunctions the patterns refer to with strings 
+        of the same length, so that the matches' offsets are those of the inputted text.
+        """
+        return regex.sub(r"\band\b", '&&&', regex.sub(r"\bor\b", "@@", text))
+    
+    
+    def _find_matches(self, word, morpho, text, offset=0, keys=None):
+        """
+        Function to match the collocations of nouns or verbs in text and return them 
+        along with their character offsets.
+        
+        Parameters:
+            word (str): The word for which collocations should be identified.
+            morpho (string): The inputted word's morphology, which takes on the values 
+                of either 'noun' or 'verb'.
+            text (str): The text where collocations should be found.
+            offset (int): Position of the inputted text in the whole text, 
+                to be added to the matches' offsets.
+            keys (set): Optional types of collocations whose patterns should be run, 
+                out of the chosen ones.
+                
+        Returns:
+            coll_matches (dict): Lists with the string, start and end characters of all the 
+                matches for the inputted word's collocations, sorted according to their morphologies.
+        """
+    
+        collocations = self.collocate(word)
+        
+        if not collocations or keys == set():
+            return {}
+        
+        word_re, patterns, _ = self._compiled_patterns(word, morpho, collocations, keys=keys)
+    
+        text = Collocater._mask_conjunctions(text)
         
         coll_matches = {}
-        for key, reg in self.collocations_types.items():
-            
-            if reg:
-                string1 = f"((?:[\W_]|^)({reg})(?:[\W_]|$))"
-                string2 = regex.sub(r'(?<!\{)\d+(?!\})', '\d+', string1)
-                string3 = regex.sub(r'((\\ )?__[A-Z]+__)(?=\\ )', "(\s[\w\-]+){1,3}", string2)
-                string4 = regex.sub(r'((\\ )?__[A-Z_]+__)(?=\\ )', "(\s((his|her|their|our|my|your)(\s[\w\-]+){0,2}|([\w\-\.]+\s)?[\w\-]+\'s?))", string3)
-                string5 = regex.sub(r'((\\ )?__[A-Z_]+__)', "(\s((the|an?|this|that|these|those|his|her|their|our|my|your|some|many|few|plenty)\s)?[\w\*\-\']+)", string4)
-                pattern1 = regex.compile(string5, regex.I)
-                all_colls1 = regex.findall(pattern1, text)
-        
-                relevant_matches = [a for a in sum(all_colls1, ()) if a]
-                if all_colls1 and relevant_matches:
-                    collocated0 = [[regex.sub(r'(^\W*|\W*$)', '', regex.sub(r"\&\&", 'and', regex.sub(r"\@\@", "or", a))) 
-                    for a in e if a and regex.search(r'\b'+word1+r'\b', a, regex.I)] for e in all_colls1]
-                    if sum(collocated0, []):
-                        collocated = [elem[0] for elem in collocated0 if elem]
-                        coll_matches[key] = collocated
+        for key, pattern1 in patterns.items():
+            collocated = []
+            for match in pattern1.finditer(text):
+                for group in range(1, len(match.groups()) + 1):
+                    a = match.group(group)
+                    if not (a and word_re.search(a)):
+                        continue
+                    a = regex.sub(r"\&\&\&", 'and', regex.sub(r"\@\@", "or", a))
+                    lead = len(regex.match(r'\W*', a).group())
+                    trail = len(regex.search(r'\W*$', a[lead:]).group())
+                    start = match.start(group) + lead
+                    end = match.end(group) - trail
+                    collocated.append((a[lead:len(a)-trail], offset + start, offset + end))
+                    break
+            if collocated:
+                coll_matches[key] = collocated
                     
         return coll_matches
                 
     
+    def dictionary_version(self, refresh=False):
+        """
+        Returns a fingerprint of the collocations dictionary, which changes along with its entries. 
+        That of a dictionary held in memory is worked out once, and again only when its words 
+        are scraped or rebuilt, whereas that of a store is taken from its file.
+        
+        Parameters:
+            refresh (bool): Whether the fingerprint of a dictionary held in memory should be 
+                worked out again, as it should after changing its entries by hand, 
+                in which case the patterns built from the old entries are dropped too.
+        """
+        
+        dictionary = self.collocations_dictionary
+        digest = hashlib.sha256()
+        cached = self.__dict__.get('_dictionary_version')
+        if isinstance(dictionary, DictionaryStore):
+            # The entries added to a read-only store are only dumped again when they change.
+            stat = os.stat(dictionary.path)
+            key = (dictionary._changes, stat.st_size, stat.st_mtime_ns)
+            if cached and not refresh and cached[0] is dictionary and cached[1] == key:
+                return cached[2]
+            digest.update(json.dumps([os.path.abspath(dictionary.path), stat.st_size, stat.st_mtime_ns, 
+                                      sorted(dictionary._added.items())]).encode('utf-8'))
+            self._dictionary_version = (dictionary, key, digest.hexdigest())
+            return self._dictionary_version[2]
+        
+        if cached and not refresh and cached[0] is dictionary and cached[1] == len(dictionary):
+            return cached[2]
+        
+        digest.update(json.dumps(dictionary, sort_keys=True).encode('utf-8'))
+        if refresh and (not cached or cached[2] != digest.hexdigest()):
+            # The entries were changed by hand, so the patterns built from them can't be told apart.
+            self.clear_pattern_cache()
+        self._dictionary_version = (dictionary, len(dictionary), digest.hexdigest())
+        
+        return self._dictionary_version[2]
+    
+    
+    def _pipeline_key(self):
+        """
+        Returns what the Spacy pipeline the texts are parsed with is told apart by: the name of 
+        the model, when it's the one loaded from it, or otherwise the name, version and components 
+        of the pipeline injected, whose results shouldn't be mistaken for those of the model.
+        """
+        
+        nlp = self._nlp
+        if nlp is None or nlp is Collocater._pipelines.get(self.spacy_model):
+            return self.spacy_model
+        
+        meta = nlp.meta
+        return [meta.get('lang'), meta.get('name'), meta.get('version'), nlp.pipe_names]
+    
+    
+    def _result_key(self, text):
+        """
+        Returns the key the collocations of the text are stored under in the result cache, 
+        which changes along with the settings that change them and the dictionary.
+        """
+        
+        settings = [sorted(self.chosen_collocation_types or []), self.chosen_word_types, 
+                    self.engine, self._pipeline_key(), self._tags_key(), self.dictionary_version()]
+        digest = hashlib.sha256(json.dumps(settings).encode('utf-8'))
+        digest.update(text.encode('utf-8'))
+        
+        return digest.hexdigest()
+    
+    
+    def _cached_result(self, text):
+        """
+        Returns the key of the text in the result cache and the collocations stored under it, 
+        if any.
+        """
+        
+        if self.result_cache is None:
+            return None, None
+        
+        key = self._result_key(text)
+        found = self.result_cache.get(key)
+        
+        return key, (json.loads(found) if found is not None else None)
+    
+    
+    def _cache_result(self, key, found_colls_dict):
+        
+        if self.result_cache is not None:
+            self.result_cache.put(key, json.dumps(found_colls_dict))
+    
+    
     def __call__(self, doc):
         """
         Retrieves, from the type of collocations it's instructed to look for,
@@ -688,6 +1645,14 @@ class Collocater():
         with the collocations found in the text or the text parsed by Spacy 
         with its added collocations finder component.
         
+        Calls don't change the object, whose caches of patterns are safe to share, 
+        so a single object can serve many threads at once. Only the strings are parsed 
+        with the object's shared Spacy pipeline, which isn't guaranteed to be thread-safe: 
+        threads can pass the Docs they parsed with their own pipelines instead.
+        
+        When the object has a result cache, such as an LRUCache or an SQLiteCache, 
+        the collocations of the strings found in it are returned without parsing them.
+        
         Parameters:
             doc (str/spacy.tokens.doc.Doc): The text whose collocations are meant to be found.
                 
@@ -702,33 +1667,208 @@ class Collocater():
                     the morphology of both of the collocations' word component 
         """
         
-        nlp = spacy.load(self.spacy_model, disable=['ner'])
-
         if isinstance(doc, str):
-            doc = nlp(doc)
+            key, found_colls_dict = self._cached_result(doc)
+            if found_colls_dict is not None:
+                return found_colls_dict
+            doc = self.get_nlp()(doc)
             orig_format = 'string'
         elif isinstance(doc, spacy.tokens.doc.Doc):
             orig_format = 'spacy_doc'
         else:
             raise ValueError("The inputted text must either be a string or a spacy.tokens.doc.Doc object") 
             
-            
+        found_colls_dict = self._annotate(doc)
+        
+        if orig_format == 'string':
+            self._cache_result(key, found_colls_dict)
+            return found_colls_dict
+        
+        else:
+            return doc
+        
+        
+    def pipe(self, texts, batch_size=1000, n_process=1, as_tuples=False):
+        """
+        Retrieves the collocations of a stream of texts lazily and in order, 
+        parsing the strings among them in batches with Spacy's nlp.pipe.
+        
+        Parameters:
+            texts (iterable): Strings or spacy.tokens.doc.Doc objects whose collocations 
+                are meant to be found, or tuples of them and their contexts when as_tuples is True.
+            batch_size (int): The number of strings Spacy parses in each batch.
+            n_process (int): The number of processes Spacy parses the strings with.
+            as_tuples (bool): Whether texts are tuples of the texts and their contexts, 
+                such as their ids, to be yielded alongside their collocations.
+                
+        Yields:
+            The same output __call__ returns for each text, in a tuple with 
+            the text's context when as_tuples is True.
+        """
+        
+        def lookup(item):
+            text, context = item if as_tuples else (item, None)
+            key, cached = self._cached_result(text) if isinstance(text, str) else (None, None)
+            return text, context, key, cached
+        
+        # The strings whose collocations are in the result cache aren't parsed.
+        items, to_parse = tee(map(lookup, texts))
+        strings = (text for text, _, _, cached in to_parse if isinstance(text, str) and cached is None)
+        docs = self.get_nlp().pipe(strings, batch_size=batch_size, n_process=n_process)
+        
+        for text, context, key, cached in items:
+            if cached is not None:
+                output = cached
+            elif isinstance(text, str):
+                output = self._annotate(next(docs))
+                self._cache_result(key, output)
+            elif isinstance(text, spacy.tokens.doc.Doc):
+                self._annotate(text)
+                output = text
+            else:
+                raise ValueError("The inputted text must either be a string or a spacy.tokens.doc.Doc object") 
+                
+            yield (output, context) if as_tuples else output
+        
+        
+    def _lookups(self, doc):
+        """
+        Returns the form, lemma and morphology of the Doc's tokens of the chosen word types, 
+        by their positions.
+        """
+        
         if self.chosen_word_types == 'both':
             lookups0 = [{i: (t.orth_, t.lemma_, t.pos_.lower())} for i, t in enumerate(doc) if t.pos_ in ['NOUN','VERB']]
         else:
             lookups0 = [{i: (t.orth_, t.lemma_, t.pos_.lower())} for i, t in enumerate(doc) if t.pos_ == self.chosen_word_types.upper()]
 
-        lookups = {k: v for d in lookups0 for k, v in d.items()}
+        return {k: v for d in lookups0 for k, v in d.items()}
+        
+        
+    def stream(self, source, chunk_size=CHUNK_SIZE, overlap=None):
+        """
+        Retrieves the collocations of a text too long to be parsed as a single Doc, 
+        parsing it in chunks of whole sentences, one at a time, and yielding the collocations 
+        found in each of them as soon as it is processed.
+        
+        Parameters:
+            source (str/iterable): The text, or an iterable of its pieces, such as an open file.
+            chunk_size (int): Maximum number of characters of each chunk, which must not be 
+                greater than the max_length of the object's Spacy pipeline.
+            overlap (int): Number of words consecutive chunks should overlap by, which defaults 
+                to the longest span of the patterns of the words of each chunk.
+                
+        Yields:
+            collocation (dict): The string of each collocation found, its character offsets and the 
+                positions of its first and last tokens in the whole text, and its types.
+        """
+        return stream_collocations(self, source, chunk_size=chunk_size, overlap=overlap)
+        
+        
+    def session(self):
+        """
+        Starts a session to find the collocations of the successive versions of a text 
+        being edited, which only parses and matches again the sentences that changed 
+        and the ones around them.
+        
+        Returns:
+            session (EditSession): The session, whose update method takes each new version 
+                of the text and returns it parsed, with its collocations added to it.
+        """
+        return EditSession(self)
+        
+        
+    def collocation_stats(self, texts, batch_size=1000, n_process=1, stats=None, **options):
+        """
+        Counts the collocations of a stream of texts by headword, part of speech, type 
+        of collocation and collocate, along with the number of texts each is found in, 
+        without keeping the collocations of each text.
+        
+        Parameters:
+            texts (iterable): Strings or spacy.tokens.doc.Doc objects.
+            batch_size (int): The number of strings Spacy parses in each batch.
+            n_process (int): The number of processes Spacy parses the strings with.
+            stats (CollocationStats): Stats to add the counts to, which default to new ones 
+                made with the options passed, such as max_keys and sketch_width.
+                
+        Returns:
+            stats (CollocationStats): The counts of the collocations of the texts.
+        """
+        
+        stats = stats if stats is not None else CollocationStats(**options)
+        nlp = self.get_nlp()
+        # The strings are passed to pipe already parsed, so that every occurrence 
+        # of each collocation is counted instead of one per string.
+        texts, strings = tee(texts)
+        parsed = nlp.pipe((text for text in strings if isinstance(text, str)), 
+                          batch_size=batch_size, n_process=n_process)
+        docs = (next(parsed) if isinstance(text, str) else text for text in texts)
+        
+        return stats.update(self.pipe(docs), forms=self._headword_forms)
+        
+        
+    def _headword_forms(self, word, morpho):
+        """
+        Function to retrieve the compiled pattern matching the inflected forms of the word, 
+        as it is found in text along with its collocations.
+        """
+        
+        collocations = self.collocations_dictionary.get(word)
+        if not collocations or not collocations.get(morpho):
+            return None
+        word_re, _, _ = self._compiled_patterns(word, morpho, collocations, keys=set())
+        
+        return word_re
+        
+        
+    def _annotate(self, doc):
+        """
+        Finds the collocations of the text parsed by Spacy, adds them to its token 
+        and span level and returns them.
+        
+        Parameters:
+            doc (spacy.tokens.doc.Doc): The text whose collocations are meant to be found.
+            
+        Returns:
+            found_colls_dict (dict): Python dictionary with the collocations found as keys, 
+                and, as values, the positions of their first and last tokens and 
+                the morphology of both of the collocations' word component 
+        """
+        
+        lookups = self._lookups(doc)
 
-        doc[0].set_extension('colloc', force=True, default={})
-        doc.set_extension('collocs', force=True, default=[])
+        # Tokens sharing lemma and morphology share their collocations' matches, 
+        # so the text is scanned only once for each of them.
+        groups = {}
+        for idx, (tok, lemma, morpho) in lookups.items():
+            groups.setdefault((str(lemma), str(morpho)), []).append(idx)
         
-        matcher = PhraseMatcher(doc.vocab)
+        if self.engine == 'matcher':
+            # The token patterns match all the words in a single pass over the Doc's tokens.
+            group_matches = self._token_matches(doc, groups)
+        elif self.matching == 'window':
+            candidates = self._candidates(str(doc), groups)
+            group_matches = self._windowed_matches(doc, groups, candidates)
+        else:
+            candidates = self._candidates(str(doc), groups)
+            text = str(doc)
+            group_matches = {}
+            for lemma, morpho in groups:
+                group_matches[(lemma, morpho)] = self._find_matches(lemma, morpho, text, 
+                                                                    keys=candidates.get((lemma, morpho)))
+                
+        # The token patterns already match the literal collocations.
+        if self.literal_matcher is not None and self.engine != 'matcher':
+            nouns = set(lemma for lemma, morpho in groups if morpho == 'noun')
+            for (lemma, key), matches in self._literal_matches(str(doc), nouns).items():
+                group_matches.get((lemma, 'noun')).setdefault(key, []).extend(matches)
 
         labels = {}
+        accepted = {}
         for idx, combi in lookups.items():
             tok, lemma, morpho = combi
-            colls_in_text = self.collocations_identifier(str(lemma), str(morpho), str(doc))
+            colls_in_text = {k: [string for string, _, _ in v] 
+                             for k, v in group_matches.get((str(lemma), str(morpho))).items()}
             if colls_in_text:
                 patch = str(doc[max(idx-7, 0): min(idx+9, len(doc)-1)])
                 all_this_wrd_colls = sum(colls_in_text.values(), [])
@@ -738,32 +1878,36 @@ class Collocater():
                     for k, v in colls_in_text.items():
                         interin = set(this_match).intersection(set(v))
                         if interin:
-                            e = 0
                             for rule_name in interin:
-                                matcher.add('_'.join([lemma, morpho, k, str(e)]), None, nlp(rule_name))
                                 labels.setdefault(rule_name, []).append('{0}_{1}__{2}'.format(lemma, morpho, k))
-                                e += 1
+                                accepted.setdefault((str(lemma), str(morpho), k), set()).add(rule_name)
                             this_colls[k] = list(interin)
                             doc[idx]._.colloc = this_colls
+        
+        # The spans are built straight from the offsets of the matches 
+        # of the collocations accepted for any of the tokens.
+        occurrences = set()
+        for (lemma, morpho, k), rule_names in accepted.items():
+            for string, start, end in group_matches.get((lemma, morpho)).get(k):
+                if string in rule_names:
+                    occurrences.add((start, end, string, k, lemma, morpho))
 
         spans = []
-        idx = 0
         found_colls_dict = {}
-        for _, start, end in matcher(doc):
-            key = str(doc[start:end])
-            my_label = ' / '.join(set(labels.get(key)))
-            spans.append(Span(doc, start, end, label=my_label))
-            found_colls_dict.setdefault(key, []).append({'coll_type': my_label, 'location': [start, end]})
+        for start, end, key, *_ in sorted(occurrences):
+            my_label = ' / '.join(dict.fromkeys(labels.get(key)))
+            span = doc.char_span(start, end, label=my_label)
+            if span is None:
+                continue
+            spans.append(span)
+            found_colls_dict.setdefault(key, []).append({'coll_type': my_label, 'location': [span.start, span.end]})
         
         doc._.collocs = spans
         
-        if orig_format == 'string':
-            found_colls_dict = {key: {k: v for d in val for k, v in d.items()} 
-            for key, val in found_colls_dict.items()}
-            return found_colls_dict
+        found_colls_dict = {key: {k: v for d in val for k, v in d.items()} 
+        for key, val in found_colls_dict.items()}
         
-        else:
-            return doc
+        return found_colls_dict
     
     
 
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Highlighting the collocations found in a text with HTML tags, in a single pass over the text
+driven by the offsets of the collocations, instead of by searching for their strings.
+
+"""
+
+from html import escape
+
+import spacy
+
+
+DEFAULT_COLOR = "rgb(255, 158, 0, 0.4)"
+
+# Tokenizer the token offsets of the collocations are turned into character offsets with,
+# when the Doc they were found in isn't given.
+_tokenizer = None
+
+
+
+def _char_offsets(text, found_collocations):
+    """
+    Turns the token offsets of the collocations found in the text, as returned by
+    the Collocater object for strings, into character offsets, with the tokens of the Doc
+    when it's given, and otherwise by tokenizing the text again.
+    """
+
+    if isinstance(text, spacy.tokens.doc.Doc):
+        starts = [token.idx for token in text]
+        text = text.text
+    else:
+        global _tokenizer
+        if _tokenizer is None:
+            _tokenizer = spacy.blank('en').tokenizer
+        starts = [token.idx for token in _tokenizer(text)]
+
+    offsets = []
+    for string, found in found_collocations.items():
+        first = found.get('location')[0]
+        start = starts[first] if first < len(starts) else None
+        if start is None or text[start:start + len(string)] != string:
+            # The text was tokenized differently, so the closest occurrence of the string is taken.
+            occurrences = []
+            position = text.find(string)
+            while position != -1:
+                occurrences.append(position)
+                position = text.find(string, position + 1)
+            if not occurrences:
+                continue
+            start = min(occurrences, key=lambda x: abs(x - (start or 0)))
+        offsets.append((start, start + len(string), found.get('coll_type')))
+
+    return sorted(offsets)
+
+
+
+def _offsets(collocations):
+    """
+    Yields the character offsets and types of the spans of doc._.collocs
+    or of the records yielded by Collocater.stream.
+    """
+
+    for collocation in collocations:
+        if isinstance(collocation, dict):
+            coll_type = collocation.get('coll_type')
+            if isinstance(coll_type, list):
+                coll_type = ' / '.join(coll_type)
+            yield collocation.get('start_char'), collocation.get('end_char'), coll_type
+        else:
+            yield collocation.start_char, collocation.end_char, collocation.label_
+
+
+
+def collocation_offsets(collocations, text=None):
+    """
+    Function to read the character offsets and types of collocations, which can either be
+    the spans of doc._.collocs, the records yielded by Collocater.stream or the dictionary
+    returned by the Collocater object for strings, in which case the text is needed,
+    or better the Doc, whose tokens the offsets are read from.
+
+    Returns:
+        offsets (list): The start and end characters and type of each collocation, by their starts.
+    """
+
+    if isinstance(collocations, dict):
+        return _char_offsets(text, collocations)
+
+    return sorted(_offsets(collocations))
+
+
+
+def _regions(offsets):
+    """
+    Merges the overlapping collocations, sorted by their starts, into the regions of text
+    to be highlighted, along with their types.
+    """
+
+    region = None
+    for start, end, coll_type in offsets:
+        if region is not None and start < region[1]:
+            region[1] = max(region[1], end)
+            region[2].setdefault(coll_type)
+            continue
+        if region is not None:
+            yield region
+        region = [start, end, {coll_type: None}]
+
+    if region is not None:
+        yield region
+
+
+
+def _highlighted(source, offsets, color):
+    """
+    Yields the pieces of the highlighted text, reading the text, either a string or an iterable
+    of its pieces, only as far as the next collocation to be highlighted.
+    """
+
+    pieces = iter([source] if isinstance(source, str) else source)
+    buffer = ''
+    # Offsets of the buffer's first character and of the first one still to be written in the whole text.
+    base = 0
+    position = 0
+
+    for start, end, coll_types in _regions(offsets):
+        if start < position:
+            continue
+        while base + len(buffer) < end:
+            piece = next(pieces, None)
+            if piece is None:
+                break
+            buffer += piece
+
+        title = escape(' / '.join(t for t in coll_types if t))
+        yield escape(buffer[position - base:start - base], quote=False)
+        yield (f'<span style="background-color: {escape(color)}" title="{title}">'
+               f'{escape(buffer[start - base:end - base], quote=False)}</span>')
+        position = end
+
+        # The part of the buffer already written is dropped once it's most of it.
+        if position - base > len(buffer) // 2:
+            buffer = buffer[position - base:]
+            base = position
+
+    yield escape(buffer[position - base:], quote=False)
+    for piece in pieces:
+        yield escape(piece, quote=False)
+
+
+
+def highlight(text, collocations=None, color=DEFAULT_COLOR):
+    """
+    Function to transform the text where collocations were found into a string of HTML, escaped,
+    with tags highlighting the collocations found. Only the occurrences of the collocations found
+    are highlighted, and the overlapping ones are highlighted as a single one.
+
+    Parameters:
+        text (str/spacy.tokens.doc.Doc): The text, or the Doc the collocations were added to.
+        collocations: The collocations found in the text, either as the spans of doc._.collocs,
+            which they default to when the text is a Doc, as the records yielded by Collocater.stream
+            or as the dictionary returned by the Collocater object for strings, whose token offsets
+            are read with the tokens of the Doc when it's given.
+        color (str): The CSS color of the highlighting.
+
+    Returns:
+        html (str): The highlighted text.
+    """
+
+    source = text
+    if isinstance(text, spacy.tokens.doc.Doc):
+        collocations = text._.collocs if collocations is None else collocations
+        source = text.text
+
+    return ''.join(_highlighted(source, collocation_offsets(collocations, text), color))
+
+
+
+def write_highlighted(fh, source, collocations, color=DEFAULT_COLOR):
+    """
+    Function to write the highlighted text to a file as it goes, for large documents,
+    such as those whose collocations are retrieved with Collocater.stream.
+
+    Parameters:
+        fh (file): The file the HTML is written to.
+        source (str/iterable): The text, or an iterable of its pieces, such as an open file.
+        collocations (iterable): The spans or records of the collocations found in the text,
+            in the order of their starts, as Collocater.stream yields them, which are only read
+            as far as the text is written.
+        color (str): The CSS color of the highlighting.
+    """
+
+    for piece in _highlighted(source, _offsets(collocations), color):
+        fh.write(piece)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aho-Corasick automaton to find all the literal collocations
+of the dictionary in a text in a single pass.
+
+"""
+
+import regex
+
+
+_delimiter = regex.compile(r'[\W_]')
+
+
+
+def _lower(text):
+    """
+    Function to lowercase a text without changing its length,
+    so that offsets in the lowercased text are valid in the original one.
+    """
+
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+
+class LiteralMatcher():
+    """
+    Case-insensitive multi-pattern matcher of literal strings that only reports
+    the occurrences delimited by non-word characters or the text's boundaries.
+
+    Each literal is stored along with the values it was added with,
+    such as the words and types of collocations it belongs to.
+    """
+
+    def __init__(self):
+
+        # Transitions of the trie, keyed by state and character.
+        self._goto = {}
+        self._fail = [0]
+        # Indices of the literals ending in each state, and of those ending in it 
+        # or in the states its failure links lead to, which build works out.
+        self._own = [[]]
+        self._out = [[]]
+        self.literals = []
+        self.values = []
+        self._index = {}
+        self._built = True
+
+
+    def __len__(self):
+        return len(self.literals)
+
+
+    def add(self, literal, value):
+        """
+        Adds a literal to the automaton, or a new value to an already added one.
+        """
+
+        key = _lower(literal)
+        if key in self._index:
+            values = self.values[self._index.get(key)]
+            if value not in values:
+                values.append(value)
+            return
+
+        state = 0
+        for ch in key:
+            nxt = self._goto.get((state, ch))
+            if nxt is None:
+                nxt = len(self._fail)
+                self._goto[(state, ch)] = nxt
+                self._fail.append(0)
+                self._own.append([])
+            state = nxt
+
+        self._index[key] = len(self.literals)
+        self._own[state].append(len(self.literals))
+        self.literals.append(key)
+        self.values.append([value])
+        self._built = False
+
+
+    def build(self):
+        """
+        Works out the failure links of the automaton's states breadth first, 
+        along with the literals ending in each of them, from scratch every time, 
+        so that it can be built again after adding more literals.
+        """
+
+        self._out = [list(own) for own in self._own]
+
+        children = {}
+        for (state, ch), nxt in self._goto.items():
+            children.setdefault(state, []).append((ch, nxt))
+
+        queue = [nxt for _, nxt in children.get(0, [])]
+        for nxt in queue:
+            self._fail[nxt] = 0
+
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            for ch, nxt in children.get(state, []):
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and (fail, ch) not in self._goto:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto.get((fail, ch), 0)
+                self._out[nxt] = self._own[nxt] + self._out[self._fail[nxt]]
+
+        self._built = True
+
+
+    def iter_matches(self, text):
+        """
+        Finds all the occurrences of the automaton's literals in the text.
+
+        Parameters:
+            text (str): The text where the literals should be found.
+
+        Yields:
+            start (int): Position of the occurrence's first character.
+            end (int): Position following the occurrence's last character.
+            values (list): The values the literal was added with.
+        """
+
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        lowered = _lower(text)
+
+        state = 0
+        for pos, ch in enumerate(lowered):
+            while state and (state, ch) not in goto:
+                state = fail[state]
+            state = goto.get((state, ch), 0)
+            for idx in out[state]:
+                end = pos + 1
+                start = end - len(self.literals[idx])
+                if start > 0 and not _delimiter.match(text, start - 1):
+                    continue
+                if end < len(text) and not _delimiter.match(text, end):
+                    continue
+                yield start, end, self.values[idx]
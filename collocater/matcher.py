@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token patterns of spaCy's Matcher built from the entries of the collocations dictionary,
+which match the collocations by the lemmas, lowercase forms and parts of speech of the
+tokens of a parsed Doc, instead of by regular expressions reconstructing their inflections.
+
+The patterns of each type of collocations mirror the regular expressions Collocater builds
+for it: the gaps between the words are bounded by the same numbers of words, and can't
+be bridged by the same prepositions and conjunctions.
+
+"""
+
+import threading
+
+import regex
+import spacy
+from spacy.matcher import Matcher
+
+from collocater.cache import LRUCache
+
+
+_tag = regex.compile(r'__[A-Z_]+__')
+_plain_tag = regex.compile(r'__[A-Z]+__')
+_relevant_preps = regex.compile(r'(?<=\s)[a-z]+(?=_)')
+
+POSSESSIVES = ['his', 'her', 'their', 'our', 'my', 'your']
+DETERMINERS = ['the', 'a', 'an', 'this', 'that', 'these', 'those', 'some', 'many', 'few', 'plenty'] + POSSESSIVES
+# The conjunctions the patterns of most types of collocations can't bridge,
+# as they're masked in the text the regular expressions are run on.
+CONJUNCTIONS = ['and', 'or']
+
+_WORD = {'IS_PUNCT': False, 'IS_SPACE': False}
+
+
+
+def _optional(token):
+    return dict(token, OP='?')
+
+
+
+def _gap(upper, lower=0, excluded=None):
+    """
+    Returns the tokens of a gap of between lower and upper words, none of which
+    can be any of the excluded ones.
+    """
+
+    token = dict(_WORD)
+    if excluded:
+        token['LOWER'] = {'NOT_IN': list(excluded)}
+
+    return [dict(token) for _ in range(lower)] + [_optional(token) for _ in range(upper - lower)]
+
+
+
+def _lemma(value, excluded_tags=None):
+    """
+    Returns the token matching the lemma provided, unless it has any of the excluded tags.
+    """
+
+    token = {'LEMMA': value}
+    if excluded_tags:
+        token['TAG'] = {'NOT_IN': list(excluded_tags)}
+
+    return token
+
+
+
+def _tag_alternatives(tag, followed):
+    """
+    Returns the alternative sequences of tokens a tag standing for a pronoun or other
+    discoursive variable can be replaced with, as Collocater._wrap_pattern does.
+    """
+
+    if followed and _plain_tag.fullmatch(tag):
+        return [_gap(3, 1)]
+    if followed:
+        return [[{'LOWER': {'IN': POSSESSIVES}}] + _gap(2),
+                [_optional(_WORD), dict(_WORD), {'LOWER': {'IN': ["'s", "'"]}}]]
+
+    return [[_optional({'LOWER': {'IN': DETERMINERS}}), dict(_WORD)]]
+
+
+
+class CollocationPatterns():
+    """
+    Builds the token patterns of the collocations of the dictionary's words.
+
+    Parameters:
+        prepositions (list): The prepositions the gaps in the patterns can't bridge.
+        lang (str): Language whose tokenizer the collocations are split into tokens with.
+    """
+
+    def __init__(self, prepositions, lang='en'):
+
+        self.prepositions = list(prepositions)
+        self.tokenizer = spacy.blank(lang).tokenizer
+        # Tokens of each of the collocations' words.
+        self._words = {}
+
+
+    def _tokenize(self, words):
+        """
+        Splits the words into tokens with a single call to the tokenizer, as each call
+        costs as much as setting up a new Doc.
+        """
+
+        words = [w for w in dict.fromkeys(words) if w not in self._words]
+        if not words:
+            return
+
+        starts = {}
+        position = 0
+        for w in words:
+            starts[position] = w
+            position += len(w) + 1
+        tokens = {w: [] for w in words}
+        word = None
+        for t in self.tokenizer(' '.join(words)):
+            word = starts.get(t.idx, word)
+            tokens[word].append(t.text)
+        self._words.update(tokens)
+
+
+    def _tokens(self, text):
+
+        words = text.split()
+        self._tokenize(words)
+
+        return [t for w in words for t in self._words.get(w)]
+
+
+    def sequences(self, collocation, lemma=None, word=None, forms=None, excluded_tags=None):
+        """
+        Turns a collocation into the alternative sequences of tokens matching it.
+
+        Parameters:
+            collocation (str): The collocation, with tags standing for pronouns and other variables.
+            lemma (str): Which of the collocation's words, 'first' or 'last', should be matched
+                by its lemma instead of by its lowercase form, so that its inflections are matched too.
+            word (dict): Token the headword is matched with, when it features in the collocation.
+            forms (callable): Optional function telling whether a word is an inflected form
+                of the headword, which otherwise has to be written as its lemma.
+            excluded_tags (list): Optional fine-grained tags the word matched by its lemma can't have.
+
+        Returns:
+            sequences (list): Lists of token specifications.
+        """
+
+        words = collocation.split()
+        sequences = [[]]
+        for i, w in enumerate(words):
+            if _tag.fullmatch(w):
+                alternatives = _tag_alternatives(w, i < len(words) - 1)
+            else:
+                tokens = self._tokens(w)
+                alternatives = [[]]
+                for j, t in enumerate(tokens):
+                    if t.isdigit():
+                        options = [{'IS_DIGIT': True}]
+                    elif word is not None and (t.lower() == word.get('LEMMA') or (forms and forms(t))):
+                        options = [dict(word)]
+                    elif (lemma == 'first' and i == 0 and j == 0) or (lemma == 'last' and i == len(words) - 1
+                                                                      and j == len(tokens) - 1):
+                        options = [_lemma(t.lower(), excluded_tags)]
+                    else:
+                        options = [{'LOWER': t.lower()}]
+                    alternatives = [a + [o] for a in alternatives for o in options]
+            sequences = [s + a for s in sequences for a in alternatives]
+
+        return sequences
+
+
+    def _singles(self, collocations):
+        return sorted(set(c.lower() for c in collocations if not _tag.search(c) and len(self._tokens(c)) == 1))
+
+
+    def _collocates(self, collocations, lemma=None, word=None, forms=None, excluded_tags=None):
+        """
+        Returns the tokens matching any of the collocations made of a single word, by their
+        lowercase forms and, when lemma is provided, by their lemmas too, along with the
+        sequences matching each of the rest. With lemma 'single', the rest are matched literally.
+        """
+
+        singles = self._singles(collocations)
+        sequences = []
+        if singles:
+            sequences.append([{'LOWER': {'IN': singles}}])
+            if lemma:
+                sequences.append([_lemma({'IN': singles}, excluded_tags)])
+        for c in collocations:
+            if c.lower() not in singles:
+                sequences.extend(self.sequences(c, lemma, word, forms, excluded_tags))
+
+        return sequences
+
+
+    def _excluded(self, collocations, conjunctions=True):
+        """
+        Returns the words the gaps next to the collocations can't bridge: the prepositions
+        the collocations don't end with, as Collocater._pattern_sources works them out.
+        """
+
+        relevant = set(_relevant_preps.findall('_'.join(collocations)))
+        excluded = [p for p in self.prepositions if p not in relevant]
+
+        return excluded + CONJUNCTIONS if conjunctions else excluded
+
+
+    def noun_patterns(self, word, collocations, forms=None):
+        """
+        Returns the token patterns of each type of collocations of a noun.
+        """
+
+        entry = collocations.get('noun') or {}
+        W = {'LEMMA': word, 'POS': 'NOUN'}
+        all_preps = self.prepositions + CONJUNCTIONS
+        colls_types = {}
+
+        if entry.get('ADJ.'):
+            a = list(set(sum(entry.get('ADJ.'), [])))
+            adjectives = self._collocates(a, lemma='single')
+            conj = {'LOWER': {'IN': CONJUNCTIONS + ['yet']}}
+            # Two adjectives joined by a conjunction, one of which at least is made of a single
+            # token, so that the number of patterns grows linearly with the number of adjectives.
+            single = [{'LOWER': {'IN': self._singles(a)}}] if self._singles(a) else []
+            pairs = [single + [conj] + b for b in adjectives] if single else []
+            pairs += [b + [conj] + single for b in adjectives if len(b) > 1] if single else []
+            patterns = [b + [W] for b in adjectives + pairs]
+            seem = {'LOWER': {'IN': ['seems', 'seemed', 'appears', 'appeared']}}
+            links = [[{'LOWER': {'IN': ['is', 'was', 'were']}}, _optional({'LOWER': {'REGEX': r'\w+ing$'}})],
+                     [{'LOWER': {'IN': ['looks', 'looked']}}],
+                     [seem], [seem, {'LOWER': 'to'}, {'LOWER': 'be'}]]
+            for link in links:
+                patterns.extend([W] + link + _gap(1) + b for b in adjectives)
+                patterns.extend([W] + link + _gap(1) + b + [conj] + single for b in adjectives if single)
+            colls_types['adj'] = patterns
+
+        key = 'VERB + ' + word
+        if entry.get(key):
+            a = set(sum(entry.get(key), []))
+            b = [e for e in a if e not in ['have', 'be']]
+            if b:
+                verbs = self._collocates(b, lemma='first', word=W, forms=forms)
+                # The verbs following the noun in the passive voice, which can't be gerunds.
+                bare = self._collocates(list(set(_tag.sub('', e).strip() for e in b)), lemma='first', word=W, 
+                                        forms=forms, excluded_tags=['VBG'])
+                excluded = self._excluded(a)
+                patterns = [v + _gap(3, excluded=excluded) + [W] for v in verbs]
+                patterns += [[W] + _gap(5, excluded=all_preps) + v for v in bare]
+                passives = [[{'LOWER': {'IN': ['is', 'was', 'were', 'been']}}],
+                            [{'LOWER': {'IN': ['is', 'was', 'were', 'been']}},
+                             {'LOWER': {'REGEX': r'\w+ing$'}}, {'LOWER': {'IN': self.prepositions}}],
+                            [{'LOWER': 'to'}, {'LOWER': 'be'}]]
+                patterns += [[W] + _gap(4, 1, excluded=all_preps) + p + v for p in passives for v in bare]
+                colls_types['pre_verb'] = patterns
+
+        key = word + ' + VERB'
+        if entry.get(key):
+            a = set(sum(entry.get(key), []))
+            b = [e for e in a if e not in ['have', 'be']]
+            if b:
+                excluded = self._excluded(a)
+                colls_types['post_verb'] = [[W] + _gap(3, excluded=excluded) + v
+                                            for v in self._collocates(b, lemma='first', word=W, forms=forms)]
+
+        key = word + ' + NOUN'
+        if entry.get(key):
+            nouns = self._collocates(list(set(sum(entry.get(key), []))), lemma='last')
+            colls_types['post_noun'] = [[W] + n for n in nouns]
+
+        if entry.get('QUANT.'):
+            quantities = self._collocates(list(set(sum(entry.get('QUANT.'), []))), lemma='last')
+            colls_types['quant'] = [q + [{'LOWER': 'of'}] + _gap(2) + [W] for q in quantities]
+
+        for section, k in [('PREP.', 'prep'), ('PHRASES', 'phr')]:
+            if entry.get(section):
+                patterns = []
+                for c in set(sum(entry.get(section), [])):
+                    patterns.extend(self.sequences(c, word=W, forms=forms))
+                colls_types[k] = [p for p in patterns if W in p]
+
+        return colls_types
+
+
+    def verb_patterns(self, word, collocations, forms=None):
+        """
+        Returns the token patterns of each type of collocations of a verb.
+        """
+
+        entry = collocations.get('verb') or {}
+        W = {'LEMMA': word, 'POS': 'VERB'}
+        colls_types = {}
+
+        if entry.get('PREP.'):
+            preps = self._collocates(list(set(sum(entry.get('PREP.'), []))))
+            colls_types['prep'] = [[W] + _gap(1) + p for p in preps]
+
+        if entry.get('ADV.'):
+            a = list(set(sum(entry.get('ADV.'), [])))
+            b = [e for e in a if not (e == 'well' or len(e) <= 3)]
+            if b:
+                colls_types['adv'] = ([[W] + _gap(3) + adv for adv in self._collocates(a)] +
+                                      [adv + _gap(3) + [W] for adv in self._collocates(b)])
+
+        if entry.get('PHRASES'):
+            patterns = []
+            for c in set(sum(entry.get('PHRASES'), [])):
+                patterns.extend(self.sequences(c, word={'LEMMA': word}, forms=forms))
+            colls_types['phr'] = [p for p in patterns if {'LEMMA': word} in p]
+
+        key = 'VERB + ' + word
+        if entry.get(key):
+            a = list(set(sum(entry.get(key), [])))
+            excluded = self._excluded(a, conjunctions=False)
+            colls_types['pre_verb'] = [v + _gap(3, excluded=excluded) + [W]
+                                       for v in self._collocates(a, lemma='first', word=W, forms=forms)]
+
+        return colls_types
+
+
+    def patterns(self, word, morpho, collocations, forms=None):
+        """
+        Returns the token patterns of each type of collocations of the word
+        with the morphology provided, leaving out the types without any.
+        The collocations featuring the word itself are only matched when it's
+        written as its lemma or as one of the forms provided.
+        """
+
+        if not collocations or not collocations.get(morpho):
+            return {}
+        self._tokenize(w for lists in collocations.get(morpho).values() for c in sum(lists, []) for w in c.split())
+        if morpho == 'noun':
+            colls_types = self.noun_patterns(word, collocations, forms)
+        else:
+            colls_types = self.verb_patterns(word, collocations, forms)
+
+        return {k: v for k, v in colls_types.items() if v}
+
+
+
+class TokenMatcher():
+    """
+    spaCy Matchers holding the token patterns of the collocations of each word, which are
+    only run over the windows of tokens around the word's tokens in each Doc.
+
+    A single Matcher holding the patterns of every word would try all of them at every
+    token of each Doc, getting slower the more words it came across, whereas the windows
+    of a word are only as long as its longest pattern.
+
+    The matchers can be shared by many threads: they're built one at a time, as the
+    tokenizer the patterns are built with isn't meant to be called concurrently,
+    and are only read once built.
+
+    Parameters:
+        vocab (spacy.vocab.Vocab): Vocabulary of the Docs to be matched.
+        prepositions (list): The prepositions the gaps in the patterns can't bridge.
+        chosen (iterable): Optional types of collocations to be matched, out of all of them.
+        signature (tuple): Settings the patterns are built with, for the matchers
+            to be used only with the ones they were built with.
+        cache_size (int): Maximum number of words whose matchers are kept.
+    """
+
+    def __init__(self, vocab, prepositions, chosen=None, signature=None, cache_size=1024):
+
+        self.vocab = vocab
+        self.signature = signature
+        self.chosen = set(chosen) if chosen else None
+        self.builder = CollocationPatterns(prepositions, lang=vocab.lang or 'en')
+        self._matchers = LRUCache(cache_size)
+        self._lock = threading.Lock()
+
+
+    def __contains__(self, key):
+        return self._matchers.get(key) is not None
+
+
+    def add(self, word, morpho, collocations, forms=None):
+        """
+        Builds the matcher of the collocations of the word with the morphology provided,
+        unless another thread already did.
+        """
+
+        with self._lock:
+            if (word, morpho) in self._matchers:
+                return
+
+            matcher = None
+            length = 0
+            for k, patterns in self.builder.patterns(word, morpho, collocations, forms).items():
+                if self.chosen and k not in self.chosen:
+                    continue
+                if matcher is None:
+                    matcher = Matcher(self.vocab)
+                matcher.add(k, patterns)
+                length = max([length] + [len(p) for p in patterns])
+
+            self._matchers.put((word, morpho), (matcher, length))
+
+
+    def discard(self, word):
+        """
+        Drops the matchers of the word, for them to be built again.
+        """
+
+        with self._lock:
+            for morpho in ['noun', 'verb']:
+                self._matchers.pop((word, morpho))
+
+
+    def _windows(self, idxs, length, n_tokens):
+        """
+        Returns the merged windows of tokens where the matches including
+        any of the tokens of the positions provided can be found.
+        """
+
+        windows = []
+        for idx in sorted(idxs):
+            start, end = max(idx - length + 1, 0), min(idx + length, n_tokens)
+            if windows and start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], end)
+            else:
+                windows.append([start, end])
+
+        return windows
+
+
+    def matches(self, doc, groups):
+        """
+        Matches the collocations of each group of tokens sharing lemma and morphology,
+        whose matchers have to be built beforehand.
+
+        The leftmost and longest of the overlapping matches of each type of collocations
+        is kept, as it would be by the regular expressions.
+
+        Parameters:
+            doc (spacy.tokens.doc.Doc): The text whose collocations are meant to be found.
+            groups (dict): The positions of the tokens of each lemma and morphology.
+
+        Returns:
+            group_colls (dict): The strings and character offsets of the matches
+                of the collocations of each lemma and morphology, sorted according to their morphologies.
+        """
+
+        if not groups:
+            return {}
+        # The groups are made of the tokens with the parts of speech the patterns look for,
+        # even when they were set by hand instead of by the pipeline's tagger.
+        doc.is_tagged = True
+
+        group_colls = {}
+        for (word, morpho), idxs in groups.items():
+            group_colls[(word, morpho)] = {}
+            matcher, length = self._matchers.get((word, morpho)) or (None, 0)
+            if matcher is None:
+                continue
+
+            spans = {}
+            for start, end in self._windows(idxs, length, len(doc)):
+                for match_id, s, e in matcher(doc[start:end]):
+                    spans.setdefault(self.vocab.strings[match_id], set()).add((start + s, start + e))
+
+            for k, matches in spans.items():
+                collocated = []
+                last_end = None
+                for start, end in sorted(matches, key=lambda x: (x[0], -x[1])):
+                    if last_end is not None and start < last_end:
+                        continue
+                    span = doc[start:end]
+                    collocated.append((span.text, span.start_char, span.end_char))
+                    last_end = end
+                group_colls[(word, morpho)][k] = collocated
+
+        return group_colls
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Engines to pick out the sections of the Online Oxford Collocation Dictionary's pages
+the collocations are extracted from: the word types of each entry and the markup of
+its paragraphs, bereft of the examples.
+
+Both engines return the same sections for the same page. The lxml one walks the
+parsed tree only once, writing each paragraph's markup the way BeautifulSoup
+serializes it, instead of building a BeautifulSoup tree, serializing the paragraphs
+and stripping their examples with regular expressions.
+
+"""
+
+import regex
+from bs4 import BeautifulSoup as bs
+from lxml import etree
+
+
+# Elements BeautifulSoup's HTML tree builders write as empty-element tags, such as <br/>.
+_VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                            'keygen', 'link', 'menuitem', 'meta', 'param', 'source',
+                            'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+                            'image', 'isindex', 'nextid', 'spacer'])
+
+_ITEMS = etree.XPath("//div[contains(concat(' ', normalize-space(@class), ' '), ' item ')]")
+_WORD_TYPES = etree.XPath(".//p[contains(concat(' ', normalize-space(@class), ' '), ' word ')]")
+_PARAGRAPHS = etree.XPath(".//p")
+
+# Elements within which BeautifulSoup keeps the strings made only of whitespace as they are.
+_PRESERVE_WHITESPACE = frozenset(['pre', 'textarea'])
+_ASCII_SPACES = frozenset(' \n\t\x0c\r')
+
+_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
+_escapable = regex.compile(r'[&<>]')
+
+
+
+def bs4_sections(page):
+    """
+    Picks out the sections of the page with BeautifulSoup.
+
+    Returns:
+        word_types (list): The string of the first <i> of each of the entries'
+            word types, or False for the ones without it.
+        items (list): For each entry, the string of the <u> of each of its paragraphs
+            with one, along with the paragraph's markup without the examples.
+    """
+
+    core_soup = bs(page, 'lxml')
+    soup = core_soup.find_all('div', {'class': 'item'})
+
+    word_types = []
+    for s in soup:
+        for wt in s.find_all('p', {'class': 'word'}):
+            word_types.append(wt.i.string if wt.i else False)
+
+    items = []
+    for s in soup:
+        paragraphs = []
+        for a in s.find_all('p'):
+            if not a.u:
+                continue
+            try:
+                examples = a.find_all('i')
+                re_examples = regex.compile('|'.join(list(map(lambda x: regex.escape(str(x)), examples))))
+                without_examples = regex.sub(re_examples, '', str(a))
+            except:
+                without_examples = str(a)
+            paragraphs.append((a.u.string, without_examples))
+        items.append(paragraphs)
+
+    return word_types, items
+
+
+
+def _data(text, preserve):
+    """
+    Returns the string as BeautifulSoup stores it, which replaces the strings made only
+    of ASCII whitespace with a newline, when they have one, or a space.
+    """
+
+    if preserve or not all(c in _ASCII_SPACES for c in text):
+        return str(text)
+
+    return '\n' if '\n' in text else ' '
+
+
+
+def _preserves(el):
+    return el.tag in _PRESERVE_WHITESPACE or any(a.tag in _PRESERVE_WHITESPACE for a in el.iterancestors())
+
+
+
+def _string(el, preserve):
+    """
+    Returns the element's only string, looking into its only child when it's
+    an element itself, as BeautifulSoup's Tag.string does.
+    """
+
+    nodes = [el.text] if el.text else []
+    for child in el:
+        nodes.append(child)
+        if child.tail:
+            nodes.append(child.tail)
+
+    if len(nodes) != 1:
+        return None
+
+    node = nodes[0]
+    if isinstance(node, str):
+        return _data(node, preserve)
+    if node.tag is etree.Comment:
+        return _data(node.text or '', preserve)
+    if not isinstance(node.tag, str):
+        return None
+
+    return _string(node, preserve or node.tag in _PRESERVE_WHITESPACE)
+
+
+
+def _escape(text):
+    return _escapable.sub(lambda m: _ESCAPES.get(m.group()), text)
+
+
+
+def _attribute(key, value):
+
+    value = _escape(value)
+    if '"' in value:
+        if "'" in value:
+            return f'{key}="{value.replace(chr(34), "&quot;")}"'
+        return f"{key}='{value}'"
+
+    return f'{key}="{value}"'
+
+
+
+def _write(el, parts, skip, preserve):
+    """
+    Writes the markup of the element and its descendants, but not its tail,
+    leaving out the elements whose tag is skip.
+    """
+
+    if el.tag is etree.Comment:
+        parts.append(f'<!--{_data(el.text or "", preserve)}-->')
+        return
+    if not isinstance(el.tag, str):
+        return
+
+    attributes = ''.join(' ' + _attribute(k, v) for k, v in el.attrib.items())
+    if el.tag in _VOID_ELEMENTS and not el.text and not len(el):
+        parts.append(f'<{el.tag}{attributes}/>')
+        return
+
+    inner = preserve or el.tag in _PRESERVE_WHITESPACE
+    parts.append(f'<{el.tag}{attributes}>')
+    if el.text:
+        parts.append(_escape(_data(el.text, inner)))
+    for child in el:
+        if child.tag != skip:
+            _write(child, parts, skip, inner)
+        if child.tail:
+            parts.append(_escape(_data(child.tail, inner)))
+    parts.append(f'</{el.tag}>')
+
+
+
+def lxml_sections(page):
+    """
+    Picks out the sections of the page with lxml, returning them
+    the same way bs4_sections does.
+    """
+
+    if not page.strip():
+        return [], []
+
+    root = etree.fromstring(page.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+    if root is None:
+        return [], []
+
+    soup = _ITEMS(root)
+
+    word_types = []
+    for s in soup:
+        for wt in _WORD_TYPES(s):
+            i = wt.find('.//i')
+            word_types.append(_string(i, _preserves(i)) if i is not None else False)
+
+    items = []
+    for s in soup:
+        paragraphs = []
+        for a in _PARAGRAPHS(s):
+            u = a.find('.//u')
+            if u is None:
+                continue
+            parts = []
+            _write(a, parts, 'i', _preserves(a))
+            paragraphs.append((_string(u, _preserves(u)), ''.join(parts)))
+        items.append(paragraphs)
+
+    return word_types, items
+
+
+
+PARSE_ENGINES = {'bs4': bs4_sections, 'lxml': lxml_sections}
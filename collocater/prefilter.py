@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inverted index from the words the collocations' patterns require to the words
+and types of collocations whose patterns require them, to leave out
+the patterns that cannot match a text before running them.
+
+"""
+
+import regex
+
+
+# Maximum number of strings a pattern's node is expanded to, 
+# and to which two nodes of several strings each can be combined, 
+# before only the fragments of words one of which it requires are kept.
+_EXACT_MAX = 1024
+_EXACT_LIMIT = 32
+
+_tokens = regex.compile(r"\\.|\[\^?\]?(?:\\.|[^\]\\])*\]|\(\?(?:[:=!]|<=|<!)|[()|^$.]|\{\d+(?:,\d*)?\}"
+                        r"|[?*+]|[^\\\[()|^$.{?*+]+|.", regex.S)
+_words = regex.compile(r'[^\W_]+')
+_delimiters = regex.compile(r'[\W_]+')
+
+# Each node of a pattern is summarised as a tuple with the strings it can match, if not too many,
+# the fragments of words one of which its matches must contain, whether it can match the empty string
+# and whether its non-empty matches always start and end with a delimiter. Strings are casefolded
+# and their delimiters replaced with single spaces.
+#
+# Fragments are tuples of their kind and string: whole 'word's, 'prefix'es and 'suffix'es 
+# of words, and 'infix'es found anywhere in a word.
+_ANY = (None, None, False, False, False)
+_EMPTY = (frozenset(['']), None, True, True, True)
+_DELIMITER = (frozenset([' ']), None, False, True, True)
+_KINDS = {(True, True): 'word', (True, False): 'prefix', (False, True): 'suffix', (False, False): 'infix'}
+_BONUS = {'word': 3, 'prefix': 2, 'suffix': 1, 'infix': 0}
+
+
+
+def _literal(run):
+    """
+    Function to summarise a run of literal characters of a pattern.
+    """
+
+    return _summary(frozenset([_delimiters.sub(' ', run.casefold())]), False)
+
+
+
+def _escape(token):
+    """
+    Function to summarise an escaped character of a pattern.
+    """
+
+    ch = token[1]
+    if ch in 'sWntrfvAZbz':
+        return _DELIMITER
+    if ch == 'B':
+        return _EMPTY
+    if ch.isalnum():
+        return _ANY
+    return _literal(ch)
+
+
+
+def _char_class(token):
+    """
+    Function to summarise a character class, which stands for a delimiter
+    only when none of its characters can be part of a word.
+    """
+
+    body = token[1:-1]
+    if body.startswith('^'):
+        return _ANY
+
+    i = 0
+    while i < len(body):
+        if body[i] == '\\':
+            if not body[i+1:i+2] in ['s', 'W'] and _words.match(body, i+1):
+                return _ANY
+            i += 2
+        elif body[i] == '-' and 0 < i < len(body) - 1:
+            return _ANY
+        elif _words.match(body, i):
+            return _ANY
+        else:
+            i += 1
+
+    return _DELIMITER
+
+
+
+def _fragments(string):
+    """
+    Function to split a string into the fragments of words it is made of, 
+    whose kinds depend on whether they are delimited on either side.
+    """
+    
+    pieces = string.split(' ')
+    return [(_KINDS.get((idx > 0, idx < len(pieces) - 1)), piece) 
+            for idx, piece in enumerate(pieces) if piece]
+
+
+
+def _score(fragment, avoid):
+    
+    kind, string = fragment
+    return (not avoid(string), len(string) + _BONUS.get(kind), fragment)
+
+
+
+def _required(node, avoid):
+    """
+    Function to turn the strings a node can match into the fragments of words 
+    one of which its matches must contain, keeping the best fragment of each string.
+    """
+
+    exact, required = node[0], node[1]
+    if exact is None:
+        return required
+
+    fragments = set()
+    for string in exact:
+        candidates = _fragments(string)
+        if not candidates:
+            return None
+        fragments.add(max(candidates, key=lambda f: _score(f, avoid)))
+
+    return frozenset(fragments)
+
+
+
+def _better(required1, required2, avoid):
+    """
+    Function to choose the more selective of two sets of required fragments.
+    """
+
+    if required1 is None:
+        return required2
+    if required2 is None:
+        return required1
+
+    def score(required):
+        return (not any(avoid(string) for _, string in required), 
+                min(len(string) + _BONUS.get(kind) for kind, string in required), -len(required))
+
+    return required1 if score(required1) >= score(required2) else required2
+
+
+
+def _summary(exact, nullable):
+    
+    return (exact, None, nullable,
+            all(s.startswith(' ') for s in exact if s), all(s.endswith(' ') for s in exact if s))
+
+
+
+def _concat(node1, node2, avoid):
+
+    exact1, _, nullable1, starts1, ends1 = node1
+    exact2, _, nullable2, starts2, ends2 = node2
+    nullable = nullable1 and nullable2
+
+    if exact1 is not None and exact2 is not None:
+        size = len(exact1) * len(exact2)
+        if size <= _EXACT_MAX and (size <= _EXACT_LIMIT or min(len(exact1), len(exact2)) == 1):
+            exact = frozenset(regex.sub(r' {2,}', ' ', a + b) for a in exact1 for b in exact2)
+            return _summary(exact, nullable)
+
+    required = _better(_required(node1, avoid), _required(node2, avoid), avoid)
+    starts = starts1 if not nullable1 else (starts1 and starts2)
+    ends = ends2 if not nullable2 else (ends2 and ends1)
+
+    return (None, required, nullable, starts, ends)
+
+
+
+def _alternation(nodes, avoid):
+
+    if all(node[0] is not None for node in nodes):
+        exact = frozenset().union(*[node[0] for node in nodes])
+        if len(exact) <= _EXACT_MAX:
+            return _summary(exact, '' in exact)
+
+    required = set()
+    for node in nodes:
+        fragments = _required(node, avoid)
+        if fragments is None:
+            required = None
+            break
+        required.update(fragments)
+
+    return (None, frozenset(required) if required is not None else None,
+            any(node[2] for node in nodes), all(node[3] for node in nodes), all(node[4] for node in nodes))
+
+
+
+def _repeat(node, low, high, avoid):
+
+    if low == 0:
+        if high == 1 and node[0] is not None and len(node[0]) < _EXACT_MAX:
+            return (node[0] | _EMPTY[0], None, True, node[3], node[4])
+        return (None, None, True, node[3], node[4])
+
+    if low == high == 1:
+        return node
+
+    return (None, _required(node, avoid), node[2], node[3], node[4])
+
+
+
+def required_words(source, avoid=None):
+    """
+    Works out the fragments of words one of which must be found in a text 
+    for the inputted regular expression pattern to match it, when there are any.
+
+    Only the subset of the regular expression syntax the collocations' patterns
+    are written in is understood; anything else is taken to match any string,
+    so that the words returned are always required.
+
+    Parameters:
+        source (str): Not yet compiled, case-insensitive regular expression pattern.
+        avoid (function): Optional function telling which strings should only be
+            required when there are no others, such as the inflected forms of the
+            word whose collocations the pattern matches.
+
+    Returns:
+        required (frozenset): Fragments one of which every match of the pattern contains, 
+            as tuples of their kinds and casefolded strings, or None if no such fragments 
+            could be found. Their kinds are 'word', 'prefix', 'suffix' or 'infix', 
+            depending on whether they are whole words or only their beginnings, 
+            endings or any part of them.
+    """
+
+    avoid = avoid or (lambda w: False)
+    tokens = _tokens.findall(source)
+
+    # Each frame holds the finished alternatives of a group, the nodes of its
+    # current alternative and whether the group is a lookaround.
+    stack = [[[], [], False]]
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        frame = stack[-1]
+
+        if token == '(' or token.startswith('(?'):
+            stack.append([[], [], token in ['(?=', '(?!', '(?<=', '(?<!']])
+            continue
+        elif token == '|':
+            frame[0].append(frame[1])
+            frame[1] = []
+            continue
+        elif token == ')':
+            if len(stack) == 1:
+                return None
+            alternatives, current, lookaround = stack.pop()
+            node = _EMPTY if lookaround else _group(alternatives + [current])
+            frame = stack[-1]
+        elif _quantifier(token):
+            # Quantifiers apply to the previous node, lazy and possessive marks are skipped.
+            if not frame[1] or (token in '?+' and _quantifier(tokens[i-2])):
+                continue
+            if token == '?':
+                low, high = 0, 1
+            elif token == '*':
+                low, high = 0, None
+            elif token == '+':
+                low, high = 1, None
+            else:
+                bounds = token[1:-1].split(',')
+                low = int(bounds[0])
+                high = low if len(bounds) == 1 else (int(bounds[1]) if bounds[1] else None)
+            child = frame[1][-1]
+            frame[1][-1] = ('repeat', (child, low, high), low == 0 or child[2], child[3], child[4])
+            continue
+        elif token.startswith('\\'):
+            node = _escape(token)
+        elif token.startswith('[') and len(token) > 1:
+            node = _char_class(token)
+        elif token in ['^', '$']:
+            node = _DELIMITER
+        elif token == '.':
+            node = _ANY
+        elif len(token) > 1 and i < len(tokens) and _quantifier(tokens[i]):
+            # The quantifier that follows a run of characters only applies to its last one.
+            frame[1].append(_literal(token[:-1]))
+            node = _literal(token[-1])
+        else:
+            node = _literal(token)
+
+        frame[1].append(node)
+
+    if len(stack) != 1:
+        return None
+
+    alternatives, current, _ = stack[0]
+    node = _evaluate(_group(alternatives + [current]), False, False, avoid)
+    required = _required(node, avoid)
+
+    return _pruned(required) if required is not None else None
+
+
+
+def _quantifier(token):
+    return token in ['?', '*', '+'] or (token.startswith('{') and len(token) > 1)
+
+
+
+def _group(alternatives):
+    """
+    Function to build the not yet evaluated node of a group, 
+    with whether it can match the empty string and whether its non-empty 
+    matches always start and end with a delimiter.
+    """
+    
+    shapes = []
+    for nodes in alternatives:
+        nullable, starts, ends = True, True, True
+        for node in nodes:
+            if nullable:
+                starts = starts and node[3]
+            ends = node[4] if not node[2] else (ends and node[4])
+            nullable = nullable and node[2]
+        shapes.append((nullable, starts, ends))
+        
+    return ('group', alternatives, any(shape[0] for shape in shapes), 
+            all(shape[1] for shape in shapes), all(shape[2] for shape in shapes))
+
+
+
+def _evaluate(node, before, after, avoid):
+    """
+    Function to summarise a node given whether the nodes before and after it 
+    always end and start with a delimiter, which complete the words at the edges 
+    of the strings it can match.
+    """
+    
+    if node[0] == 'group':
+        node = _alternation([_sequence(nodes, before, after, avoid) for nodes in node[1]], avoid)
+    elif node[0] == 'repeat':
+        child, low, high = node[1]
+        if high == 1:
+            child = _evaluate(child, before, after, avoid)
+        else:
+            child = _evaluate(child, before and child[4], after and child[3], avoid)
+        node = _repeat(child, low, high, avoid)
+        
+    if node[0] is not None and (before or after):
+        exact = frozenset(regex.sub(r' {2,}', ' ', (' ' if before else '') + s + (' ' if after else '')) 
+                          for s in node[0])
+        return (exact,) + node[1:]
+        
+    return node
+
+
+
+def _sequence(nodes, before, after, avoid):
+    
+    delimited, ends = before, [before] * len(nodes)
+    for i, node in enumerate(nodes):
+        ends[i] = delimited
+        delimited = node[4] and (not node[2] or delimited)
+    delimited, starts = after, [after] * len(nodes)
+    for i in range(len(nodes) - 1, -1, -1):
+        starts[i] = delimited
+        delimited = nodes[i][3] and (not nodes[i][2] or delimited)
+        
+    sequence = _EMPTY
+    for i, node in enumerate(nodes):
+        sequence = _concat(sequence, _evaluate(node, ends[i], starts[i], avoid), avoid)
+        
+    return sequence
+
+
+
+def _pruned(required):
+    """
+    Function to leave out the fragments found in every string other fragments are found in.
+    """
+    
+    kept = {kind: set() for kind in _BONUS}
+    for kind, string in sorted(required, key=lambda f: len(f[1])):
+        n = len(string)
+        if (set(string[i:j] for i in range(n) for j in range(i + 1, n + 1)) & kept.get('infix') 
+            or (kind in ['word', 'prefix'] and set(string[:j] for j in range(1, n + 1)) & kept.get('prefix'))
+            or (kind in ['word', 'suffix'] and set(string[i:] for i in range(n)) & kept.get('suffix'))
+            or (kind == 'word' and string in kept.get('word'))):
+            continue
+        kept.get(kind).add(string)
+        
+    return frozenset((kind, string) for kind, strings in kept.items() for string in strings)
+
+
+
+class CollocateIndex():
+    """
+    Inverted index from the fragments of words the collocations' patterns require 
+    to the words, morphologies and types of collocations whose patterns require them.
+
+    The digest of the entry each word's patterns were built from is kept along with them,
+    so that words whose entries have changed since are left out of the index,
+    and all their patterns are run.
+
+    Parameters:
+        signature (tuple): Settings of the Collocater object the patterns were built
+            with, for the index to be used only with the same ones.
+    """
+
+    def __init__(self, signature=None):
+
+        self.signature = signature
+        # Words and morphologies whose patterns have been indexed.
+        self.pairs = set()
+        # Digests of the entries the patterns of each word were built from, 
+        # and words whose entries have already been checked against them.
+        self.digests = {}
+        self._checked = set()
+        # Types of collocations of each word and morphology with no required fragments.
+        self._always = {}
+        # Postings of each kind of fragments.
+        self._postings = {kind: {} for kind in _BONUS}
+        self._longest_infix = 0
+
+
+    def __len__(self):
+        return sum(len(postings) for postings in self._postings.values())
+
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self.__dict__.setdefault('digests', {})
+        self._checked = set()
+
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        state.pop('_checked', None)
+        return state
+
+
+    def add(self, word, morpho, key, required):
+        """
+        Adds the fragments required by the pattern of a type of collocations of a word,
+        or records that it requires none when they are None.
+        """
+
+        self.pairs.add((word, morpho))
+        if required is None:
+            self._always.setdefault((word, morpho), set()).add(key)
+            return
+
+        for kind, string in required:
+            if kind == 'infix':
+                self._longest_infix = max(self._longest_infix, len(string))
+            self._postings.get(kind).setdefault(string, {}).setdefault((word, morpho), set()).add(key)
+
+
+    def discard(self, word):
+        """
+        Leaves a word out of the index, for all the patterns of its collocations to be run.
+        """
+
+        for morpho in ['noun', 'verb']:
+            self.pairs.discard((word, morpho))
+            self._always.pop((word, morpho), None)
+        self.digests.pop(word, None)
+
+
+    def unchecked(self, word):
+        """
+        Tells whether the entry of an indexed word has yet to be checked against its digest.
+        """
+
+        return word in self.digests and word not in self._checked
+
+
+    def check(self, word, digest):
+        """
+        Leaves a word out of the index when the digest of its current entry isn't the one 
+        its patterns were indexed from.
+        """
+
+        if self.digests.get(word) != digest:
+            self.discard(word)
+        self._checked.add(word)
+
+
+    def candidates(self, text, pairs):
+        """
+        Finds the types of collocations of the inputted words whose patterns
+        can possibly match the text, given the words in it.
+
+        Parameters:
+            text (str): The text where collocations should be found.
+            pairs (iterable): The words and morphologies whose collocations should be found.
+
+        Returns:
+            candidates (dict): The types of collocations whose patterns should be run
+                for each of the indexed words and morphologies.
+        """
+
+        candidates = {pair: set(self._always.get(pair, ())) for pair in pairs if pair in self.pairs}
+        if not candidates:
+            return candidates
+
+        tokens = set(_words.findall(text.casefold()))
+        found = {'word': tokens,
+                 'prefix': set(t[:j] for t in tokens for j in range(1, len(t) + 1)),
+                 'suffix': set(t[i:] for t in tokens for i in range(len(t))),
+                 'infix': set(t[i:j] for t in tokens for i in range(len(t)) 
+                              for j in range(i + 1, min(i + self._longest_infix, len(t)) + 1))}
+        
+        for kind, fragments in found.items():
+            postings = self._postings.get(kind)
+            for fragment in fragments:
+                entries = postings.get(fragment)
+                if not entries:
+                    continue
+                if len(entries) < len(candidates):
+                    for pair, keys in entries.items():
+                        if pair in candidates:
+                            candidates[pair].update(keys)
+                else:
+                    for pair, keys in candidates.items():
+                        keys.update(entries.get(pair, ()))
+
+        return candidates
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rebuilding the collocations dictionary and the pickled Collocater object from the pages
+of an archive with a pool of processes, only extracting again the collocations of the words
+whose pages or whose processing changed since the last rebuild.
+
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from multiprocessing import Pool
+
+import joblib
+
+from collocater import cleaning, pages
+from collocater.archive import PageArchive
+from collocater.collocater import Collocater
+from collocater.scraper import PageFetcher, fetch_pages
+
+
+# Version of the processing of the pages, to be increased whenever it changes in a way
+# the fingerprint of its code can't tell, such as when a library it relies on does.
+PROCESSOR_VERSION = 1
+
+MANIFEST_VERSION = 1
+
+# Archive and Collocater object of each worker process, set up by _init_worker.
+_archive = None
+_collie = None
+
+
+
+def processor_version(tags_dict):
+    """
+    Returns the fingerprint of the processing the pages go through, which changes along
+    with the code extracting the collocations from them and the tags it works with.
+    """
+
+    digest = hashlib.sha256()
+    digest.update(str(PROCESSOR_VERSION).encode('utf-8'))
+    for source in [inspect.getsource(pages), inspect.getsource(cleaning),
+                   inspect.getsource(Collocater._collocations_from_page)]:
+        digest.update(source.encode('utf-8'))
+    digest.update(json.dumps(sorted((k, v) for k, v in tags_dict.items() if k != 'this_word')).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+
+def read_manifest(path):
+    """
+    Reads the manifest of a previous rebuild, with the digest of each word's page
+    and the fingerprint of the processing its collocations were extracted with.
+    """
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding='utf-8') as fh:
+        manifest = json.load(fh)
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+
+    return manifest.get('words', {})
+
+
+
+def _dump(obj, path, json_file=False):
+    """
+    Writes the file under a temporary name first, so that an interrupted rebuild
+    never leaves it half written.
+    """
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if json_file:
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(obj, fh, ensure_ascii=False, sort_keys=True)
+    else:
+        with open(tmp_path, 'wb') as fh:
+            joblib.dump(obj, fh)
+    os.replace(tmp_path, path)
+
+
+
+def fetch_missing(archive, words, concurrency=8, rate=None, retries=3, timeout=10, base_url=None):
+    """
+    Fetches the pages of the words missing from the archive and stores them in it.
+
+    Returns:
+        failed (list): The words whose pages couldn't be retrieved.
+    """
+
+    missing = [word for word in dict.fromkeys(words) if word not in archive]
+    failed = []
+    if not missing:
+        return failed
+
+    fetcher = PageFetcher(base_url, rate=rate, pool_size=concurrency, retries=retries, timeout=timeout)
+    try:
+        for word, page, error in fetch_pages(missing, fetcher, concurrency):
+            if page is None:
+                failed.append(word)
+            else:
+                archive.put(word, page)
+    finally:
+        fetcher.close()
+
+    return failed
+
+
+
+def _init_worker(directory, tags_dict, parse_engine):
+    """
+    Opens the archive and sets up the Collocater object a worker process extracts
+    the collocations of all its words with.
+    """
+
+    global _archive, _collie
+    _archive = PageArchive(directory)
+    _collie = Collocater({}, [], collocations_dictionary={}, tags_dict=dict(tags_dict), parse_engine=parse_engine)
+
+
+def _process(item):
+    """
+    Extracts the collocations of a word from its archived page in a worker process.
+    """
+
+    word, digest = item
+    try:
+        collocations = _collie._collocations_from_page(word, _archive.get(word))
+    except Exception as error:
+        return word, digest, None, f"{type(error).__name__}: {error}"
+    finally:
+        _collie.collocations_dictionary.pop(word, None)
+
+    return word, digest, collocations, None
+
+
+
+def rebuild_dictionary(archive, out_dir, words=None, base=None, processes=None, chunksize=16,
+                       parse_engine='lxml', fetch=False, **fetch_kwargs):
+    """
+    Rebuilds collocations_dict.joblib and collocater_obj.joblib in the output directory from
+    the pages of the archive, extracting the collocations of each word in a pool of processes.
+
+    The manifest.json written along with them keeps the digest of each word's page and the
+    fingerprint of its processing, so that following rebuilds only process the words whose
+    pages or processing changed. The entries of the words not in the archive are kept as they are.
+
+    Parameters:
+        archive (str): Directory of the archive of pages.
+        out_dir (str): Directory the files are written to, and where the ones of the last
+            rebuild are read from.
+        words (iterable): Optional words to be rebuilt, which default to all the archived ones.
+        base (str): Optional path to the pickled Collocater object the settings and,
+            on the first rebuild, the entries are taken from. Defaults to the one shipped with the package.
+        processes (int): Number of worker processes, which defaults to the number of CPUs.
+            With 1, the words are processed in the current process.
+        chunksize (int): Number of words sent to the workers at a time.
+        parse_engine (str): Engine the pages are parsed with.
+        fetch (bool): Whether the pages of the words missing from the archive should be fetched first.
+        fetch_kwargs: Arguments of fetch_missing, such as concurrency or rate.
+
+    Returns:
+        summary (dict): Numbers of words processed, skipped because nothing changed,
+            and failed, along with the errors of the latter.
+    """
+
+    archive = PageArchive(archive)
+    os.makedirs(out_dir, exist_ok=True)
+    dict_path = os.path.join(out_dir, 'collocations_dict.joblib')
+    obj_path = os.path.join(out_dir, 'collocater_obj.joblib')
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+
+    collie = Collocater.loader(base, lazy=True)
+
+    words = list(dict.fromkeys(archive if words is None else words))
+    failed = {}
+    if fetch:
+        failed.update((word, "Page not retrieved") for word in fetch_missing(archive, words, **fetch_kwargs))
+
+    version = processor_version(collie.tags_dict)
+    manifest = read_manifest(manifest_path)
+    items = []
+    n_skipped = 0
+    for word in words:
+        digest = archive.digest(word)
+        if digest is None:
+            failed.setdefault(word, "Not in the archive")
+        elif manifest.get(word) == {'source': digest, 'processor': version}:
+            n_skipped += 1
+        else:
+            items.append((word, digest))
+
+    if not items and os.path.exists(obj_path):
+        return {'processed': 0, 'skipped': n_skipped, 'failed': len(failed), 'errors': failed}
+
+    if os.path.exists(dict_path):
+        with open(dict_path, 'rb') as fh:
+            collie.collocations_dictionary = joblib.load(fh)
+    else:
+        collie.collocations_dictionary = dict(collie.collocations_dictionary.items())
+
+    initargs = (archive.directory, collie.tags_dict, parse_engine)
+    pool = None
+    n_processed = 0
+    try:
+        if processes == 1 or len(items) <= 1:
+            _init_worker(*initargs)
+            results = map(_process, items)
+        else:
+            pool = Pool(processes, initializer=_init_worker, initargs=initargs)
+            results = pool.imap_unordered(_process, items, chunksize)
+
+        for word, digest, collocations, error in results:
+            if error is not None:
+                failed[word] = error
+                continue
+            if collocations is None:
+                collie.collocations_dictionary.pop(word, None)
+            else:
+                collie.collocations_dictionary[word] = collocations
+            manifest[word] = {'source': digest, 'processor': version}
+            n_processed += 1
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if n_processed or not os.path.exists(obj_path):
+        _dump(collie.collocations_dictionary, dict_path)
+        collie.literal_matcher = None
+        collie.collocate_index = None
+        collie.clear_pattern_cache()
+        _dump(collie, obj_path)
+        _dump({'version': MANIFEST_VERSION, 'words': manifest}, manifest_path, json_file=True)
+
+    return {'processed': n_processed, 'skipped': n_skipped, 'failed': len(failed), 'errors': failed}
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Storing the collocations found in many documents as columns, one row per collocation
+and type, which can be turned into a pandas data frame in a single step
+or written to Arrow and Parquet files in batches.
+
+"""
+
+from array import array
+
+import numpy
+import pandas as pd
+
+
+# Columns of the results, with the typecodes of the arrays of the integer ones.
+COLUMNS = ['doc_id', 'collocation', 'headword', 'pos', 'coll_type',
+           'start', 'end', 'start_char', 'end_char']
+INT_COLUMNS = {'start': 'q', 'end': 'q', 'start_char': 'q', 'end_char': 'q'}
+
+# Names the types of collocations are shown with in the human-readable data frame.
+COLL_TYPE_NAMES = {'prep': 'Preposition',
+                   'adj': 'Adjective',
+                   'adv': 'Adverb',
+                   'pre_verb': 'Object of verb',
+                   'post_verb': 'Subject of verb',
+                   'post_noun': 'Appositive',
+                   'quant': 'Quantity noun',
+                   'phr': 'Phrase'}
+
+
+
+def _collocations(collocations):
+    """
+    Yields the string, token and character offsets and labels of the collocations, which can either be
+    the dictionary returned by the Collocater object for strings, whose character offsets are unknown,
+    a Doc the collocations were added to or its spans, or the records yielded by Collocater.stream.
+    """
+
+    if isinstance(collocations, dict):
+        for string, found in collocations.items():
+            start, end = found.get('location')
+            yield string, start, end, -1, -1, found.get('coll_type').split(' / ')
+        return
+
+    if hasattr(collocations, '_'):
+        collocations = collocations._.collocs
+    for collocation in collocations:
+        if isinstance(collocation, dict):
+            yield (collocation.get('text'), collocation.get('start'), collocation.get('end'),
+                   collocation.get('start_char'), collocation.get('end_char'), collocation.get('coll_type'))
+        else:
+            yield (collocation.text, collocation.start, collocation.end,
+                   collocation.start_char, collocation.end_char, collocation.label_.split(' / '))
+
+
+
+class CollocationTable():
+    """
+    Columns of the collocations found in any number of documents, with a row
+    for each type of each collocation: the document's id, the collocation,
+    the headword and part of speech it's a collocation of, its type, and the positions
+    of its first and last tokens and characters, which are -1 when unknown.
+    """
+
+    def __init__(self):
+
+        self.columns = {column: array(INT_COLUMNS.get(column)) if column in INT_COLUMNS else []
+                        for column in COLUMNS}
+
+
+    def __len__(self):
+
+        return len(self.columns.get('collocation'))
+
+
+    def add(self, collocations, doc_id=None):
+        """
+        Adds the collocations found in a document to the columns.
+
+        Parameters:
+            collocations: The dictionary returned by the Collocater object for strings,
+                a Doc the collocations were added to, or the records yielded by Collocater.stream.
+            doc_id: The id of the document they were found in.
+
+        Returns:
+            table (CollocationTable): The table itself.
+        """
+
+        columns = self.columns
+        for string, start, end, start_char, end_char, labels in _collocations(collocations):
+            for label in labels:
+                word_type, _, coll_type = label.partition('__')
+                columns.get('doc_id').append(doc_id)
+                columns.get('collocation').append(string)
+                columns.get('headword').append(word_type.rsplit('_', 1)[0])
+                columns.get('pos').append(word_type.split('_')[-1])
+                columns.get('coll_type').append(coll_type)
+                columns.get('start').append(start)
+                columns.get('end').append(end)
+                columns.get('start_char').append(start_char)
+                columns.get('end_char').append(end_char)
+
+        return self
+
+
+    def extend(self, results):
+        """
+        Adds the collocations of many documents, such as the ones
+        yielded by Collocater.pipe with as_tuples=True.
+
+        Parameters:
+            results (iterable): Tuples of the collocations found in each document and its id.
+
+        Returns:
+            table (CollocationTable): The table itself.
+        """
+
+        for collocations, doc_id in results:
+            self.add(collocations, doc_id)
+
+        return self
+
+
+    def clear(self):
+
+        self.__init__()
+
+
+    def _arrays(self):
+        """
+        Returns the columns as numpy arrays, copying the integer ones in a single step.
+        """
+
+        return {column: numpy.frombuffer(values, dtype=numpy.int64).copy() if column in INT_COLUMNS else values
+                for column, values in self.columns.items()}
+
+
+    def to_pandas(self):
+        """
+        Returns the collocations as a data frame with a column for each field.
+        """
+
+        return pd.DataFrame(self._arrays(), columns=COLUMNS)
+
+
+    def to_arrow(self, schema=None):
+        """
+        Returns the collocations as a pyarrow Table, which requires pyarrow to be installed.
+
+        Parameters:
+            schema (pyarrow.Schema): Optional schema the columns should have, such as the one
+                returned by arrow_schema, instead of the types inferred from their values.
+                The documents' ids are turned into strings when it says so.
+        """
+
+        import pyarrow as pa
+
+        arrays = self._arrays()
+        if schema is not None and pa.types.is_string(schema.field('doc_id').type):
+            arrays['doc_id'] = [None if doc_id is None else str(doc_id) for doc_id in arrays.get('doc_id')]
+
+        return pa.table(arrays, schema=schema)
+
+
+    def readable(self):
+        """
+        Returns the human-readable data frame of the collocations, indexed by the collocations,
+        with the headword and part of speech, type and positions of the first
+        and last tokens of each, the latter starting at 1.
+        """
+
+        columns = self.columns
+        return pd.DataFrame(
+            {'Morphology of word with collocation': [f"{h.split('_')[0]} ({p})" for h, p
+                                                     in zip(columns.get('headword'), columns.get('pos'))],
+             'Type of collocation': [COLL_TYPE_NAMES.get(t, t) for t in columns.get('coll_type')],
+             'Positions of first and last token of collocation': [f"start: {s + 1}; end: {e}" for s, e
+                                                                  in zip(columns.get('start'), columns.get('end'))]},
+            index=pd.Index(columns.get('collocation')))
+
+
+
+def arrow_schema(doc_id_type=None):
+    """
+    Function to build the pyarrow schema of the collocations, with strings for the texts
+    and 64-bit integers for the offsets, which requires pyarrow to be installed.
+
+    Parameters:
+        doc_id_type (pyarrow.DataType): The type of the documents' ids, strings by default.
+
+    Returns:
+        schema (pyarrow.Schema): The schema.
+    """
+
+    import pyarrow as pa
+
+    types = {column: pa.int64() if column in INT_COLUMNS else pa.string() for column in COLUMNS}
+    types['doc_id'] = doc_id_type or pa.string()
+
+    return pa.schema(list(types.items()))
+
+
+
+def write_parquet(results, path, batch_size=100000, schema=None):
+    """
+    Function to write the collocations of many documents to a Parquet file in batches,
+    so that only the rows of one of them are held in memory at a time,
+    which requires pyarrow to be installed.
+
+    Every batch is cast to the same schema, so that batches whose columns are empty,
+    or whose documents' ids are of different types, are written all the same.
+
+    Parameters:
+        results (iterable): Tuples of the collocations found in each document and its id,
+            such as the ones yielded by Collocater.pipe with as_tuples=True.
+        path (str): The path of the Parquet file.
+        batch_size (int): The number of rows each batch is written after.
+        schema (pyarrow.Schema): The schema of the file, which defaults to the one
+            returned by arrow_schema, with the documents' ids as strings.
+
+    Returns:
+        rows (int): The number of rows written.
+    """
+
+    import pyarrow.parquet as pq
+
+    schema = schema or arrow_schema()
+    table = CollocationTable()
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for collocations, doc_id in results:
+            table.add(collocations, doc_id)
+            if len(table) >= batch_size:
+                writer.write_table(table.to_arrow(schema))
+                rows += len(table)
+                table.clear()
+        if len(table):
+            writer.write_table(table.to_arrow(schema))
+            rows += len(table)
+
+    return rows
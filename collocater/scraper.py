@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fetching the pages of the Online Oxford Collocation Dictionary concurrently,
+over pooled keep-alive connections and within a given rate of requests.
+
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Search page of the Online Oxford Collocation Dictionary, to which the words are appended.
+BASE_URL = 'http://oxforddictionary.so8848.com/search?word='
+
+# Statuses worth retrying the request for, as the server may well answer it later.
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+
+class TokenBucket():
+    """
+    Thread-safe token bucket limiting the rate at which requests are made.
+
+    Parameters:
+        rate (float): Number of tokens added to the bucket per second.
+        capacity (int): Maximum number of tokens the bucket can hold,
+            which is the number of requests that can be made in a burst.
+    """
+
+    def __init__(self, rate, capacity=1):
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self):
+        """
+        Takes a token from the bucket, waiting for it to be refilled if it's empty.
+        """
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+
+class PageFetcher():
+    """
+    Fetches the dictionary's pages of the words provided, sharing a pool of
+    keep-alive connections among all the threads using it.
+
+    Parameters:
+        base_url (str): URL the words are appended to, which defaults to the dictionary's search page.
+        rate (float): Maximum number of requests per second. None means unlimited.
+        pool_size (int): Maximum number of connections kept open to the server.
+        retries (int): Number of times a request is retried after a connection error,
+            a timeout or a status in RETRY_STATUSES.
+        backoff (float): Seconds waited before the first retry, doubled on each of the following ones.
+        timeout (float): Seconds waited for the server to connect and to answer.
+    """
+
+    def __init__(self, base_url=None, rate=None, pool_size=8, retries=3, backoff=0.5, timeout=10):
+
+        self.base_url = base_url or BASE_URL
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, max(1, pool_size)) if rate else None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+
+    def url(self, word):
+        return self.base_url + quote(word)
+
+
+    def _delay(self, attempt, response=None):
+        """
+        Returns the seconds to wait before retrying, honouring the server's Retry-After header.
+        """
+
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+
+        return self.backoff * 2 ** attempt * (1 + random.random()) / 2
+
+
+    def fetch(self, word):
+        """
+        Requests the page of the word, retrying it as many times as allowed.
+
+        Returns:
+            text (str): The content of the page, or None when the server answers
+                with a status not worth retrying, such as 404.
+
+        Raises:
+            requests.RequestException: When the last attempt fails.
+        """
+
+        for attempt in range(self.retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+
+            last = attempt == self.retries
+            try:
+                response = self.session.get(self.url(word), timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES:
+                if last:
+                    response.raise_for_status()
+                time.sleep(self._delay(attempt, response))
+                continue
+
+            if not response.ok:
+                return None
+
+            return response.text
+
+
+    def close(self):
+        self.session.close()
+
+
+
+def fetch_pages(words, fetcher, concurrency=8):
+    """
+    Fetches the pages of the words with a pool of threads sharing the fetcher's connections.
+
+    Yields:
+        word (str): The word, in the order the pages arrive in.
+        page (str): The content of the word's page, or None when it couldn't be retrieved.
+        error (requests.RequestException): The error of the last attempt, when it failed.
+    """
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        futures = {executor.submit(fetcher.fetch, word): word for word in words}
+        for future in as_completed(futures):
+            word = futures.get(future)
+            try:
+                yield word, future.result(), None
+            except requests.RequestException as error:
+                yield word, None, error
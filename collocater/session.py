@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retrieving the collocations of a text being edited, such as a document in an editor,
+reparsing and rematching only the sentences changed since the previous version
+and the ones around them, instead of the whole text.
+
+"""
+
+import hashlib
+from bisect import bisect_right
+from itertools import chain
+
+import numpy
+from spacy.attrs import DEP, HEAD, LEMMA, POS, TAG
+from spacy.tokens import Doc
+
+from collocater.streaming import _overlap_words, _sentence_end, _word
+
+
+
+def _segments(text):
+    """
+    Splits the text into sentences, along with the whitespace following them,
+    returning the offsets of their first and last characters.
+    """
+
+    bounds = [0] + [match.end() for match in _sentence_end.finditer(text)]
+    if bounds[-1] != len(text):
+        bounds.append(len(text))
+
+    return list(zip(bounds, bounds[1:]))
+
+
+
+def _digest(sentence):
+    return hashlib.blake2b(sentence.encode('utf-8'), digest_size=16).digest()
+
+
+
+class EditSession():
+    """
+    Collocations of the successive versions of a text, which keeps the parse of each of
+    its sentences, by the hash of its content, and the collocations found in it.
+
+    Each version is split into sentences, and only the ones not found in the previous
+    version are parsed. The collocations are matched again in those and in the sentences
+    around them that are within the span of the patterns of their words, in a Doc made
+    of the sentences already parsed, and the collocations of the rest of the sentences
+    are carried over from the previous version.
+
+    As the sentences are parsed on their own, and the collocations matched in a few of them
+    instead of in the whole text, they may differ slightly from those the Collocater object
+    would find in the whole text, as those of stream do.
+
+    Parameters:
+        collie (Collocater): The object the collocations are found with.
+    """
+
+    def __init__(self, collie):
+
+        self.collie = collie
+        self.doc = None
+        # Parse of each sentence of the current version: its words, spaces, attributes,
+        # number of words and span of the patterns of its words.
+        self._parses = {}
+        self._keys = []
+        # Collocations starting in each sentence of the current version: their offsets
+        # and labels, and the collocations of its tokens, relative to the sentence.
+        self._results = []
+        self._attrs = None
+
+
+    def _parse(self, sentences):
+        """
+        Parses the sentences not already parsed, keeping their words and attributes.
+        """
+
+        nlp = self.collie.get_nlp()
+        missing = {_digest(sentence): sentence for sentence in sentences}
+        missing = {key: sentence for key, sentence in missing.items() if key not in self._parses}
+
+        for key, doc in zip(missing, nlp.pipe(missing.values())):
+            if self._attrs is None:
+                self._attrs = [LEMMA, POS, TAG, HEAD, DEP] if doc.is_parsed else [LEMMA, POS, TAG]
+            self._parses[key] = ([t.text for t in doc], [bool(t.whitespace_) for t in doc],
+                                 doc.to_array(self._attrs), len(_word.findall(doc.text)),
+                                 _overlap_words(self.collie, doc))
+
+
+    def _doc(self, keys):
+        """
+        Makes a Doc out of the sentences already parsed.
+        """
+
+        parses = [self._parses.get(key) for key in keys]
+        doc = Doc(self.collie.get_nlp().vocab, words=list(chain.from_iterable(p[0] for p in parses)),
+                  spaces=list(chain.from_iterable(p[1] for p in parses)))
+        if len(doc):
+            doc.from_array(self._attrs, numpy.concatenate([p[2] for p in parses]))
+
+        return doc
+
+
+    def _around(self, keys, seeds):
+        """
+        Returns the positions of the sentences within the span of the patterns
+        of the words of the sentences provided, or of the ones around them.
+        """
+
+        near = set(seeds)
+        for seed in seeds:
+            for step in [-1, 1]:
+                span = self._parses.get(keys[seed])[4]
+                words = 0
+                i = seed + step
+                while 0 <= i < len(keys) and words < span:
+                    _, _, _, n_words, sentence_span = self._parses.get(keys[i])
+                    near.add(i)
+                    words += n_words
+                    span = max(span, sentence_span)
+                    i += step
+
+        return near
+
+
+    def _runs(self, positions):
+        """
+        Groups the positions into runs of consecutive ones.
+        """
+
+        runs = []
+        for i in sorted(positions):
+            if runs and i == runs[-1][1]:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+
+        return runs
+
+
+    def update(self, text):
+        """
+        Finds the collocations of the new version of the text.
+
+        Parameters:
+            text (str): The whole text of the new version.
+
+        Returns:
+            doc (spacy.tokens.doc.Doc): The text, made of the parses of its sentences,
+                with the collocations found in it added to its token and span level,
+                as they would be by the Collocater object.
+        """
+
+        segments = _segments(text)
+        sentences = [text[start:end] for start, end in segments]
+        keys = [_digest(sentence) for sentence in sentences]
+        self._parse(sentences)
+
+        # The results of the sentences the previous version starts and ends with are
+        # carried over, and the sentences between them, which were edited, are matched again
+        # along with the ones around them.
+        old_keys = self._keys
+        prefix = 0
+        while prefix < min(len(keys), len(old_keys)) and keys[prefix] == old_keys[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < min(len(keys), len(old_keys)) - prefix 
+               and keys[-suffix-1] == old_keys[-suffix-1]):
+            suffix += 1
+        results = (self._results[:prefix] + [None] * (len(keys) - prefix - suffix) 
+                   + self._results[len(old_keys) - suffix:])
+        if keys == old_keys:
+            seeds = set()
+        else:
+            seeds = set(j for j in range(prefix - 1, len(keys) - suffix + 1) if 0 <= j < len(keys))
+        dirty = self._around(keys, seeds)
+
+        token_starts = numpy.cumsum([0] + [len(self._parses.get(key)[0]) for key in keys]).tolist()
+        for start, end in self._runs(dirty):
+            context = sorted(self._around(keys, [start, end - 1]) | set(range(start, end)))
+            first = context[0]
+            doc = self._doc(keys[first:context[-1] + 1])
+            self.collie._annotate(doc)
+
+            # The collocations are assigned to the sentences they start in.
+            base_char = segments[first][0]
+            starts = [segments[i][0] - base_char for i in range(first, context[-1] + 1)]
+            for i in range(start, end):
+                results[i] = ([], {})
+            for span in doc._.collocs:
+                i = first + bisect_right(starts, span.start_char) - 1
+                if start <= i < end:
+                    char_start = segments[i][0] - base_char
+                    results[i][0].append((span.start_char - char_start, span.end_char - char_start, span.label_))
+            for token in doc:
+                i = first + bisect_right(starts, token.idx) - 1
+                if start <= i < end and token._.colloc:
+                    results[i][1][token.i - (token_starts[i] - token_starts[first])] = token._.colloc
+
+        self._keys = keys
+        self._results = results
+        self._parses = {key: self._parses.get(key) for key in keys}
+
+        doc = self._doc(keys)
+        spans = []
+        for i, (spans_i, collocs_i) in enumerate(results):
+            for start, end, label in spans_i:
+                span = doc.char_span(segments[i][0] + start, segments[i][0] + end, label=label)
+                if span is not None:
+                    spans.append(span)
+            for idx, colloc in collocs_i.items():
+                doc[token_starts[i] + idx]._.colloc = colloc
+        doc._.collocs = spans
+        self.doc = doc
+
+        return doc
+
+
+    def __call__(self, text):
+        """
+        Finds the collocations of the new version of the text and returns them
+        as the Collocater object does for strings.
+        """
+
+        doc = self.update(text)
+        found_colls_dict = {}
+        for span in doc._.collocs:
+            found_colls_dict[span.text] = {'coll_type': span.label_, 'location': [span.start, span.end]}
+
+        return found_colls_dict
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Counting the collocations of whole corpora, by headword, type of collocation and collocate,
+along with the number of documents they're found in, incrementally and in bounded memory,
+in partial counts that can be merged, such as those of the workers of a pool of processes.
+
+"""
+
+import hashlib
+import heapq
+from collections import Counter
+
+import numpy
+import pandas as pd
+
+from collocater.results import _collocations
+
+
+TABLE_COLUMNS = ['headword', 'pos', 'coll_type', 'collocate', 'count', 'doc_freq']
+
+
+
+def collocate(collocation, headword, forms=None):
+    """
+    Function to work out the collocate of a collocation, which is made of its words,
+    lowercased, other than the headword.
+
+    Parameters:
+        collocation (str): The collocation, such as 'bunch of beautiful flowers'.
+        headword (str): The headword it's a collocation of, such as 'flower',
+            whose words are separated by underscores.
+        forms (regex.Pattern): Optional pattern matching the inflected forms of the headword
+            as whole words, such as the one the Collocater object finds it with, without which
+            only the words that are the headword itself are left out.
+
+    Returns:
+        collocate (str): The collocate, such as 'bunch of beautiful'.
+    """
+
+    if forms is not None:
+        rest = forms.sub(' ', collocation).lower().split()
+    else:
+        parts = headword.lower().split('_')
+        rest = [w for w in collocation.lower().split() if w not in parts]
+
+    return ' '.join(rest) if rest else collocation.lower()
+
+
+
+class CountMinSketch():
+    """
+    Count-min sketch estimating the counts of any number of keys in a fixed amount of memory,
+    never below their true counts. Sketches of the same width and depth can be merged.
+
+    Parameters:
+        width (int): The number of counters of each row, which bounds the error of the estimates
+            to about e / width of the total count, with a probability of 1 - exp(-depth).
+        depth (int): The number of rows, each indexed by a different hash of the keys.
+            The table takes 8 * width * depth bytes, 2 MB by default.
+    """
+
+    def __init__(self, width=2**16, depth=4):
+
+        self.width = width
+        self.depth = depth
+        self.table = numpy.zeros((depth, width), dtype=numpy.int64)
+        self.total = 0
+
+
+    def _indices(self, key):
+
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8 * self.depth).digest()
+        return numpy.frombuffer(digest, dtype=numpy.uint64) % numpy.uint64(self.width)
+
+
+    def add(self, key, count=1):
+
+        self.table[numpy.arange(self.depth), self._indices(key)] += count
+        self.total += count
+
+
+    def __getitem__(self, key):
+
+        return int(self.table[numpy.arange(self.depth), self._indices(key)].min())
+
+
+    def merge(self, other):
+        """
+        Adds the counts of another sketch of the same width and depth.
+        """
+
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Only count-min sketches of the same width and depth can be merged")
+        self.table += other.table
+        self.total += other.total
+
+        return self
+
+
+
+class CollocationStats():
+    """
+    Counts of the collocations of a corpus by headword, part of speech, type of collocation
+    and collocate, and the number of documents each is found in.
+
+    The counts are exact while the number of distinct keys stays within max_keys. Past it,
+    the least frequent half of them are dropped, and their counts are kept in the count-min sketch,
+    when there's one, which the counts of the keys are then estimated with, so that the rare keys
+    of the long tail take no memory. Without a sketch, the counts of the keys dropped are lost.
+    The sketch is only allocated the first time keys are dropped, so that partial counts
+    that never reach max_keys, such as those of the chunks of a corpus, don't carry it.
+
+    Parameters:
+        max_keys (int): The maximum number of keys counted exactly, or None for no limit.
+        sketch_width (int): The width of the count-min sketch for the keys dropped,
+            or None for no sketch.
+        sketch_depth (int): The depth of the count-min sketch.
+    """
+
+    def __init__(self, max_keys=None, sketch_width=None, sketch_depth=4):
+
+        self.max_keys = max_keys
+        self.counts = Counter()
+        self.doc_freqs = Counter()
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
+        self.sketch = None
+        self.n_docs = 0
+        self.n_collocations = 0
+        # Occurrences of the keys dropped from the exact counts.
+        self.dropped = 0
+
+
+    def __len__(self):
+
+        return len(self.counts)
+
+
+    def add(self, collocations, forms=None):
+        """
+        Counts the collocations found in a document.
+
+        Parameters:
+            collocations: A Doc the collocations were added to, its spans, the records
+                yielded by Collocater.stream, or the dictionary returned by the Collocater object
+                for strings, which keeps only one occurrence of each string.
+            forms (callable): Optional function returning the pattern matching the inflected forms
+                of a headword, given the headword and its part of speech, for the collocates
+                to be told apart from them.
+
+        Returns:
+            stats (CollocationStats): The stats themselves.
+        """
+
+        keys = Counter()
+        for string, *_, labels in _collocations(collocations):
+            for label in labels:
+                word_type, _, coll_type = label.partition('__')
+                headword = word_type.rsplit('_', 1)[0]
+                pos = word_type.split('_')[-1]
+                word_re = forms(headword, pos) if forms is not None else None
+                keys[(headword, pos, coll_type, collocate(string, headword, word_re))] += 1
+
+        self.counts.update(keys)
+        self.doc_freqs.update(keys.keys())
+        self.n_docs += 1
+        self.n_collocations += sum(keys.values())
+        self._prune()
+
+        return self
+
+
+    def update(self, results, forms=None):
+        """
+        Counts the collocations of many documents, such as the ones yielded
+        by Collocater.pipe, in tuples with their contexts or on their own.
+
+        Returns:
+            stats (CollocationStats): The stats themselves.
+        """
+
+        for result in results:
+            self.add(result[0] if isinstance(result, tuple) else result, forms)
+
+        return self
+
+
+    def merge(self, other):
+        """
+        Adds the counts of other stats, such as the partial counts of another worker.
+
+        Returns:
+            stats (CollocationStats): The stats themselves.
+        """
+
+        self.counts.update(other.counts)
+        self.doc_freqs.update(other.doc_freqs)
+        self.n_docs += other.n_docs
+        self.n_collocations += other.n_collocations
+        self.dropped += other.dropped
+        if other.sketch is not None:
+            if self.sketch is None:
+                self.sketch = CountMinSketch(other.sketch.width, other.sketch.depth)
+            self.sketch.merge(other.sketch)
+        self._prune()
+
+        return self
+
+
+    def _prune(self):
+        """
+        Drops the least frequent half of the keys once there are more than max_keys,
+        adding their counts to the sketch.
+        """
+
+        if self.max_keys is None or len(self.counts) <= self.max_keys:
+            return
+
+        kept = heapq.nlargest(self.max_keys // 2, self.counts.items(), key=lambda x: x[1])
+        kept = dict(kept)
+        if self.sketch is None and self.sketch_width:
+            self.sketch = CountMinSketch(self.sketch_width, self.sketch_depth)
+        for key, count in self.counts.items():
+            if key not in kept:
+                self.dropped += count
+                if self.sketch is not None:
+                    name = '\x1f'.join(key)
+                    self.sketch.add('n\x1f' + name, count)
+                    self.sketch.add('d\x1f' + name, self.doc_freqs.get(key))
+
+        self.counts = Counter(kept)
+        self.doc_freqs = Counter({key: self.doc_freqs.get(key) for key in kept})
+
+
+    def get(self, headword, pos, coll_type, collocate):
+        """
+        Returns the count of a collocation and the number of documents it's found in,
+        which are estimated, never below the true ones, when it was dropped from the exact counts.
+        """
+
+        key = (headword, pos, coll_type, collocate)
+        count, doc_freq = self.counts.get(key, 0), self.doc_freqs.get(key, 0)
+        if self.sketch is not None and self.dropped:
+            name = '\x1f'.join(key)
+            count += self.sketch['n\x1f' + name]
+            doc_freq += self.sketch['d\x1f' + name]
+
+        return count, min(doc_freq, self.n_docs)
+
+
+    def most_common(self, n=None):
+        """
+        Returns the keys counted exactly, with their counts and document frequencies, by their counts.
+        """
+
+        return [(key, count, self.doc_freqs.get(key)) for key, count in self.counts.most_common(n)]
+
+
+    def to_pandas(self, min_count=1):
+        """
+        Returns the table of the collocations counted exactly at least min_count times, by their counts,
+        with the headwords, parts of speech and types of collocation as categories.
+        """
+
+        rows = [(*key, count, doc_freq) for key, count, doc_freq in self.most_common() if count >= min_count]
+        table = pd.DataFrame(rows, columns=TABLE_COLUMNS)
+        for column in ['headword', 'pos', 'coll_type']:
+            table[column] = table[column].astype('category')
+
+        return table
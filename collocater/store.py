@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk store of the collocations dictionary, indexed by headword, for the
+Collocater objects to read only the entries of the words they come across
+instead of holding the whole dictionary in memory.
+
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+import joblib
+
+from collocater.cache import LRUCache
+
+
+# Version of the layout of the store's database.
+STORE_VERSION = 1
+
+
+
+class DictionaryStore(MutableMapping):
+    """
+    Dict-like, read-through facade of a collocations dictionary stored in SQLite,
+    with one row per headword holding its entry serialized as JSON.
+
+    The entries read are kept in memory, so that each of them is only decoded once.
+    The database is memory-mapped, so that the pages read are shared by all the
+    processes working with the same file, and reopened in each process it is used in.
+
+    Parameters:
+        path (str): Path to the SQLite database.
+        read_only (bool): Whether the database should be opened in read-only mode,
+            in which case the entries added are only kept in memory.
+        cache_size (int): Maximum number of entries kept in memory. None means unbounded.
+    """
+
+    def __init__(self, path, read_only=True, cache_size=None):
+
+        self.path = path
+        self.read_only = read_only
+        self.cache_size = cache_size
+        self._entries = LRUCache(cache_size)
+        # Entries added while in read-only mode, and the number of times they changed.
+        self._added = {}
+        self._changes = 0
+        # Headwords of the database, read by headwords().
+        self._headwords = None
+        self._conn = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+        if not os.path.exists(path):
+            if read_only:
+                raise FileNotFoundError(f"No collocations dictionary store found at {path}")
+            self._create()
+
+
+    def __getstate__(self):
+        """
+        Leaves the database connection, the lock and the entries read out of the pickled store.
+        """
+        return {'path': self.path, 'read_only': self.read_only,
+                'cache_size': self.cache_size, '_added': self._added}
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._changes = 0
+        self._entries = LRUCache(self.cache_size)
+        self._headwords = None
+        self._conn = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+
+    def _create(self):
+
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS collocations (word TEXT PRIMARY KEY, entry TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(STORE_VERSION),))
+        conn.close()
+
+
+    def _connection(self):
+        """
+        Returns the connection to the database, which is opened in each process
+        the first time it is needed.
+        """
+
+        if self._conn is None or self._pid != os.getpid():
+            if self.read_only:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {max(os.path.getsize(self.path), 1 << 20)}")
+
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if not version or int(version[0]) != STORE_VERSION:
+                conn.close()
+                raise ValueError(f"The store's version ({version[0] if version else None}) doesn't match "
+                                 f"the one this version of Collocater works with ({STORE_VERSION})")
+
+            self._conn = conn
+            self._pid = os.getpid()
+
+        return self._conn
+
+
+    def _query(self, sql, params=()):
+
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+
+    def __getitem__(self, word):
+
+        if word in self._added:
+            return self._added.get(word)
+
+        with self._lock:
+            if word in self._entries:
+                return self._entries.get(word)
+            rows = self._query("SELECT entry FROM collocations WHERE word = ?", (word,))
+            if not rows:
+                raise KeyError(word)
+            entry = json.loads(rows[0][0])
+            self._entries.put(word, entry)
+
+        return entry
+
+
+    def _stored(self, word):
+
+        if self._headwords is not None:
+            return word in self._headwords
+
+        return bool(self._query("SELECT 1 FROM collocations WHERE word = ?", (word,)))
+
+
+    def headwords(self):
+        """
+        Returns the set of headwords stored in the database, which is read only once
+        and then used to tell which words are in the dictionary without querying it.
+        """
+
+        if self._headwords is None:
+            self._headwords = frozenset(word for (word,) in self._query("SELECT word FROM collocations"))
+
+        return self._headwords
+
+
+    def meta(self, key, default=None):
+        """
+        Returns the value of the metadata stored along with the dictionary under the key provided.
+        """
+
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+
+        return json.loads(rows[0][0]) if rows else default
+
+
+    def __contains__(self, word):
+
+        if word in self._added or word in self._entries:
+            return True
+
+        return self._stored(word)
+
+
+    def __setitem__(self, word, entry):
+
+        if self.read_only:
+            self._added[word] = entry
+            self._changes += 1
+            return
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO collocations VALUES (?, ?)", (word, json.dumps(entry)))
+            self._entries.put(word, entry)
+            self._headwords = None
+
+
+    def __delitem__(self, word):
+
+        if self.read_only:
+            if word not in self._added:
+                raise TypeError("Entries can't be deleted from a store opened in read-only mode")
+            del self._added[word]
+            self._changes += 1
+            return
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                deleted = conn.execute("DELETE FROM collocations WHERE word = ?", (word,)).rowcount
+            self._entries.pop(word)
+            self._headwords = None
+            if not deleted:
+                raise KeyError(word)
+
+
+    def __iter__(self):
+
+        for (word,) in self._query("SELECT word FROM collocations ORDER BY rowid"):
+            if word not in self._added:
+                yield word
+        yield from list(self._added)
+
+
+    def __len__(self):
+
+        count = self._query("SELECT COUNT(*) FROM collocations")[0][0]
+        return count + sum(1 for word in self._added if not self._stored(word))
+
+
+    def items(self):
+        """
+        Yields the headwords and entries of the whole dictionary, reading them
+        in a single pass without keeping them in memory.
+        """
+
+        with self._lock:
+            cursor = self._connection().execute("SELECT word, entry FROM collocations ORDER BY rowid")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(256)
+            if not rows:
+                break
+            for word, entry in rows:
+                if word not in self._added:
+                    yield word, json.loads(entry)
+        yield from list(self._added.items())
+
+
+    def close(self):
+        """
+        Closes the connection to the database of the current process.
+        """
+
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+
+def convert_dictionary(source, path, overwrite=False):
+    """
+    Converts a collocations dictionary stored with joblib, either on its own or
+    as part of a pickled Collocater object, into an SQLite store. The settings
+    of the object are stored along with it, for it to be loaded lazily from the store.
+
+    Parameters:
+        source (str): Path to the joblib file, such as collocations_dict.joblib
+            or collocater_obj.joblib.
+        path (str): Path of the SQLite database to be written.
+        overwrite (bool): Whether an already existing database should be replaced.
+
+    Returns:
+        store (DictionaryStore): The new store, opened in read-only mode.
+    """
+
+    with open(source, 'rb') as fh:
+        obj = joblib.load(fh)
+
+    if isinstance(obj, dict):
+        collocations_dictionary = obj
+        meta = None
+    else:
+        collocations_dictionary = obj.collocations_dictionary
+        meta = {'settings': obj.settings()}
+
+    if os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(f"{path} already exists")
+        os.remove(path)
+
+    return write_dictionary(collocations_dictionary, path, meta)
+
+
+
+def write_dictionary(collocations_dictionary, path, meta=None):
+    """
+    Writes a collocations dictionary into a new SQLite store, along with
+    the JSON serializable metadata provided.
+    """
+
+    store = DictionaryStore(path, read_only=False)
+    conn = store._connection()
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO collocations VALUES (?, ?)",
+                         ((word, json.dumps(entry)) for word, entry in collocations_dictionary.items()))
+        conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                         ((key, json.dumps(value)) for key, value in (meta or {}).items()))
+    conn.execute("VACUUM")
+    store.close()
+
+    return DictionaryStore(path)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retrieving the collocations of texts too long to be parsed as a single Doc,
+in chunks of whole sentences overlapping by as many words as the collocations
+found in them can span, so that only one chunk is held in memory at a time.
+
+"""
+
+import regex
+
+
+# Number of characters of the chunks the texts are parsed in.
+CHUNK_SIZE = 100000
+# Number of words the chunks overlap by when the span of the patterns is unbounded.
+MAX_OVERLAP = 64
+
+# Ends of sentences, along with the whitespace following them.
+_sentence_end = regex.compile(r'[.!?]+["\'\)\]’”]*\s+')
+_space = regex.compile(r'\s+')
+_word = regex.compile(r'\S+')
+
+
+
+def _pieces(source, size):
+    """
+    Yields the text in pieces, reading them from the iterable of strings,
+    such as an open file, when it isn't a string.
+    """
+
+    if isinstance(source, str):
+        for i in range(0, len(source), size):
+            yield source[i:i+size]
+    else:
+        yield from source
+
+
+
+def _cut(text, limit):
+    """
+    Returns the position following the last sentence of the text that ends within the limit,
+    or its last whitespace within it when no sentence ends there.
+    """
+
+    end = None
+    for match in _sentence_end.finditer(text, 0, limit):
+        end = match.end()
+    if end is None:
+        for match in _space.finditer(text, 0, limit):
+            end = match.end()
+
+    return end or limit
+
+
+
+def _overlap_start(text, end, words):
+    """
+    Returns the start of the sentence the chunk following the one ending at the position
+    provided should start at, for it to overlap the chunk by at least the number of words provided.
+    The overlap starts within its first sentence when its sentences make up more than half the chunk.
+    """
+
+    starts = [match.start() for match in _word.finditer(text, 0, end)]
+    if not words or len(starts) <= words:
+        return end
+    position = starts[-words]
+
+    start = 0
+    for match in _sentence_end.finditer(text, 0, position + 1):
+        start = match.end()
+    if start == 0 or end - start > end // 2:
+        start = position
+
+    return start
+
+
+
+def _overlap_words(collie, doc):
+    """
+    Works out the number of words the chunk following the one parsed in the Doc should overlap it by,
+    which is the longest span of the patterns of the words in it.
+    """
+
+    spans = [0]
+    for lemma, morpho in set(combi[1:] for combi in collie._lookups(doc).values()):
+        collocations = collie.collocations_dictionary.get(lemma)
+        if collocations and collocations.get(morpho):
+            span = collie._max_pattern_span(lemma, morpho, collocations)
+            spans.append(MAX_OVERLAP if span is None else span + 1)
+
+    return min(max(spans), MAX_OVERLAP)
+
+
+
+def _record(span, char_base, token_base):
+
+    return {'text': span.text,
+            'start_char': char_base + span.start_char, 'end_char': char_base + span.end_char,
+            'start': token_base + span.start, 'end': token_base + span.end,
+            'coll_type': span.label_.split(' / ')}
+
+
+
+def stream_collocations(collie, source, chunk_size=CHUNK_SIZE, overlap=None):
+    """
+    Function to find the collocations of a text of any length in chunks of whole sentences,
+    parsed one at a time, yielding them as soon as the chunk they start in is processed.
+
+    Each chunk overlaps the previous one by the sentences covering the words the collocations
+    can span, so that the collocations starting before the overlap end before the cut between them,
+    and are yielded for the first chunk, whereas the ones starting in the overlap are yielded
+    for the second one, where they're found along with the words following them.
+
+    Parameters:
+        collie (Collocater): The object the collocations are found with.
+        source (str/iterable): The text, or an iterable of its pieces, such as an open file.
+        chunk_size (int): Maximum number of characters of each chunk, which must not be
+            greater than the max_length of the object's Spacy pipeline.
+        overlap (int): Number of words the chunks should overlap by, which defaults
+            to the longest span of the patterns of the words of each chunk.
+
+    Yields:
+        collocation (dict): The string of each collocation found, its character offsets and the
+            positions of its first and last tokens in the whole text, and its types.
+    """
+
+    nlp = collie.get_nlp()
+    pieces = _pieces(source, chunk_size)
+    buffer = ''
+    exhausted = False
+    # Offsets of the buffer's first character and token in the whole text.
+    char_base = 0
+    token_base = 0
+
+    while True:
+        read = [buffer]
+        size = len(buffer)
+        while not exhausted and size <= chunk_size:
+            piece = next(pieces, None)
+            if piece is None:
+                exhausted = True
+            else:
+                read.append(piece)
+                size += len(piece)
+        buffer = ''.join(read)
+
+        last = exhausted and len(buffer) <= chunk_size
+        end = len(buffer) if last else _cut(buffer, chunk_size)
+        doc = nlp(buffer[:end])
+        collie._annotate(doc)
+
+        if last:
+            start = end
+        else:
+            words = overlap if overlap is not None else _overlap_words(collie, doc)
+            start = _overlap_start(buffer, end, words)
+
+        for span in doc._.collocs:
+            if span.start_char < start:
+                yield _record(span, char_base, token_base)
+
+        if last:
+            return
+
+        token_base += sum(1 for token in doc if token.idx < start)
+        char_base += start
+        buffer = buffer[start:]
@@ -20,6 +20,7 @@ setup(
     keywords = "Collocations Finder",
     url = "https://github.com/rtapiaoregui/collocater",
     packages=['collocater'],
+    package_data={'collocater': ['data/*.joblib', 'data/*.sqlite', 'data/*.pkl.gz']},
     long_description=open(os.path.join(os.path.dirname(__file__), 'README.md')).read(),
     install_requires=[
             'beautifulsoup4>=4.6.3',
@@ -33,4 +34,5 @@ setup(
     setup_requires=['pytest-runner'],
     tests_require=['pytest', 'spacy'],
     include_package_data=True,
+    entry_points={'console_scripts': ['collocater=collocater.__main__:main']},
     )
@@ -6,10 +6,28 @@ Created on Fri Feb 21 10:21:27 2020
 @author: rita
 """
 
-import pytest, os
+import pytest, os, json
 import regex
-from collocater.collocater import Collocater, store_collocs_in_df
+from collocater.collocater import Collocater, store_collocs_in_df, collocations_linker
+from collocater.batch import corpus_stats, run_batch
+from collocater.__main__ import main
+from collocater.literals import LiteralMatcher
+from collocater.prefilter import required_words
+from collocater.store import DictionaryStore, convert_dictionary
+from collocater.archive import PageArchive
+from collocater.cleaning import cleaning_rules
+from collocater.cache import LRUCache, SQLiteCache
+from collocater.rebuild import rebuild_dictionary
+from collocater.highlight import highlight, write_highlighted
+from collocater.results import CollocationTable, arrow_schema, write_parquet
+from collocater.stats import CollocationStats, collocate
+import joblib, pickle, threading
+import collocater
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 import spacy
+import pandas as pd
 
 
 
@@ -115,6 +133,29 @@ def test_collocater_out(test_datafinder, test_loader):
     return output
 
 
+@pytest.fixture
+def test_tagged(test_loader):
+    
+    # Without the Spacy model, the nouns of the examples are tagged by hand.
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions,
+                        collocations_dictionary=dict(test_loader.collocations_dictionary),
+                        spacy_model='not_a_model')
+    
+    lemmas = {'flowers': 'flower', 'eyes': 'eye', 'bridge': 'bridge'}
+    parsed = []
+    def tagger(doc):
+        parsed.append(doc.text)
+        for token in doc:
+            if token.orth_ in lemmas:
+                token.lemma_, token.pos_ = lemmas.get(token.orth_), 'NOUN'
+        return doc
+    nlp = spacy.blank('en')
+    nlp.add_pipe(tagger)
+    collie.set_nlp(nlp)
+    
+    return {'collie': collie, 'nlp': nlp, 'parsed': parsed}
+
+
 def test_collocater_obj(test_loader):
     
     assert isinstance(test_loader.irr_verbs, dict)
@@ -285,4 +326,771 @@ def test_store_in_df(test_collocater_out):
     assert 'start: 13; end: 17' in df.loc[:,['Positions of first and last token of collocation']].iloc[1].tolist()
     
         
-    
\ No newline at end of file
+    
+
+def test_shared_pipeline(test_loader, tmp_path):
+    
+    nlp = spacy.blank('en')
+    test_loader.set_nlp(nlp)
+    assert test_loader.get_nlp() is nlp
+    
+    path = os.path.join(tmp_path, 'tmp.joblib')
+    test_loader.saver(path)
+    
+    reloaded = Collocater.loader(path, nlp=nlp)
+    assert reloaded.get_nlp() is nlp
+    assert not '_nlp' in reloaded.__getstate__()
+
+
+def test_pattern_cache(test_datafinder, test_loader):
+    
+    word = test_datafinder.get('word')
+    text = test_datafinder.get('examples').get(word)
+    
+    test_loader.clear_pattern_cache()
+    first = test_loader.collocations_identifier(word, 'noun', text)
+    second = test_loader.collocations_identifier(word, 'noun', text)
+    
+    assert first == second
+    info = test_loader.pattern_cache_info()
+    assert info.get('misses') == 1 and info.get('hits') == 1
+    
+    test_loader._pattern_cache.maxsize = 1
+    test_loader.collocations_identifier(word, 'verb', text)
+    assert test_loader.pattern_cache_info().get('evictions') == 1
+    
+    # The patterns of the words whose entries are extracted again are built again.
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, collocations_dictionary={})
+    collie._collocations_from_page('quill', PAGE)
+    assert collie.collocations_identifier('quill', 'noun', 'A sharp quill.') == {'adj': ['sharp quill']}
+    collie._collocations_from_page('quill', PAGE.replace('sharp', 'long'))
+    assert collie.collocations_identifier('quill', 'noun', 'A sharp quill.') == {}
+    assert collie.collocations_identifier('quill', 'noun', 'A long quill.') == {'adj': ['long quill']}
+    
+    collie.collocations_dictionary['quill'] = test_loader.collocations_dictionary.get('eye')
+    collie.dictionary_version(refresh=True)
+    assert collie.collocations_identifier('quill', 'noun', 'A long quill.') == {}
+
+
+def test_pattern_bank(test_datafinder, test_loader, tmp_path, monkeypatch):
+    
+    word = test_datafinder.get('word')
+    text = test_datafinder.get('examples').get(word)
+    expected = test_loader.collocations_identifier(word, 'noun', text)
+    
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+                        collocations_dictionary={word: test_loader.collocations_dictionary.get(word)})
+    path = os.path.join(tmp_path, 'bank.sqlite')
+    bank = collie.build_pattern_bank(path)
+    assert f'noun:{word}' in bank
+    
+    collie.load_pattern_bank(path)
+    with monkeypatch.context() as m:
+        m.setattr(collie, '_pattern_sources', lambda *args: pytest.fail('patterns rebuilt'))
+        assert collie.collocations_identifier(word, 'noun', text) == expected
+    
+    # The patterns of an entry that changed since the bank was built are built again.
+    collie._collocations_from_page(word, PAGE.replace('quill', word).replace('QUILL', word.upper()))
+    assert collie.collocations_identifier(word, 'noun', 'A sharp eye.') == {'adj': ['sharp eye']}
+    
+    shipped = Collocater.loader(pattern_bank=True)
+    assert shipped.collocations_identifier(word, 'noun', text) == expected
+
+
+def test_max_span():
+    
+    assert Collocater._max_span(r'x\sy') == 1
+    assert Collocater._max_span(r'((?:[\W_]|^)(x(\s[\w]+){0,3}\sy)(?:[\W_]|$))') == 6
+    assert Collocater._max_span(r'x\ (y|z\ w)') == 2
+    assert Collocater._max_span(r'(?!(?:(in|on)\s))x') == 0
+    assert Collocater._max_span(r'x(\s\w+)*') is None
+    
+    
+def test_windowed_matching(test_datafinder, test_loader):
+    
+    text = ' '.join(test_datafinder.get('examples').values())
+    full_scan = test_loader(text)
+    
+    test_loader.matching = 'window'
+    assert test_loader(text) == full_scan
+
+
+def test_pipe(test_datafinder, test_loader):
+    
+    ids = list(test_datafinder.get('examples').keys())
+    texts = list(test_datafinder.get('examples').values())
+    expected = [test_loader(text) for text in texts]
+    
+    assert list(test_loader.pipe(texts, batch_size=4)) == expected
+    
+    outputs = list(test_loader.pipe(zip(texts, ids), batch_size=4, as_tuples=True))
+    assert [context for _, context in outputs] == ids
+    assert [found for found, _ in outputs] == expected
+    
+    with pytest.raises(ValueError):
+        list(test_loader.pipe([None]))
+
+
+
+def test_batch(test_datafinder, test_loader, tmp_path):
+    
+    nlp_path = os.path.join(tmp_path, 'blank_model')
+    spacy.blank('en').to_disk(nlp_path)
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, spacy_model=nlp_path)
+    obj_path = os.path.join(tmp_path, 'collie.joblib')
+    collie.saver(obj_path)
+    
+    examples = test_datafinder.get('examples')
+    corpus = os.path.join(tmp_path, 'corpus.jsonl')
+    with open(corpus, 'w') as fh:
+        for key, text in examples.items():
+            fh.write(json.dumps({'id': key, 'text': text}) + '\n')
+    
+    output = os.path.join(tmp_path, 'output.jsonl')
+    assert run_batch(corpus, output, obj_path=obj_path, processes=2) == len(examples)
+    with open(output) as fh:
+        lines = fh.read().splitlines()
+    assert [json.loads(line).get('id') for line in lines] == list(examples.keys())
+    
+    with open(output, 'w') as fh:
+        fh.write('\n'.join(lines[:3]) + '\n' + lines[3][:10])
+    assert run_batch(corpus, output, obj_path=obj_path, processes=1, resume=True) == len(examples) - 3
+    with open(output) as fh:
+        assert fh.read().splitlines() == lines
+    
+    # A record without a text stops the batch with the number of its line, before any worker parses it.
+    with open(corpus, 'a') as fh:
+        fh.write(json.dumps({'id': 'empty', 'body': 'no text'}) + '\n')
+    with pytest.raises(ValueError, match=f"Line {len(examples) + 1} of"):
+        run_batch(corpus, os.path.join(tmp_path, 'broken.jsonl'), obj_path=obj_path, processes=2)
+
+
+def test_doc_input_without_model(test_datafinder, test_loader):
+    
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+                        collocations_dictionary=test_loader.collocations_dictionary,
+                        spacy_model='not_a_model')
+    
+    doc = spacy.blank('en')(test_datafinder.get('examples').get('flower'))
+    for token in doc:
+        if token.orth_ == 'flowers':
+            token.lemma_, token.pos_ = 'flower', 'NOUN'
+    
+    assert collie(doc) is doc
+    colls = [(col.text, col.start_char, col.end_char, col.label_) for col in doc._.collocs]
+    assert ('beautiful flowers', 25, 42, 'flower_noun__adj') in colls
+    assert ('bunch of beautiful flowers', 16, 42, 'flower_noun__quant') in colls
+    
+    
+def test_matcher_engine(test_datafinder, test_loader):
+
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions,
+                        collocations_dictionary=test_loader.collocations_dictionary,
+                        spacy_model='not_a_model', engine='matcher')
+
+    text = test_datafinder.get('examples').get('flower') + " She kept them under her watchful eyes."
+    doc = spacy.blank('en')(text)
+    for token in doc:
+        if token.orth_ == 'flowers':
+            token.lemma_, token.pos_ = 'flower', 'NOUN'
+        if token.orth_ == 'eyes':
+            token.lemma_, token.pos_ = 'eye', 'NOUN'
+
+    colls = [(col.text, col.start_char, col.end_char, col.label_) for col in collie(doc)._.collocs]
+    assert ('beautiful flowers', 25, 42, 'flower_noun__adj') in colls
+    assert ('bunch of beautiful flowers', 16, 42, 'flower_noun__quant') in colls
+    # The collocations of the dictionary are matched by the headword's lemma, whatever its inflection.
+    assert any(col[0] == 'under her watchful eyes' and 'eye_noun__prep' in col[3] for col in colls)
+
+    collie.engine = 'regex'
+    regex_colls = [(col.text, col.start_char, col.end_char, col.label_) for col in collie(doc)._.collocs]
+    assert set(regex_colls) < set(colls)
+
+
+def test_threaded_calls(test_datafinder, test_loader):
+
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions,
+                        collocations_dictionary=test_loader.collocations_dictionary,
+                        spacy_model='not_a_model', pattern_cache_size=2)
+    tags_dict = dict(collie.tags_dict)
+
+    nlp = spacy.blank('en')
+    texts = [test_datafinder.get('examples').get('flower'), "She kept them under her watchful eyes.",
+             "The river ran through the town and the rivers met there."]
+    lemmas = {'flowers': 'flower', 'eyes': 'eye', 'river': 'river', 'rivers': 'river', 'town': 'town'}
+
+    def parse(text):
+        doc = nlp(text)
+        for token in doc:
+            if token.orth_ in lemmas:
+                token.lemma_, token.pos_ = lemmas.get(token.orth_), 'NOUN'
+        return doc
+
+    for engine in ['regex', 'matcher']:
+        collie.engine = engine
+        collie.clear_pattern_cache()
+        expected = [collie._annotate(parse(text)) for text in texts]
+        collie.clear_pattern_cache()
+        # The threads share the object and its caches, which is small enough for them to evict each other's patterns.
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda text: collie._annotate(parse(text)), texts * 20))
+        assert results == expected * 20
+
+    assert collie.tags_dict == tags_dict
+    assert not hasattr(collie, 'collocations_types')
+
+
+def test_stream(test_datafinder, test_tagged, tmp_path):
+
+    collie, nlp = test_tagged.get('collie'), test_tagged.get('nlp')
+
+    sentences = [test_datafinder.get('examples').get('flower'), "She kept them under her watchful eyes.",
+                 "The road goes under the old railway bridge.", "Nothing to see here, really"]
+    text = '\n'.join(' '.join(sentences[(i + j) % 4] for j in range(i % 4 + 1)) for i in range(40))
+
+    doc = collie(nlp(text))
+    expected = [{'text': span.text, 'start_char': span.start_char, 'end_char': span.end_char,
+                 'start': span.start, 'end': span.end, 'coll_type': span.label_.split(' / ')} for span in doc._.collocs]
+    assert len(expected) > 40
+
+    assert list(collie.stream(text, chunk_size=300)) == expected
+    assert list(collie.stream(text, chunk_size=10**6)) == expected
+
+    path = tmp_path / 'book.txt'
+    path.write_text(text)
+    with open(path) as fh:
+        assert list(collie.stream(fh, chunk_size=500)) == expected
+
+    # Without sentence ends, the chunks are cut between words, and overlap by as many as the collocations span.
+    text = regex.sub(r'[.!]', '', text)
+    expected = [(span.start_char, span.end_char, span.start, span.end) for span in collie(nlp(text))._.collocs]
+    streamed = [(c.get('start_char'), c.get('end_char'), c.get('start'), c.get('end')) for c in collie.stream(text, chunk_size=300)]
+    assert set(streamed) <= set(expected) and len(streamed) >= len(expected) - 1
+
+
+def test_edit_session(test_datafinder, test_tagged):
+
+    collie, nlp = test_tagged.get('collie'), test_tagged.get('nlp')
+    parsed = test_tagged.get('parsed')
+
+    sentences = [test_datafinder.get('examples').get('flower'), "She kept them under her watchful eyes.",
+                 "The road goes under the old railway bridge.", "Nothing to see here, really."]
+    text = ' '.join(f"{sentences[i % 4]} Sentence number {i}." for i in range(30))
+    def colls(doc):
+        return [(col.text, col.start_char, col.end_char, col.start, col.end, col.label_) for col in doc._.collocs]
+
+    session = collie.session()
+    doc = session.update(text)
+    assert doc.text == text
+    assert colls(doc) == colls(collie(nlp(text)))
+
+    for edited in [text.replace("old railway bridge", "new bridge", 1),
+                   text.replace("Sentence number 7.", "Beautiful flowers indeed. Sentence number 7."),
+                   text[:300] + text[700:]]:
+        parsed.clear()
+        doc = session.update(edited)
+        # Only the sentences of the new version that weren't in the previous one are parsed.
+        assert len(parsed) <= 1
+        assert doc.text == edited
+        assert colls(doc) == colls(collie(nlp(edited)))
+        assert [t.i for t in doc if t._.colloc] == [t.i for t in collie(nlp(edited)) if t._.colloc]
+        text = edited
+
+    assert session(text) == collie._annotate(nlp(text))
+
+
+def test_result_cache(test_datafinder, test_tagged, tmp_path):
+
+    collie, nlp = test_tagged.get('collie'), test_tagged.get('nlp')
+    parsed = test_tagged.get('parsed')
+    text = test_datafinder.get('examples').get('flower')
+    entry = collie.collocations_dictionary['flower']
+    expected = collie(text)
+    assert 'beautiful flowers' in expected
+
+    for cache in [LRUCache(2), SQLiteCache(str(tmp_path / 'results.sqlite'), maxsize=2)]:
+        collie.result_cache = cache
+        parsed.clear()
+        assert collie(text) == expected and collie(text) == expected
+        assert list(collie.pipe([text, 'Some other flowers.', text])) == [expected, collie('Some other flowers.'), expected]
+        assert parsed == [text, 'Some other flowers.']
+        assert cache.info().get('hits') == 4
+
+        # The results of other settings or versions of the dictionary are stored apart.
+        collie.chosen_collocation_types = ['quant']
+        assert list(collie(text)) == ['bunch of beautiful flowers']
+        collie.chosen_collocation_types = None
+        collie.collocations_dictionary['flower'] = None
+        collie.dictionary_version(refresh=True)
+        assert collie(text) == {}
+        assert len(cache) == 2 and cache.info().get('evictions') == 2
+        collie.collocations_dictionary['flower'] = entry
+        collie.dictionary_version(refresh=True)
+
+    # The results stored on disk are shared by the objects working with the same settings and dictionary.
+    assert collie(text) == expected
+    other = pickle.loads(pickle.dumps(collie))
+    assert other.result_cache is None
+    other.result_cache = SQLiteCache(str(tmp_path / 'results.sqlite'))
+    other.set_nlp(nlp)
+    assert other(text) == expected and other.result_cache.info().get('hits') == 1
+    # Those of another pipeline aren't, even under the same model's name.
+    other.set_nlp(spacy.blank('en'))
+    assert other(text) != expected and other.result_cache.info().get('hits') == 1
+
+    # The least recently used entries are evicted first, and writing an entry again evicts no other.
+    for cache in [LRUCache(2), SQLiteCache(str(tmp_path / 'lru.sqlite'), maxsize=2)]:
+        cache.put('a', '1')
+        cache.put('b', '2')
+        assert cache.get('a') == '1'
+        cache.put('c', '3')
+        cache.put('c', '4')
+        assert 'a' in cache and 'b' not in cache and cache.get('c') == '4'
+        assert len(cache) == 2 and cache.info().get('evictions') == 1
+        # Removing an entry is neither a hit nor a miss.
+        info = cache.info()
+        assert cache.pop('a') == '1' and cache.pop('a') is None and 'a' not in cache
+        assert cache.info() == dict(info, size=1)
+
+
+def test_highlight(test_tagged, tmp_path, monkeypatch):
+
+    collie, nlp = test_tagged.get('collie'), test_tagged.get('nlp')
+
+    text = "Some flowers <3 & then a bunch of beautiful flowers, not just flowers."
+    doc = collie(nlp(text))
+    html = highlight(doc)
+    # The overlapping collocations are highlighted as one, and the rest of the text is escaped.
+    assert html.count('<span') == 1
+    assert html.startswith('Some flowers &lt;3 &amp; then a <span style="background-color: rgb(255, 158, 0, 0.4)" title="')
+    assert html.endswith('">bunch of beautiful flowers</span>, not just flowers.')
+    assert 'flower_noun__quant' in html and 'flower_noun__adj' in html
+
+    assert collocations_linker(text, collie(text)) == html
+    assert highlight(text, list(collie.stream(text))) == html
+
+    # Along with the Doc, the token offsets of the dictionary are read from its tokens, without tokenizing the text again.
+    found = collie(text)
+    monkeypatch.setattr(collocater.highlight, '_tokenizer', None)
+    monkeypatch.setattr(spacy, 'blank', lambda lang: pytest.fail("The text was tokenized again"))
+    assert highlight(doc, found) == html
+    monkeypatch.undo()
+
+    path = tmp_path / 'highlighted.html'
+    with open(path, 'w') as fh:
+        write_highlighted(fh, iter(text[i:i+7] for i in range(0, len(text), 7)), collie.stream(text), color='yellow')
+    assert path.read_text() == highlight(doc, color='yellow')
+
+
+def test_collocation_table(test_tagged, tmp_path):
+
+    collie, nlp = test_tagged.get('collie'), test_tagged.get('nlp')
+
+    texts = ["If this isn't a bunch of beautiful flowers I don't know what is!", "No flowers here.",
+             "Fresh flowers and a bunch of flowers."]
+    table = CollocationTable().extend(collie.pipe(((text, i) for i, text in enumerate(texts)), as_tuples=True))
+    df = table.to_pandas()
+    assert df.columns.tolist() == ['doc_id', 'collocation', 'headword', 'pos', 'coll_type',
+                                   'start', 'end', 'start_char', 'end_char']
+    assert set(df.doc_id) == {0, 2} and (df.start_char == -1).all()
+    row = df[(df.doc_id == 0) & (df.coll_type == 'quant')].iloc[0]
+    assert (row.collocation, row.headword, row.pos, row.start, row.end) == ('bunch of beautiful flowers', 'flower', 'noun', 5, 9)
+
+    # The Docs and the records of stream give the character offsets too.
+    docs = CollocationTable().add(collie(nlp(texts[0])), 'doc').to_pandas()
+    assert docs.drop(columns=['start_char', 'end_char']).equals(df[df.doc_id == 0].assign(doc_id='doc').drop(columns=['start_char', 'end_char']))
+    assert docs.start_char[0] == texts[0].index('bunch') and (docs.end_char > docs.start_char).all()
+    assert CollocationTable().add(list(collie.stream(texts[0])), 'doc').to_pandas().equals(docs)
+
+    found = collie(texts[2])
+    readable = store_collocs_in_df(found)
+    assert readable.equals(CollocationTable().add(found).readable())
+    assert readable.columns.tolist() == ['Morphology of word with collocation', 'Type of collocation',
+                                         'Positions of first and last token of collocation']
+    assert readable.loc['Fresh flowers'].tolist() == ['flower (noun)', 'Adjective', 'start: 1; end: 2']
+
+
+
+def test_write_parquet(test_tagged, tmp_path):
+
+    pytest.importorskip('pyarrow')
+    collie = test_tagged.get('collie')
+
+    texts = ["A bunch of beautiful flowers.", "Nothing to see here.", "Fresh flowers."] * 4
+    table = CollocationTable().extend(collie.pipe(((text, i) for i, text in enumerate(texts)), as_tuples=True))
+    assert len(table) > 5
+    path = str(tmp_path / 'collocations.parquet')
+    assert write_parquet(collie.pipe(((text, i) for i, text in enumerate(texts)), as_tuples=True), path, batch_size=5) == len(table)
+    written = pd.read_parquet(path)
+    assert written.drop(columns='doc_id').equals(table.to_pandas().drop(columns='doc_id'))
+    assert written.doc_id.tolist() == [str(doc_id) for doc_id in table.columns.get('doc_id')]
+
+    # The batches keep the same schema even when the first one has no collocations, or the ids change type.
+    import pyarrow.parquet as pq
+    results = [({}, None)] * 6 + [(collie(texts[0]), 1), (collie(texts[2]), 'two')]
+    assert write_parquet(iter(results), path, batch_size=1) == 3
+    assert pq.read_schema(path).equals(arrow_schema())
+    assert write_parquet(iter([]), path) == 0 and pq.read_table(path).num_rows == 0
+
+
+def test_collocate(test_tagged):
+
+    forms = test_tagged.get('collie')._headword_forms
+    assert collocate('bunch of beautiful flowers', 'flower', forms('flower', 'noun')) == 'bunch of beautiful'
+    # The headword is told apart by its inflected forms, irregular ones included, and not by its prefix.
+    assert collocate('ordinary lives', 'life', forms('life', 'noun')) == 'ordinary'
+    assert collocate('on their feet', 'foot', forms('foot', 'noun')) == 'on their'
+    assert collocate('young women', 'woman', forms('woman', 'noun')) == 'young'
+    assert collocate('artists of modern art', 'art', forms('art', 'noun')) == 'artists of modern'
+    assert collocate('artists of modern art', 'art') == 'artists of modern'
+
+
+def test_collocation_stats(test_datafinder, test_tagged, tmp_path, capsys):
+
+    collie, nlp = test_tagged.get('collie'), test_tagged.get('nlp')
+
+    sentences = [test_datafinder.get('examples').get('flower'), "She kept them under her watchful eyes.",
+                 "Fresh flowers and a bunch of flowers, and more fresh flowers.", "Nothing to see here."]
+    texts = [' '.join(sentences[j] for j in range(i % 4 + 1)) for i in range(20)]
+
+    stats = collie.collocation_stats(texts, batch_size=4)
+    assert stats.n_docs == 20 and len(stats) > 3
+    assert stats.get('flower', 'noun', 'adj', 'fresh') == (20, 10)
+    assert stats.n_collocations == sum(len(collie(nlp(text))._.collocs) for text in texts)
+
+    # Partial counts add up to the counts of the whole corpus.
+    halves = collie.collocation_stats(texts[:7]).merge(collie.collocation_stats(texts[7:]))
+    assert halves.most_common() == stats.most_common() and halves.n_docs == 20
+    table = halves.to_pandas()
+    assert table.columns.tolist() == ['headword', 'pos', 'coll_type', 'collocate', 'count', 'doc_freq']
+    assert table['count'].iloc[0] == table['count'].max() and table['count'].sum() == stats.n_collocations
+
+    # The sketch is only allocated once keys are dropped.
+    assert collie.collocation_stats(texts, max_keys=100, sketch_width=1024).sketch is None
+    # The counts of the keys dropped are estimated with the sketch, never below the true ones.
+    bounded = collie.collocation_stats(texts, max_keys=2, sketch_width=1024)
+    assert len(bounded) <= 2 and bounded.dropped > 0
+    for key, count, doc_freq in stats.most_common():
+        estimated = bounded.get(*key)
+        assert estimated[0] >= count and estimated[1] >= doc_freq
+    assert pickle.loads(pickle.dumps(bounded)).get('flower', 'noun', 'adj', 'fresh') == bounded.get('flower', 'noun', 'adj', 'fresh')
+
+    nlp_path = os.path.join(tmp_path, 'blank_model')
+    spacy.blank('en').to_disk(nlp_path)
+    collie.spacy_model = nlp_path
+    obj_path = os.path.join(tmp_path, 'collie.joblib')
+    collie.saver(obj_path)
+    corpus = os.path.join(tmp_path, 'corpus.jsonl')
+    with open(corpus, 'w') as fh:
+        for i, text in enumerate(texts):
+            fh.write(json.dumps({'id': i, 'text': text}) + '\n')
+    pooled = corpus_stats(corpus, obj_path=obj_path, processes=2, chunksize=3)
+    assert pooled.n_docs == 20
+    assert sorted(pooled.most_common()) == sorted(corpus_stats(corpus, obj_path=obj_path, processes=1).most_common())
+    table_path = os.path.join(tmp_path, 'counts.tsv')
+    main(['stats', corpus, table_path, '--obj', obj_path, '--processes', '1', '--matching', 'window'])
+    assert 'in 20 documents' in capsys.readouterr().out and os.path.exists(table_path)
+
+
+def test_literal_matcher(test_datafinder, test_loader):
+    
+    literal_matcher = LiteralMatcher()
+    literal_matcher.add('under my eye', ('eye', 'prep'))
+    literal_matcher.add('my eye', ('eye', 'phr'))
+    literal_matcher.build()
+    
+    hits = list(literal_matcher.iter_matches('Keep it Under my eye, or under my eyes.'))
+    assert hits == [(8, 20, [('eye', 'prep')]), (14, 20, [('eye', 'phr')])]
+    
+    # Building it again after adding more literals doesn't repeat the outputs of the failure links.
+    literal_matcher.add('eyes', ('eye', 'phr'))
+    literal_matcher.build()
+    assert list(literal_matcher.iter_matches('Keep it under my eye.')) == hits[:1] + [(14, 20, [('eye', 'phr')])]
+    rebuilt = LiteralMatcher()
+    rebuilt.add('a b', 1)
+    rebuilt.add('b', 2)
+    rebuilt.build()
+    rebuilt.add('c', 3)
+    assert list(rebuilt.iter_matches('a b')) == [(0, 3, [1]), (2, 3, [2])]
+    
+    word = test_datafinder.get('word')
+    text = test_datafinder.get('examples').get(word)
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+                        collocations_dictionary=test_loader.collocations_dictionary)
+    coll_matches = collie.collocations_identifier(word, 'noun', text)
+    
+    collie.build_literal_matcher()
+    assert len(collie.literal_matcher) > 0
+    assert collie.collocations_identifier(word, 'noun', text) == coll_matches
+    
+    
+def test_collocate_index(test_datafinder, test_loader, tmp_path):
+    
+    assert required_words(r'((?:[\W_]|^)((dark(er)?|red)\s(\w+\s)?eyes?)(?:[\W_]|$))', 
+                          lambda w: w in ['eye', 'eyes']) == {('word', 'dark'), ('word', 'darker'), ('word', 'red')}
+    assert required_words(r'x(\s\w+)*') == {('infix', 'x')}
+    assert required_words(r'\w+\s\w+') is None
+    
+    word = 'flower'
+    text = test_datafinder.get('examples').get(word)
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+                        collocations_dictionary={word: test_loader.collocations_dictionary.get(word)},
+                        spacy_model='not_a_model')
+    collie.build_collocate_index()
+    
+    candidates = collie._candidates(text, [(word, 'noun')])
+    assert {'adj', 'quant'} <= candidates.get((word, 'noun'))
+    assert candidates.get((word, 'noun')) < set(collie._compiled_patterns(word, 'noun', collie.collocate(word))[1])
+    
+    doc = spacy.blank('en')(text)
+    for token in doc:
+        if token.orth_ == 'flowers':
+            token.lemma_, token.pos_ = 'flower', 'NOUN'
+    with_index = collie(doc)._.collocs
+    collie.collocate_index = None
+    assert [(col.start_char, col.end_char, col.label_) for col in with_index] == \
+           [(col.start_char, col.end_char, col.label_) for col in collie(doc)._.collocs]
+    
+    # A saved index is only used for the words whose entries are still the ones it was built from.
+    path = os.path.join(tmp_path, 'collocate_index.pkl.gz')
+    collie.build_collocate_index(path)
+    collie.collocate_index = None
+    collie.load_collocate_index(path)
+    assert collie._candidates(text, [(word, 'noun')]) == candidates
+    entry = json.loads(json.dumps(test_loader.collocations_dictionary.get(word)))
+    entry.get('noun').pop('QUANT.')
+    collie.collocations_dictionary = {word: entry}
+    collie.load_collocate_index(path)
+    assert collie._candidates(text, [(word, 'noun')]) == {}
+    
+    
+def test_dictionary_store(test_datafinder, test_loader, tmp_path):
+    
+    word = test_datafinder.get('word')
+    text = test_datafinder.get('examples').get(word)
+    dictionary = {w: test_loader.collocations_dictionary.get(w) for w in [word, 'flower', 'time']}
+    source = os.path.join(tmp_path, 'collocations_dict.joblib')
+    joblib.dump(dictionary, source)
+    
+    path = os.path.join(tmp_path, 'collocations.sqlite')
+    store = convert_dictionary(source, path)
+    with pytest.raises(FileExistsError):
+        convert_dictionary(source, path)
+    
+    assert len(store) == 3 and word in store and 'missing' not in store
+    assert dict(store.items()) == dictionary
+    assert store.get('missing') is None
+    
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, collocations_dictionary=store)
+    assert collie.collocations_identifier(word, 'noun', text) == test_loader.collocations_identifier(word, 'noun', text)
+    
+    version = collie.dictionary_version()
+    assert collie.dictionary_version() == version
+    store['new'] = {'noun': {}}
+    assert store['new'] == {'noun': {}} and len(store) == 4
+    # The version of the store changes along with the entries added to it.
+    assert collie.dictionary_version() != version
+    
+    unpickled = pickle.loads(pickle.dumps(store))
+    assert unpickled[word] == dictionary.get(word) and 'new' in unpickled
+
+
+
+def test_lazy_loader(test_datafinder, test_loader, tmp_path):
+    
+    word = test_datafinder.get('word')
+    text = test_datafinder.get('examples').get(word)
+    dictionary = {w: test_loader.collocations_dictionary.get(w) for w in [word, 'flower', 'time']}
+    path = os.path.join(tmp_path, 'collocater_obj.joblib')
+    Collocater(test_loader.irr_verbs, test_loader.prepositions, collocations_dictionary=dictionary).saver(path)
+    
+    collie = Collocater.loader(path, lazy=True)
+    assert os.path.exists(os.path.join(tmp_path, 'collocater_obj.sqlite'))
+    assert isinstance(collie.collocations_dictionary, DictionaryStore)
+    assert collie.collocations_dictionary.headwords() == set(dictionary)
+    assert not collie.collocations_dictionary._entries
+    
+    reloaded = Collocater.loader(os.path.join(tmp_path, 'collocater_obj.sqlite'), lazy=True)
+    assert reloaded.settings() == collie.settings()
+    
+    assert collie.collocations_identifier(word, 'noun', text) == test_loader.collocations_identifier(word, 'noun', text)
+    assert len(collie.collocations_dictionary._entries) == 1 and word in collie.collocations_dictionary._entries
+
+    # Without a path, the store shipped with the package is opened read-only, and nothing is written.
+    data_dir = os.path.join(os.path.dirname(collocater.__file__), 'data')
+    files = sorted(os.listdir(data_dir))
+    shipped = Collocater.loader(lazy=True)
+    assert shipped.collocations_dictionary.read_only and shipped.collocations_dictionary.path.startswith(data_dir)
+    assert word in shipped.collocations_dictionary.headwords()
+    assert sorted(os.listdir(data_dir)) == files
+
+
+
+
+PAGE = """<html><body><div class="item">
+<p class="word"><i>noun</i></p>
+<p><u>ADJ.</u> <b>sharp</b>, <b>blunt</b> <i>a sharp quill</i></p>
+<p><u>VERB + QUILL</u> <b>dip</b>, <b>sharpen</b> <i>She dipped her quill in the ink.</i></p>
+</div></body></html>"""
+
+
+@pytest.fixture
+def test_server():
+    
+    requests_seen = []
+    
+    class Handler(BaseHTTPRequestHandler):
+        
+        def do_GET(self):
+            word = parse_qs(urlparse(self.path).query).get('word', [''])[0]
+            requests_seen.append(word)
+            if word == 'flaky' and requests_seen.count(word) == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = (PAGE.replace('quill', word).replace('QUILL', word.upper()) if word != 'missing' 
+                    else '<html><body></body></html>').encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/search?word=", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+
+def test_collocate_many(test_loader, test_server):
+    
+    base_url, requests_seen = test_server
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+                        collocations_dictionary={'known': {'noun': {}}})
+    
+    expected = collie.collocate('quill', base_url=base_url)
+    assert expected and 'noun' in expected
+    
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+                        collocations_dictionary={'known': {'noun': {}}})
+    words = ['quill', 'flaky', 'missing', 'known', 'quill']
+    results = collie.collocate_many(words, concurrency=3, rate=100, retries=2, backoff=0.01, base_url=base_url)
+    
+    assert results.get('quill') == expected
+    assert results.get('flaky') == collie.collocations_dictionary.get('flaky') and results.get('flaky')
+    assert results.get('missing') is None and 'missing' not in collie.collocations_dictionary
+    assert results.get('known') == {'noun': {}}
+    assert requests_seen.count('flaky') == 2 and 'known' not in requests_seen
+
+
+
+def test_page_archive(test_loader, test_server, tmp_path):
+    
+    base_url, requests_seen = test_server
+    directory = os.path.join(tmp_path, 'pages')
+    collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, collocations_dictionary={})
+    scraped = collie.collocate_many(['quill', 'pen'], base_url=base_url, archive=directory)
+    collie.collocate('nib', base_url=base_url, archive=directory)
+    
+    archive = PageArchive(directory)
+    assert sorted(archive) == ['nib', 'pen', 'quill'] and archive.get('missing') is None
+    assert archive.put('quill', archive.get('quill')) == archive.digest('quill')
+    assert len(os.listdir(os.path.join(directory, 'objects', archive.digest('quill')[:2]))) == 1
+    
+    n_requests = len(requests_seen)
+    rebuilt = Collocater(test_loader.irr_verbs, test_loader.prepositions, collocations_dictionary={})
+    replayed = rebuilt.rebuild_from_archive(directory)
+    assert len(requests_seen) == n_requests
+    assert replayed.get('quill') == scraped.get('quill') and replayed.get('pen') == scraped.get('pen')
+    assert rebuilt.collocations_dictionary == collie.collocations_dictionary
+    assert rebuilt.collocate('missing', archive=archive, replay=True) is None
+    
+    # A line left half written by an interrupted run is dropped before the next one is appended.
+    with open(os.path.join(directory, 'index.jsonl'), 'a') as fh:
+        fh.write('{"word": "half", "sha2')
+    interrupted = PageArchive(directory)
+    assert sorted(interrupted) == ['nib', 'pen', 'quill']
+    interrupted.put('new', '<html>new</html>')
+    assert sorted(PageArchive(directory)) == ['new', 'nib', 'pen', 'quill']
+    assert PageArchive(directory).get('new') == '<html>new</html>'
+
+
+
+def test_parse_engines(test_loader, tmp_path):
+    
+    archive = PageArchive(os.path.join(tmp_path, 'pages'))
+    archive.put('quill', PAGE)
+    archive.put('look', PAGE.replace('quill', 'look').replace('<u>ADJ.</u>', '<u>PREP.</u> <b>at</b> | <b>glazed</b>'))
+    archive.put('ink', """<html><body><div class="item big"><p class="word"><b>ink</b> <i>noun</i></p>
+<p class="coll"><u>VERB + INK</u> <b>spill</b> &amp; <b>blot</b>&nbsp;<br><span title='a"b'>~</span> 
+<!-- note --> <i>She <b>spilt</b> the ink.</i> (= dark) | <b>use sth/sb</b> … 1 &lt; 2</p>
+<p>No collocations here <i>ex</i></p></div>
+<div class="item"><p class="word"><b>ink</b> <i>verb</i></p><p><u>ADV.</u> <b>carefully</b></p></div></body></html>""")
+    
+    engines = {}
+    for engine in ['bs4', 'lxml']:
+        collie = Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+                            collocations_dictionary={}, parse_engine=engine)
+        engines[engine] = collie.rebuild_from_archive(archive)
+    
+    assert engines.get('bs4') == engines.get('lxml')
+    assert set(engines.get('lxml').get('ink')) == {'noun', 'verb'}
+    assert 'ADJ.' in engines.get('lxml').get('look').get('noun')
+
+
+
+def test_cleaning_rules(test_loader):
+    
+    markup = ("<p><u>VERB + QUILL</u> <b>dip/sharpen</b> sth, <b>hold sb's</b> ~ | <b>use a new/an old</b> quill, etc. "
+              "(= write with it) | <b>lend</b> … <b>QUILL</b></p>")
+    tags_dict = dict(test_loader.tags_dict, this_word='quill')
+    
+    collocations = Collocater._colls_processor(markup, tags_dict)
+    assert sorted(collocations) == ['dip __THING__', 'hold __PERSON_S__ quill', 'lend __WORD__', 
+                                    'sharpen __THING__', 'use a new quill', 'use an old quill']
+    assert cleaning_rules(tags_dict) is cleaning_rules(dict(tags_dict, this_word='ink'))
+    
+    # Tags which can be taken for the words they replace are applied one after the other.
+    tags_dict = {'someone': 'sb', 'sb_sth': 'sb/sth', 'something': 'sth', 
+                 'possessive_det': 'POSS', 'one_word': '...', 'this_word': 'quill'}
+    assert not cleaning_rules(tags_dict)._merged
+    assert sorted(Collocater._colls_processor(markup, tags_dict)) == ['dip sth', 'hold POSS quill', 'lend', 
+                                                                      'sharpen sth', 'use a new quill', 'use an old quill']
+
+
+
+def test_rebuild(test_loader, test_server, tmp_path, monkeypatch):
+    
+    base_url, requests_seen = test_server
+    directory = os.path.join(tmp_path, 'pages')
+    archive = PageArchive(directory)
+    archive.put('quill', PAGE)
+    archive.put('ink', PAGE.replace('quill', 'ink').replace('QUILL', 'INK'))
+    base = os.path.join(tmp_path, 'base.joblib')
+    Collocater(test_loader.irr_verbs, test_loader.prepositions, 
+               collocations_dictionary={'flower': test_loader.collocations_dictionary.get('flower')}).saver(base)
+    out = os.path.join(tmp_path, 'out')
+    
+    summary = rebuild_dictionary(directory, out, words=['quill', 'ink', 'pen'], base=base, processes=2, 
+                                 fetch=True, base_url=base_url)
+    assert summary.get('processed') == 3 and requests_seen == ['pen']
+    collie = Collocater.loader(os.path.join(out, 'collocater_obj.joblib'))
+    expected = Collocater(test_loader.irr_verbs, test_loader.prepositions, collocations_dictionary={})
+    assert collie.collocations_dictionary.get('ink') == expected.rebuild_from_archive(directory, ['ink']).get('ink')
+    assert set(collie.collocations_dictionary) == {'flower', 'quill', 'ink', 'pen'}
+    assert joblib.load(os.path.join(out, 'collocations_dict.joblib')) == collie.collocations_dictionary
+    
+    assert rebuild_dictionary(directory, out, base=base, processes=1).get('skipped') == 3
+    
+    archive.put('ink', PAGE.replace('quill', 'ink').replace('QUILL', 'INK').replace('blunt', 'dry'))
+    summary = rebuild_dictionary(directory, out, base=base, processes=1)
+    assert summary.get('processed') == 1 and summary.get('skipped') == 2
+    assert 'dry' in sum(Collocater.loader(os.path.join(out, 'collocater_obj.joblib')).collocations_dictionary.get('ink').get('noun').get('ADJ.'), [])
+    
+    monkeypatch.setattr('collocater.rebuild.PROCESSOR_VERSION', 2)
+    assert rebuild_dictionary(directory, out, base=base, processes=1).get('processed') == 3